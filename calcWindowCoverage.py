@@ -11,23 +11,25 @@ import numpy as np
 import sys, getopt
 import pandas as pd
 import os
-import scipy.stats
 
-from Bio import SeqIO
-from Bio.Seq import Seq
-from Bio.SeqUtils import GC
+from pypesteps import coverageEngine
+from pypesteps import coverageWindows
+from pypesteps.coverageRLE import RLECoverage
 
 def main(argv):
-    """generate bed tracks for GC and read coverage for a sliding window and step size
+    """generate a sliding window read coverage table for a coverage file
 
     Parameters:
-    coverageFile (string): filename of coverage file generated by Samtools Coverage command
+    coverageFile (string): filename of coverage file generated by `samtools depth -a`
+                           (or a `.npz` run length encoded coverage file from StepBAMReadCoverage)
     window       (int)   : window size
     step         (int)   : step size
-    genomeFile   (string): genome filename used as reference sequence for mapping
+    genomeLength (int)   : genome length (the last position in the coverage file if it isn't given)
+    stats        (string): comma separated list of extra window statistics (median,min,max,fraction)
+    minDepth     (int)   : depth for the `fraction` statistic
 
     Returns:
-    BED files for GC and Read Coverage
+    TSV file with the window centre and the average (and the extra statistics) for each window
 
     """    
     
@@ -41,50 +43,60 @@ def main(argv):
     for hdlr in log.handlers[:]:  # remove all old handlers
         log.removeHandler(hdlr)
     log.addHandler(fileh)      # set the new handler    
-    logging.debug('This will get logged') 
     
   
     coverageFile = ''
     window = 5
     step = 1
-    genomeLength = 60
+    genomeLength = 0
+    stats = []
+    minDepth = 1
+    usage = 'calcWindowCoverage.py -c <coveragefile> -w <window> -s <step> -g <genomelength> -t <median,min,max,fraction> -m <mindepth>'
     try:
-        opts = getopt.getopt(argv, "hc:w:s:g:", ["coveragefile=","window=","step=", "genomelength="])
+        opts, args = getopt.getopt(argv, "hc:w:s:g:t:m:", ["coveragefile=","window=","step=", "genomelength=", "stats=", "mindepth="])
     except getopt.GetoptError:
-        print ('calcWinCov.py -c <coveragefile> -w <window> -s <step> -g <genomelength>')
+        print (usage)
         sys.exit()
     for opt, arg in opts:
         if opt == '-h':
-            print ('calcWinCov.py -c <coveragefile> -w <window> -s <step> -g <genomelength>')
+            print (usage)
             sys.exit()
         elif opt in ("-c", "--coveragefile"):
             coverageFile = arg
-        elif opt in ("-w", "-window"):
-            window = arg
-        elif opt in ("-s", "-step"):
-            step = arg
-        elif opt in ("-g", "-genomelength"):
-            genomeLength = arg
+        elif opt in ("-w", "--window"):
+            window = int(arg)
+        elif opt in ("-s", "--step"):
+            step = int(arg)
+        elif opt in ("-g", "--genomelength"):
+            genomeLength = int(arg)
+        elif opt in ("-t", "--stats"):
+            stats = [statName.strip() for statName in arg.split(",") if statName.strip()]
+        elif opt in ("-m", "--mindepth"):
+            minDepth = int(arg)
             
             
     if coverageFile == '':
-        print()
+        print (usage)
+        sys.exit()
+        
+    # a run length encoded file already has the length of the record
+    if coverageFile.endswith(RLECoverage.NPZSUFFIX):
+        depth = RLECoverage.load(coverageFile)
+        genomeLength = depth.length
+    elif genomeLength <= 0:
+        genomeLength = int(pd.read_csv(coverageFile, sep='\t', header=None, usecols=[1])[1].max())
         
     print("coverage file is <" + coverageFile + ">")
     print("window size is <" + str(window) + ">")
     print("step size is <" + str(step) + ">")
     print("genome length is <" + str(genomeLength) + ">")
     
-    colPos = 1
-    colCount = 2
-    
             
     # read coverage file
-    dfCoverage = pd.read_table(coverageFile, header=0)
-    #dfLength = dfCoverage.size
-    print(dfCoverage)
-    print(str(dfCoverage.iloc[1, colCount]))
-    #print(dfMiRNAData.columns.values)
+    if not coverageFile.endswith(RLECoverage.NPZSUFFIX):
+        depth = np.zeros(genomeLength, dtype=np.int32)
+        with open(coverageFile) as coverageStream:
+            coverageEngine.streamDepth(coverageStream, depth)
 
     
     # create the results folder
@@ -93,43 +105,13 @@ def main(argv):
     outputFile = os.path.join(os.path.dirname(coverageFile), outputBaseName + ".tsv")
 
         
-    # initialize the lists
-    
-    # process the WT data
-
-    dfWinAv = pd.DataFrame(columns = ["pos","average"])
-    
-    indexStart = 0 # start index for this window
-    winStart = 0
-    while indexStart < len(dfCoverage.index):
-
-        index = indexStart
-        posInGenome = dfCoverage.iloc[index, colPos]
-
-        count = 0
-        print("pos in Genome:" + str(posInGenome) +"indexStart:" + str(indexStart) + "\twin Start:" + str(winStart)  + "\tEnd" +  str(winStart + window))
-            
-        while (posInGenome >= winStart) and (posInGenome < winStart + window):
-            thisPos = dfCoverage.iloc[index, colPos]
-            thisCount = dfCoverage.iloc[index, colCount]
-            
-            count += dfCoverage.iloc[index, colCount]
-            print("currPos:" + str(posInGenome) + "\tcurrCount" + str(thisCount) + "\ttotalCount" + str(count))
-            index+=1
-            if index == len(dfCoverage.index): break
-            posInGenome = dfCoverage.iloc[index, colPos]
-        
-        
-        if index > indexStart: # if this is true, the genome Pos was inside the window
-            dfWinAv = dfWinAv.append({"pos": (winStart + window/2), "average": (count/window)}, ignore_index=True)  
-
-        winStart+=step  
-        if dfCoverage.iloc[indexStart, colPos] < winStart:
-            indexStart = indexStart + 1            
-            
-
+    # calculate the window averages (the windows are the same as in StepBAMReadCoverage)
+    extraStats = [statName for statName in stats if statName != coverageWindows.STATMEAN]
+    dfWinAv = coverageWindows.windowStats(depth, window, step, [coverageWindows.STATMEAN] + extraStats, minDepth)
+    dfWinAv = dfWinAv.rename(columns={coverageWindows.STATMEAN: "average"})
                                                     
-    dfWinAv.to_csv(os.path.join(os.path.dirname(coverageFile), outputFile), header=True)
+    dfWinAv.to_csv(outputFile, header=True, sep='\t')
+    print("window coverage written to <" + outputFile + ">")
     
 
     
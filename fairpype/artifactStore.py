@@ -0,0 +1,176 @@
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+'''
+
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+INDENT = 4
+
+
+class ArtifactStore(object):
+    '''
+    holds results (DataFrames, NumPy arrays, reference metadata, ...) that a step has
+    published so that later steps in the same run can use them directly rather than
+    reading back the files the earlier step wrote
+
+    An artifact is identified by the path of the file it corresponds to (plus a `kind`,
+    so a FASTA file can have both its sequence and its metadata). The file is still
+    written, for provenance, but by a background thread so that the steps waiting for
+    the result don't have to wait for the write. Files only appear under their final name
+    once they are complete.
+
+    Steps don't use the store directly, they call `AbstractStep.publishArtifact()` and
+    `AbstractStep.loadArtifact()`, which fall back to writing/reading the file if there is no store.
+
+    The values are held until `release()` is called for them, which `VirusProject` does once
+    all the steps that depend on the step that published them have finished.
+    '''
+    KINDDATA        = "data"
+    KINDMETADATA    = "metadata"
+    WRITERS         = 2
+
+
+    def __init__(self):
+        '''
+        Constructor
+        '''
+        self._artifacts = {}
+        self._writes = {}
+        self._lock = threading.Lock()
+        self._writer = None
+
+
+    @staticmethod
+    def artifactKey(filePath, kind):
+        return (os.path.normpath(os.path.abspath(filePath)), kind)
+
+
+    def publish(self, filePath, value, writer=None, kind=KINDDATA):
+        '''
+        make `value` available to later steps. if `writer` is given, `writer(filePath)`
+        is called in the background to write the file
+        '''
+        artifactKey = self.artifactKey(filePath, kind)
+        with self._lock:
+            if value is not None:
+                self._artifacts[artifactKey] = value
+            if writer is not None:
+                if self._writer is None:
+                    self._writer = ThreadPoolExecutor(max_workers=self.WRITERS, thread_name_prefix="writer")
+                self._writes[artifactKey[0]] = self._writer.submit(self._write, filePath, writer)
+        logging.debug(INDENT*"-" + "--published <" + artifactKey[0] + "> (" + kind + ")")
+
+
+    def get(self, filePath, kind=KINDDATA):
+        '''
+        return the published value, or None if nothing has been published for this file
+        '''
+        with self._lock:
+            return self._artifacts.get(self.artifactKey(filePath, kind))
+
+
+    def has(self, filePath):
+        '''
+        true if something has been published for this file, or it is being written
+        '''
+        normPath = os.path.normpath(os.path.abspath(filePath))
+        with self._lock:
+            return normPath in self._writes or any(artifactKey[0] == normPath for artifactKey in self._artifacts)
+
+
+    def release(self, paths):
+        '''
+        drop the values published for these files (or for any files inside these folders),
+        so they can be freed. Pending writes still finish, and later `get()` calls return None
+        '''
+        normPaths = [os.path.normpath(os.path.abspath(p)) for p in paths]
+        with self._lock:
+            releasedKeys = [artifactKey for artifactKey in self._artifacts \
+                            if any(artifactKey[0] == p or artifactKey[0].startswith(p.rstrip(os.path.sep) + os.path.sep) for p in normPaths)]
+            for artifactKey in releasedKeys:
+                del self._artifacts[artifactKey]
+        if releasedKeys:
+            logging.debug(INDENT*"-" + "--released <" + str(len(releasedKeys)) + "> published results")
+
+
+    def waitFor(self, paths):
+        '''
+        wait until the pending writes of these files (or of any files inside these folders) have finished
+        '''
+        for future in self._pendingWrites(paths):
+            future.result()
+
+
+    def onWritten(self, paths, callback):
+        '''
+        call `callback()` once the pending writes of these files (or folders) have finished.
+        the callback isn't called if one of the writes fails (the error is raised by `flush()`)
+        '''
+        pendingWrites = self._pendingWrites(paths)
+        if not pendingWrites:
+            callback()
+            return
+
+        remaining = [len(pendingWrites)]
+        countLock = threading.Lock()
+        def writeDone(future):
+            with countLock:
+                remaining[0] -= 1
+                allDone = remaining[0] == 0
+            if allDone and all(f.exception() is None for f in pendingWrites):
+                callback()
+        for future in pendingWrites:
+            future.add_done_callback(writeDone)
+
+
+    def flush(self):
+        '''
+        wait for all the pending writes and raise the first error
+        '''
+        with self._lock:
+            pendingWrites = list(self._writes.items())
+        firstError = None
+        for filePath, future in pendingWrites:
+            if future.exception() is not None and firstError is None:
+                firstError = future.exception()
+        with self._lock:
+            if self._writer is not None:
+                self._writer.shutdown(wait=True)
+                self._writer = None
+            self._writes = {}
+        if firstError is not None:
+            raise firstError
+
+
+    def _pendingWrites(self, paths):
+        normPaths = [os.path.normpath(os.path.abspath(p)) for p in paths]
+        with self._lock:
+            return [future for filePath, future in self._writes.items() \
+                    if any(filePath == p or filePath.startswith(p.rstrip(os.path.sep) + os.path.sep) for p in normPaths)]
+
+
+    @staticmethod
+    def _write(filePath, writer):
+        '''
+        write to a temporary file in the same folder and move it into place when it is
+        complete, so a half written file never has the final name. The temporary file keeps
+        the extension, some writers (e.g. plotnine) use it to choose the format
+        '''
+        logging.debug(INDENT*"-" + "--writing <" + filePath + ">")
+        fileBase, fileExtension = os.path.splitext(filePath)
+        tmpFile = fileBase + ".tmp" + str(os.getpid()) + "_" + str(threading.get_ident()) + fileExtension
+        try:
+            writer(tmpFile)
+            os.replace(tmpFile, filePath)
+        except Exception as e:
+            logging.error(INDENT*"-" + "--couldn't write <" + filePath + ">: " + repr(e))
+            if os.path.exists(tmpFile):
+                os.remove(tmpFile)
+            raise
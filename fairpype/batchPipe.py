@@ -0,0 +1,235 @@
+#!/usr/local/bin/python2.7
+# encoding: utf-8
+'''
+fairpype.batchPipe --
+
+fairpype.batchPipe runs the steps of many projects in a single process
+
+All the steps of all the projects are scheduled together, on one pool of step workers
+and one process pool for the items, and share the step result cache and the artifact
+store, so a reference that is used by several projects is only loaded once.
+A combined status summary is written at the end.
+
+@author:     Simon Rayner
+
+@copyright:  2020 Oslo University Hospital. All rights reserved.
+
+@license:    license
+
+@contact:    simon.rayner@medisin.uio.no
+@deffield    updated: Updated
+'''
+
+import sys
+import os
+import glob
+from datetime import datetime
+import hashlib
+import logging
+
+from argparse import ArgumentParser
+from argparse import RawDescriptionHelpFormatter
+
+from fairpype.virusProject import VirusProject
+from fairpype.stepScheduler import StepScheduler
+from fairpype.stepCache import StepCache
+from fairpype.artifactStore import ArtifactStore
+from pypesteps import workerPool
+
+
+__all__ = []
+__version__ = 0.1
+__date__ = '2026-10-17'
+__updated__ = '2026-10-17'
+
+INDENT = 4
+
+
+def main(argv=None): # IGNORE:C0111
+
+    if argv is None:
+        argv = sys.argv
+
+    md5String = hashlib.md5(b"CBGAMGOUS").hexdigest()
+    args = parseArgs(argv)
+    logfileName = initLogger(md5String)
+
+    projectFiles = findProjectFiles(args.projects)
+    logging.info("found <" + str(len(projectFiles)) + "> project files")
+
+    stepCache = None
+    if not args.nocache:
+        stepCache = StepCache(args.cachedir, int(args.cachesize*1024*1024*1024))
+    workerPool.setMaxWorkers(args.itemworkers)
+    if args.referencedir is not None:
+        # imported here, the registry needs numpy/pandas and most commands don't use it
+        from pypesteps.referenceRegistry import ReferenceRegistry
+        ReferenceRegistry.setRoot(args.referencedir)
+    artifacts = ArtifactStore()
+
+    # parse and check all the projects first. a project that fails isn't run, but the others are
+    projects = []
+    projectStatus = {}
+    for projectFile in projectFiles:
+        logging.info("+" + "-"*78 + "+")
+        logging.info("project file is <" + projectFile + ">")
+        virusProject = VirusProject()
+        virusProject.projectFile = projectFile
+        virusProject.md5string = md5String
+        virusProject.resume = args.resume
+        virusProject.stepCache = stepCache
+        virusProject.forceSteps = [step.strip() for step in args.forcesteps.split(",") if step.strip()]
+        virusProject.artifacts = artifacts
+        try:
+            virusProject.loadProjectFile()
+            virusProject.perfReportFile = os.path.splitext(logfileName)[0] + "__" + virusProject.projectID + "__perf.json"
+            projectPlan = virusProject.parseSteps()
+        except Exception as e:
+            logging.error(INDENT*"-" + "project <" + projectFile + "> failed validation: " + str(e))
+            projectStatus[projectFile] = "invalid: " + str(e)
+            continue
+        if args.dryrun:
+            projectPlan.report()
+        projects.append(virusProject)
+
+    if args.dryrun:
+        logging.info(INDENT*"-" + "dry run, no steps were executed")
+        return writeSummary(projectFiles, projects, projectStatus, None, {})
+
+    # schedule the steps of all the projects together
+    allSteps = []
+    stepProject = {}
+    for virusProject in projects:
+        virusProject.prepareRun()
+        for thisStep in virusProject.stepsToExecute:
+            stepProject[id(thisStep)] = virusProject
+            allSteps.append(thisStep)
+
+    scheduler = StepScheduler(args.maxworkers, args.onfailure)
+    writeError = None
+    try:
+        scheduler.run(allSteps, lambda thisStep: stepProject[id(thisStep)].runStep(thisStep))
+    except Exception as e:
+        logging.error(INDENT*"-" + "batch finished with errors: " + str(e))
+    finally:
+        workerPool.shutdownPool()
+        try:
+            artifacts.flush()
+        except Exception as e:
+            logging.error(INDENT*"-" + "couldn't write all the output files: " + repr(e))
+            writeError = e
+        for virusProject in projects:
+            virusProject.finishRun()
+
+    stepStatus = dict((id(thisStep), scheduler.status[stepNo]) for stepNo, thisStep in enumerate(allSteps))
+    stepErrors = dict((id(allSteps[stepNo]), error) for stepNo, error in scheduler.errors.items())
+    exitCode = writeSummary(projectFiles, projects, projectStatus, stepStatus, stepErrors)
+    if writeError is not None:
+        logging.error(INDENT*"-" + "not all the output files were written: " + repr(writeError))
+        return 1
+    return exitCode
+
+
+
+def findProjectFiles(projectPaths):
+    '''
+    expand folders to the JSON project files they contain
+    '''
+    projectFiles = []
+    for projectPath in projectPaths:
+        if os.path.isdir(projectPath):
+            projectFiles.extend(sorted(glob.glob(os.path.join(projectPath, "*.json"))))
+        elif os.path.isfile(projectPath):
+            projectFiles.append(projectPath)
+        else:
+            logging.error("project file or folder <" + projectPath + "> not found")
+            raise Exception("project file or folder <" + projectPath + "> not found")
+    if not projectFiles:
+        logging.error("no project files found")
+        raise Exception("no project files found")
+    return projectFiles
+
+
+
+def writeSummary(projectFiles, projects, projectStatus, stepStatus, stepErrors):
+    '''
+    log the status of every project (and step) and return the exit code
+    '''
+    logging.info("+" + "*"*78 + "+")
+    logging.info("batch summary")
+    logging.info("+" + "*"*78 + "+")
+    failed = len(projectStatus)
+    projectsByFile = dict((virusProject.projectFile, virusProject) for virusProject in projects)
+    for projectFile in projectFiles:
+        if projectFile in projectStatus:
+            logging.info(INDENT*"-" + "<" + projectFile + ">: " + projectStatus[projectFile])
+            continue
+        virusProject = projectsByFile[projectFile]
+        if stepStatus is None:
+            logging.info(INDENT*"-" + "[" + virusProject.projectID + "] <" + projectFile + ">: valid, <" \
+                         + str(len(virusProject.stepsToExecute)) + "> steps")
+            continue
+        statusCounts = {}
+        for thisStep in virusProject.stepsToExecute:
+            statusCounts[stepStatus[id(thisStep)]] = statusCounts.get(stepStatus[id(thisStep)], 0) + 1
+        projectFailed = any(stepStatus[id(thisStep)] != StepScheduler.STATUSDONE for thisStep in virusProject.stepsToExecute)
+        failed += projectFailed
+        logging.info(INDENT*"-" + "[" + virusProject.projectID + "] <" + projectFile + ">: " + ("FAILED" if projectFailed else "ok") \
+                     + " (" + ", ".join(str(count) + " " + status for status, count in sorted(statusCounts.items())) + ")")
+        for thisStep in virusProject.stepsToExecute:
+            if id(thisStep) in stepErrors:
+                logging.info(INDENT*"-" + "--step [" + thisStep.CLASSID + "] failed: " + repr(stepErrors[id(thisStep)]))
+    logging.info(INDENT*"-" + "<" + str(len(projectFiles) - failed) + "> of <" + str(len(projectFiles)) + "> projects completed")
+    return 0 if failed == 0 else 1
+
+
+
+def initLogger(md5string):
+
+    ''' setup log file for the batch '''
+    now = datetime.now()
+    dt_string = now.strftime("%Y%m%d_%H%M%S")
+    logFolder = os.path.join(os.getcwd(), "logfiles")
+    if not os.path.exists(logFolder):
+        print("--log folder <" + logFolder + "> doesn't exist, creating")
+        os.makedirs(logFolder)
+    logfileName = os.path.join(logFolder, "batch__" + dt_string + "__" + md5string +".log")
+    handler = logging.StreamHandler(sys.stdout)
+    logging.basicConfig(level=logging.DEBUG)
+
+    fileh = logging.FileHandler(logfileName, 'a')
+    formatter = logging.Formatter('%(asctime)s - %(threadName)s - %(name)s - %(levelname)s - %(message)s')
+    fileh.setFormatter(formatter)
+
+    log = logging.getLogger()  # root logger
+    for hdlr in log.handlers[:]:  # remove all old handlers
+        log.removeHandler(hdlr)
+    log.addHandler(fileh)      # set the new handler
+    log.addHandler(handler)
+    logging.info("+" + "*"*78 + "+")
+    logging.info("batch log file is <" + logfileName + ">")
+    logging.info("+" + "*"*78 + "+")
+    return logfileName
+
+
+def parseArgs(argv):
+
+    '''parse out Command line options.'''
+
+    parser = ArgumentParser(description="run the steps of many fairpype projects together", formatter_class=RawDescriptionHelpFormatter)
+    parser.add_argument(dest="projects", nargs='+', help="project files in JSON format, or folders containing them")
+    parser.add_argument("-j", "--max-workers", dest="maxworkers", action="store", type=int, default=1, help="number of independent steps (from any project) to run at the same time [default: %(default)s]")
+    parser.add_argument("--item-workers", dest="itemworkers", action="store", type=int, default=1, help="number of processes used to work on the input files of the steps in parallel [default: %(default)s]")
+    parser.add_argument("--dry-run", dest="dryrun", action="store_true", help="check all the projects and write the execution plans to the log without running anything")
+    parser.add_argument("--resume", dest="resume", action="store_true", help="carry on from where the previous run of each project stopped")
+    parser.add_argument("--no-cache", dest="nocache", action="store_true", help="don't restore or store step results in the cache")
+    parser.add_argument("--force-step", dest="forcesteps", action="store", default="", help="comma separated list of steps that are always executed, even if their results are cached")
+    parser.add_argument("--cache-dir", dest="cachedir", action="store", default=os.path.join(os.path.expanduser("~"), ".fairpype", "cache"), help="folder for the step result cache [default: %(default)s]")
+    parser.add_argument("--cache-size", dest="cachesize", action="store", type=float, default=20, help="maximum size of the step result cache in GB [default: %(default)s]")
+    parser.add_argument("--reference-dir", dest="referencedir", action="store", default=None, help="folder for the reference registry, where the encoded reference sequences and their GC/composition tracks are kept [default: $FAIRPYPE_REFERENCES or ~/.fairpype/references]")
+    parser.add_argument("--on-failure", dest="onfailure", action="store", choices=StepScheduler.FAILUREPOLICIES, default=StepScheduler.CONTINUE, help="failfast: stop starting new steps after a failure, continue: only skip steps that depend on the failed step [default: %(default)s]")
+    return parser.parse_args(argv[1:])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+'''
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from pypesteps.resourceUsage import ResourceUsage
+
+
+logger = logging.getLogger(__name__)
+INDENT = 4
+
+
+class PerfReport(object):
+    '''
+    collects the resources used by each step (see `pypesteps/resourceUsage.py`) and
+    writes them to a JSON file next to the log file
+
+        {"projectID": ..., "steps": [
+            {"stepNo": 0, "step": "StepBAMReadCoverage",
+             "phases": {"checkInputData": {...}, "execute": {...}},
+             "items": [{"item": "s1.bam", "wallSeconds": ..., ...}, ...]}, ...]}
+
+    `execute` includes the time spent restoring results from the cache. The items are
+    those processed by `executeItems()`, in the order they finished.
+    The report is rewritten after each step, so there is a report even if the run fails.
+    '''
+
+    def __init__(self, reportFile, projectID):
+        '''
+        Constructor
+        '''
+        self.reportFile = reportFile
+        self.projectID = projectID
+        self.created = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.steps = {}
+        self._lock = threading.Lock()
+
+
+    def stepRecorder(self, stepNo, step):
+        '''
+        return the recorder for a step. this is set on the step as `perfRecorder`
+        '''
+        with self._lock:
+            stepEntry = {"stepNo": stepNo, "step": step.CLASSID, "phases": {}, "items": []}
+            self.steps[stepNo] = stepEntry
+        return StepPerfRecorder(self, stepEntry)
+
+
+    def write(self):
+        if self.reportFile is None:
+            return
+        with self._lock:
+            report = {"projectID": self.projectID, "created": self.created,
+                      "steps": [self.steps[stepNo] for stepNo in sorted(self.steps)]}
+            with open(self.reportFile + ".tmp", 'w') as reportFile:
+                json.dump(report, reportFile, indent=1, default=str)
+            os.replace(self.reportFile + ".tmp", self.reportFile)
+
+
+    def logSummary(self):
+        '''
+        write the wall time of each step to the log
+        '''
+        for stepNo in sorted(self.steps):
+            stepEntry = self.steps[stepNo]
+            phaseTimes = ", ".join(phase + " " + str(round(usage["wallSeconds"], 2)) + "s" \
+                                   for phase, usage in stepEntry["phases"].items())
+            logging.info(INDENT*"-" + "--step <" + str(stepNo) + "> [" + stepEntry["step"] + "]: " + phaseTimes \
+                         + " (" + str(len(stepEntry["items"])) + " items)")
+        if self.reportFile is not None:
+            logging.info(INDENT*"-" + "performance report written to <" + self.reportFile + ">")
+
+
+
+class StepPerfRecorder(object):
+    '''
+    records the usage of the phases and items of a single step
+    '''
+
+    def __init__(self, report, stepEntry):
+        '''
+        Constructor
+        '''
+        self.report = report
+        self.stepEntry = stepEntry
+
+
+    @contextmanager
+    def measure(self, phase):
+        phaseUsage = ResourceUsage()
+        try:
+            yield
+        finally:
+            usage = phaseUsage.stop()
+            with self.report._lock:
+                self.stepEntry["phases"][phase] = usage
+
+
+    def recordItem(self, item, usage):
+        itemEntry = {"item": str(item)}
+        itemEntry.update(usage)
+        with self.report._lock:
+            self.stepEntry["items"].append(itemEntry)
@@ -0,0 +1,129 @@
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+'''
+
+import os
+import logging
+
+from fairpype.stepScheduler import StepScheduler
+
+
+logger = logging.getLogger(__name__)
+INDENT = 4
+
+
+class ProjectPlan(object):
+    '''
+    checks the input data of every step before anything is executed, so that a
+    missing file or a bad parameter in the last step is found before the first
+    step has spent hours running
+
+    Files and folders that an earlier step will create (anything inside the `outFolder`
+    of an earlier step) are accepted while planning (see `AbstractStep.fileExists()`).
+    `checkInputData()` is called again when the step is run, once these exist.
+    '''
+    def __init__(self, steps):
+        '''
+        Constructor
+        '''
+        self.steps = steps
+        self.dependencies = {}
+        self.inputBytes = {}
+        self.pendingInputs = {}
+        self.errors = {}
+
+
+    def validate(self):
+        '''
+        call `checkInputData()` for each step, in project order.
+        all the steps are checked and then an exception listing the steps that failed is raised
+        '''
+        logging.info(INDENT*"-" + "checking the input data for <" + str(len(self.steps)) + "> steps")
+        plannedOutputs = []
+        for stepNo, step in enumerate(self.steps):
+            logging.info(INDENT*"-" + "--checking step <" + str(stepNo) + "> [" + step.CLASSID + "]")
+            # `checkInputData()` may expand an empty `inFiles` from the folder contents, which
+            # can't be done properly until the earlier steps have run
+            plannedInputFiles = list(step.inputFiles)
+            step.pendingOutputs = list(plannedOutputs)
+            try:
+                step.checkInputData()
+                self.inputBytes[stepNo], self.pendingInputs[stepNo] = self.estimateInputBytes(step, plannedOutputs)
+            except Exception as e:
+                self.errors[stepNo] = e
+                logging.error(INDENT*"-" + "--step <" + str(stepNo) + "> [" + step.CLASSID + "] failed validation: " + str(e))
+            finally:
+                step.pendingOutputs = []
+                step.inputFiles = plannedInputFiles
+            plannedOutputs.extend(step.getOutputPaths())
+
+        self.dependencies = StepScheduler().buildGraph(self.steps)
+        if self.errors:
+            failedSteps = ", ".join(str(stepNo) + " [" + self.steps[stepNo].CLASSID + "]: " + str(self.errors[stepNo]) \
+                                    for stepNo in sorted(self.errors))
+            logging.error(INDENT*"-" + "the following steps failed validation: " + failedSteps)
+            raise Exception("the following steps failed validation: " + failedSteps)
+        logging.info(INDENT*"-" + "all steps passed validation")
+
+
+    @staticmethod
+    def estimateInputBytes(step, plannedOutputs):
+        '''
+        total size of the files the step reads, plus the list of inputs that don't exist
+        yet because an earlier step will create them. folders are counted as the files directly inside them
+        '''
+        inputBytes = 0
+        pendingInputs = []
+        for inputPath in ProjectPlan.uniqueInputPaths(step):
+            if os.path.isdir(inputPath):
+                inputBytes += sum(os.path.getsize(os.path.join(inputPath, f)) for f in os.listdir(inputPath) \
+                                  if os.path.isfile(os.path.join(inputPath, f)))
+            elif os.path.isfile(inputPath):
+                inputBytes += os.path.getsize(inputPath)
+            elif any(StepScheduler.pathsOverlap(inputPath, plannedOutput) for plannedOutput in plannedOutputs):
+                pendingInputs.append(inputPath)
+        return inputBytes, pendingInputs
+
+
+    @staticmethod
+    def uniqueInputPaths(step):
+        '''
+        the input paths of the step without duplicates (e.g. a folder given both as the input
+        folder and as a file parameter). a folder is left out if files inside it are listed too,
+        so they aren't counted twice
+        '''
+        inputPaths = sorted(set(os.path.normpath(os.path.abspath(inputPath)) for inputPath in step.getInputPaths()))
+        return [inputPath for inputPath in inputPaths \
+                if not any(otherPath.startswith(inputPath.rstrip(os.path.sep) + os.path.sep) for otherPath in inputPaths)]
+
+
+    def report(self):
+        '''
+        write the execution plan to the log
+        '''
+        logging.info("+" + "*"*78 + "+")
+        logging.info("execution plan")
+        logging.info("+" + "*"*78 + "+")
+        for stepNo, step in enumerate(self.steps):
+            dependsOn = ",".join(str(d) for d in sorted(self.dependencies.get(stepNo, []))) or "-"
+            logging.info(INDENT*"-" + "step <" + str(stepNo) + "> [" + step.CLASSID + "] depends on <" + dependsOn + ">")
+            logging.info(INDENT*"-" + "--estimated input: " + self.formatBytes(self.inputBytes.get(stepNo, 0)) \
+                         + " in <" + str(len(self.uniqueInputPaths(step))) + "> inputs")
+            for pendingInput in self.pendingInputs.get(stepNo, []):
+                logging.info(INDENT*"-" + "--<" + pendingInput + "> will be created by an earlier step")
+            for outputPath in step.getOutputPaths():
+                logging.info(INDENT*"-" + "--output: <" + outputPath + ">")
+        totalBytes = sum(self.inputBytes.values())
+        logging.info(INDENT*"-" + "total estimated input: " + self.formatBytes(totalBytes) \
+                     + " (not counting files created by the steps)")
+
+
+    @staticmethod
+    def formatBytes(noOfBytes):
+        for unit in ["B", "KB", "MB", "GB"]:
+            if noOfBytes < 1024:
+                return str(round(noOfBytes, 1)) + " " + unit
+            noOfBytes /= 1024.0
+        return str(round(noOfBytes, 1)) + " TB"
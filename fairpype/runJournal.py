@@ -0,0 +1,180 @@
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+'''
+
+import os
+import json
+import pickle
+import shutil
+import hashlib
+import logging
+import threading
+
+from fairpype.stepCache import StepCache
+
+
+logger = logging.getLogger(__name__)
+INDENT = 4
+
+
+class RunJournal(object):
+    '''
+    records the progress of a run so that a failed run can be resumed (`--resume`)
+
+    The journal is a JSON file under the project root
+        <projectRoot>/.fairpype/<projectID>__journal.json
+    which lists, for each step in `stepsData`, the step fingerprint (see `StepCache.fingerprint`,
+    with the input files identified by their size and modification time) and whether the step completed. While a step is running, the result of each item
+    finished by `processItem` is pickled to
+        <projectRoot>/.fairpype/<projectID>__items/<step no>/
+    and these are removed once the step completes.
+
+    A step is only treated as complete in a resumed run if its fingerprint hasn't changed,
+    i.e. the parameters and input files are the same as in the failed run.
+    Finished items are kept as long as the parameters of the step haven't changed and the 
+    input file for the item (if the item is a file in `inFolder`) is the same.
+    '''
+    JOURNALFOLDER   = ".fairpype"
+    STATUSRUNNING   = "running"
+    STATUSDONE      = "done"
+
+
+    def __init__(self, projectRoot, projectID, resume=False):
+        '''
+        Constructor
+        start a new journal unless `resume` is set, in which case the journal
+        of the previous run is loaded (if there is one)
+        '''
+        self.journalFolder = os.path.join(projectRoot, self.JOURNALFOLDER)
+        self.journalFile = os.path.join(self.journalFolder, projectID + "__journal.json")
+        self.itemsFolder = os.path.join(self.journalFolder, projectID + "__items")
+        self._lock = threading.Lock()
+        self.steps = {}
+
+        if resume and os.path.exists(self.journalFile):
+            logging.info(INDENT*"-" + "resuming from run journal <" + self.journalFile + ">")
+            with open(self.journalFile) as journalFile:
+                self.steps = json.load(journalFile)["steps"]
+        else:
+            if resume:
+                logging.warning(INDENT*"-" + "no run journal found at <" + self.journalFile + ">, starting from the beginning")
+            if os.path.exists(self.itemsFolder):
+                shutil.rmtree(self.itemsFolder)
+            if not os.path.exists(self.journalFolder):
+                os.makedirs(self.journalFolder)
+            self._write()
+
+
+    def isStepDone(self, stepNo, stepKey):
+        '''
+        true if the step completed in an earlier run with the same fingerprint
+        '''
+        with self._lock:
+            stepEntry = self.steps.get(str(stepNo))
+            return stepEntry is not None and stepEntry["key"] == stepKey and stepEntry["status"] == self.STATUSDONE
+
+
+    def startStep(self, stepNo, step, stepKey):
+        '''
+        record that a step is starting and return the checkpoint for its items.
+        items from an earlier run are kept if the parameters of the step haven't changed
+        '''
+        paramKey = StepCache.fingerprint(step, includeInputs=False)
+        with self._lock:
+            stepEntry = self.steps.get(str(stepNo))
+            if stepEntry is None or stepEntry["paramKey"] != paramKey:
+                stepEntry = {"step": step.CLASSID, "key": stepKey, "paramKey": paramKey, "status": self.STATUSRUNNING, "items": {}}
+                self.steps[str(stepNo)] = stepEntry
+                stepItemsFolder = os.path.join(self.itemsFolder, str(stepNo))
+                if os.path.exists(stepItemsFolder):
+                    shutil.rmtree(stepItemsFolder)
+            else:
+                stepEntry["key"] = stepKey
+                stepEntry["status"] = self.STATUSRUNNING
+                if stepEntry["items"]:
+                    logging.info(INDENT*"-" + "--<" + str(len(stepEntry["items"])) + "> items of step [" + step.CLASSID \
+                                 + "] were finished in an earlier run")
+            self._write()
+        return ItemCheckpoint(self, stepNo, os.path.join(step.projectRoot, step.inFolder))
+
+
+    def finishStep(self, stepNo):
+        '''
+        record that a step completed and throw away the saved item results
+        '''
+        with self._lock:
+            stepEntry = self.steps[str(stepNo)]
+            stepEntry["status"] = self.STATUSDONE
+            stepEntry["items"] = {}
+            self._write()
+        stepItemsFolder = os.path.join(self.itemsFolder, str(stepNo))
+        if os.path.exists(stepItemsFolder):
+            shutil.rmtree(stepItemsFolder)
+
+
+    def _itemFile(self, stepNo, itemKey):
+        return os.path.join(self.itemsFolder, str(stepNo), itemKey + ".pkl")
+
+
+    def _write(self):
+        with open(self.journalFile + ".tmp", 'w') as journalFile:
+            json.dump({"steps": self.steps}, journalFile, indent=1)
+        os.replace(self.journalFile + ".tmp", self.journalFile)
+
+
+
+class ItemCheckpoint(object):
+    '''
+    the part of the journal that belongs to a single step. This is passed to the
+    step as `itemCheckpoint` and used by `AbstractStep.executeItems()`
+    '''
+
+    def __init__(self, journal, stepNo, inputFolder):
+        '''
+        Constructor
+        '''
+        self.journal = journal
+        self.stepNo = stepNo
+        self.inputFolder = inputFolder
+
+
+    def isDone(self, item):
+        itemKey = self._itemKey(item)
+        with self.journal._lock:
+            return itemKey in self.journal.steps[str(self.stepNo)]["items"] \
+                and os.path.exists(self.journal._itemFile(self.stepNo, itemKey))
+
+
+    def result(self, item):
+        with open(self.journal._itemFile(self.stepNo, self._itemKey(item)), 'rb') as resultFile:
+            return pickle.load(resultFile)
+
+
+    def record(self, item, result):
+        '''
+        save the result of an item and record it in the journal
+        '''
+        itemKey = self._itemKey(item)
+        itemFile = self.journal._itemFile(self.stepNo, itemKey)
+        if not os.path.exists(os.path.dirname(itemFile)):
+            os.makedirs(os.path.dirname(itemFile))
+        with open(itemFile + ".tmp", 'wb') as resultFile:
+            pickle.dump(result, resultFile)
+        os.replace(itemFile + ".tmp", itemFile)
+        with self.journal._lock:
+            self.journal.steps[str(self.stepNo)]["items"][itemKey] = repr(item)
+            self.journal._write()
+
+
+    def _itemKey(self, item):
+        '''
+        the item, plus the digest of its input file if it is a file in the input folder
+        (items can also be a tuple of the file and e.g. the contig)
+        '''
+        itemText = repr(item)
+        itemFile = item[0] if isinstance(item, tuple) and item else item
+        if isinstance(itemFile, str) and itemFile and os.path.isfile(os.path.join(self.inputFolder, itemFile)):
+            itemText += StepCache.fileDigest(os.path.join(self.inputFolder, itemFile))
+        return hashlib.md5(itemText.encode("utf-8")).hexdigest()
@@ -0,0 +1,293 @@
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+INDENT = 4
+
+
+class StepCache(object):
+    '''
+    stores the output files of a step under a fingerprint of
+        1. the step class and its code (see `codeDigest()`)
+        2. the parsed parameters of the step
+        3. the contents (or, for large files, the metadata) of the input files
+
+    if a step with the same fingerprint is run again the output files are restored
+    from the cache (or reused if they are still in place) instead of calling `execute()`
+
+    Each entry is a folder in the cache directory containing the output files and an
+    `entry.json` file that lists where the files belong. When the cache gets bigger
+    than `maxBytes` the least recently used entries are removed.
+    '''
+    ENTRYFILE       = "entry.json"
+    FILESFOLDER     = "files"
+
+    # files larger than this are identified by their size, modification time and
+    # the first/last HASHCHUNK bytes, rather than hashing the whole file (BAMs can be many GB)
+    HASHLIMIT       = 64*1024*1024
+    HASHCHUNK       = 1024*1024
+
+    # step attributes that describe where the project is rather than what the step does
+    EXCLUDEDATTRS   = ["projectRoot", "projectFile", "jsonString"]
+
+    # code digests by module name, the source doesn't change while the pipeline runs
+    _codeDigests    = {}
+
+
+    def __init__(self, cacheDir, maxBytes):
+        '''
+        Constructor
+        '''
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        self._lock = threading.Lock()
+        if not os.path.exists(self.cacheDir):
+            logging.info(INDENT*"-" + "--cache folder <" + self.cacheDir + "> doesn't exist, creating")
+            os.makedirs(self.cacheDir)
+
+
+    @classmethod
+    def fingerprint(cls, step, includeInputs=True, quickInputs=False):
+        '''
+        return the cache key for a step.
+        This has to be called after `checkInputData()`, which may fill in `inputFiles`
+        if `includeInputs` is False, only the step class and parameters are used
+        if `quickInputs` is True, the input files are identified by their size and modification
+        time rather than their contents (see `_pathStamp()`), so nothing has to be read
+        '''
+        parameters = {}
+        for attrName, attrValue in sorted(vars(step).items()):
+            if attrName in cls.EXCLUDEDATTRS or attrName in step.RUNTIMEATTRS or attrName.startswith("_"):
+                continue
+            if isinstance(attrValue, (str, int, float, bool, list, tuple)) or attrValue is None:
+                parameters[attrName] = attrValue
+
+        inputs = []
+        if includeInputs:
+            for inputPath in step.getInputPaths():
+                inputDigest = cls._pathStamp(inputPath) if quickInputs else cls._pathDigest(inputPath)
+                inputs.append([cls._relativePath(step, inputPath), inputDigest])
+
+        fingerprintJSON = json.dumps({"step": step.CLASSID, "code": cls.codeDigest(step), "parameters": parameters, "inputs": inputs}, 
+                                     sort_keys=True, default=str)
+        return hashlib.sha256(fingerprintJSON.encode("utf-8")).hexdigest()
+
+
+    def snapshotOutputs(self, step):
+        '''
+        record the size and modification time of everything in the output folders
+        so that `store()` can work out which files the step wrote
+        '''
+        snapshot = {}
+        for outputPath in step.getOutputPaths():
+            for filePath in self._listFiles(outputPath, recursive=True):
+                fileStat = os.stat(filePath)
+                snapshot[filePath] = (fileStat.st_size, fileStat.st_mtime_ns)
+        return snapshot
+
+
+    def store(self, stepKey, step, snapshot):
+        '''
+        copy the files the step created or changed into the cache
+        '''
+        entryFolder = os.path.join(self.cacheDir, stepKey)
+        tmpFolder = entryFolder + ".tmp." + str(os.getpid()) + "." + str(threading.get_ident())
+        filesFolder = os.path.join(tmpFolder, self.FILESFOLDER)
+        os.makedirs(filesFolder)
+
+        entryFiles = []
+        totalBytes = 0
+        for filePath, fileState in sorted(self.snapshotOutputs(step).items()):
+            if snapshot.get(filePath) == fileState:
+                continue
+            cachedName = str(len(entryFiles))
+            shutil.copy2(filePath, os.path.join(filesFolder, cachedName))
+            entryFiles.append({"path": self._relativePath(step, filePath), "cached": cachedName,
+                               "size": fileState[0], "mtime": fileState[1]})
+            totalBytes += fileState[0]
+
+        entry = {"step": step.CLASSID, "files": entryFiles, "bytes": totalBytes, "created": time.time(), "lastUsed": time.time()}
+        with open(os.path.join(tmpFolder, self.ENTRYFILE), 'w') as entryFile:
+            json.dump(entry, entryFile, indent=1)
+
+        with self._lock:
+            if os.path.exists(entryFolder):
+                shutil.rmtree(entryFolder)
+            os.rename(tmpFolder, entryFolder)
+            logging.info(INDENT*"-" + "--cached <" + str(len(entryFiles)) + "> output files (" + str(totalBytes) \
+                         + " bytes) for step [" + step.CLASSID + "] as <" + stepKey + ">")
+            self._evict()
+
+
+    def restore(self, stepKey, step):
+        '''
+        put the cached output files back in place. returns False if there is no entry for this key
+        files that are still in place (same size and modification time) are left alone
+        '''
+        with self._lock:
+            entry = self._readEntry(stepKey)
+            if entry is None:
+                logging.info(INDENT*"-" + "--no cache entry for step [" + step.CLASSID + "] <" + stepKey + ">")
+                return False
+
+            entryFolder = os.path.join(self.cacheDir, stepKey)
+            restored = 0
+            for entryFile in entry["files"]:
+                filePath = os.path.join(step.projectRoot, entryFile["path"])
+                if os.path.exists(filePath):
+                    fileStat = os.stat(filePath)
+                    if fileStat.st_size == entryFile["size"] and fileStat.st_mtime_ns == entryFile["mtime"]:
+                        continue
+                if not os.path.exists(os.path.dirname(filePath)):
+                    os.makedirs(os.path.dirname(filePath))
+                shutil.copy2(os.path.join(entryFolder, self.FILESFOLDER, entryFile["cached"]), filePath)
+                restored += 1
+
+            entry["lastUsed"] = time.time()
+            self._writeEntry(stepKey, entry)
+        logging.info(INDENT*"-" + "--step [" + step.CLASSID + "] found in cache <" + stepKey + ">: restored <" \
+                     + str(restored) + "> of <" + str(len(entry["files"])) + "> output files")
+        return True
+
+
+    def _evict(self):
+        '''
+        remove the least recently used entries until the cache is smaller than `maxBytes`
+        '''
+        entries = []
+        for stepKey in os.listdir(self.cacheDir):
+            entry = self._readEntry(stepKey)
+            if entry is not None:
+                entries.append((entry["lastUsed"], entry["bytes"], stepKey))
+
+        cacheBytes = sum(entry[1] for entry in entries)
+        for lastUsed, entryBytes, stepKey in sorted(entries):
+            if cacheBytes <= self.maxBytes:
+                break
+            logging.info(INDENT*"-" + "--removing least recently used cache entry <" + stepKey + "> (" + str(entryBytes) + " bytes)")
+            shutil.rmtree(os.path.join(self.cacheDir, stepKey), ignore_errors=True)
+            cacheBytes -= entryBytes
+
+
+    def _readEntry(self, stepKey):
+        entryPath = os.path.join(self.cacheDir, stepKey, self.ENTRYFILE)
+        if not os.path.exists(entryPath):
+            return None
+        with open(entryPath) as entryFile:
+            return json.load(entryFile)
+
+
+    def _writeEntry(self, stepKey, entry):
+        entryPath = os.path.join(self.cacheDir, stepKey, self.ENTRYFILE)
+        with open(entryPath + ".tmp", 'w') as entryFile:
+            json.dump(entry, entryFile, indent=1)
+        os.replace(entryPath + ".tmp", entryPath)
+
+
+    @classmethod
+    def codeDigest(cls, step):
+        '''
+        digest of the source of the module the step is defined in and of the modules in the
+        same package it uses (e.g. `abstractStep` and `coverageWindows` for `StepBAMReadCoverage`),
+        so that changing the code of a step invalidates the results cached by the old code
+        '''
+        moduleName = type(step).__module__
+        if moduleName not in cls._codeDigests:
+            packageName = moduleName.split(".")[0]
+            modules = {}
+            toVisit = [moduleName]
+            while toVisit:
+                thisName = toVisit.pop()
+                module = sys.modules.get(thisName)
+                if thisName in modules or module is None:
+                    continue
+                modules[thisName] = getattr(module, "__file__", None)
+                for value in list(vars(module).values()):
+                    valueModule = value.__name__ if isinstance(value, type(sys)) else getattr(value, "__module__", None)
+                    if isinstance(valueModule, str) and valueModule.split(".")[0] == packageName:
+                        toVisit.append(valueModule)
+
+            codeHash = hashlib.sha1()
+            for thisName, sourceFile in sorted(modules.items()):
+                codeHash.update(thisName.encode("utf-8"))
+                if sourceFile is not None and os.path.exists(sourceFile):
+                    with open(sourceFile, 'rb') as inFile:
+                        codeHash.update(inFile.read())
+            cls._codeDigests[moduleName] = codeHash.hexdigest()
+        return cls._codeDigests[moduleName]
+
+
+    @classmethod
+    def _pathDigest(cls, inputPath):
+        '''
+        digest of a single input. folders are identified by the files directly inside them
+        '''
+        if os.path.isdir(inputPath):
+            return [[os.path.basename(filePath), cls.fileDigest(filePath)] for filePath in cls._listFiles(inputPath, recursive=False)]
+        if os.path.exists(inputPath):
+            return cls.fileDigest(inputPath)
+        return None
+
+
+    @classmethod
+    def _pathStamp(cls, inputPath):
+        '''
+        the size and modification time of a single input (or of the files directly inside a folder)
+        '''
+        if os.path.isdir(inputPath):
+            return [[os.path.basename(filePath), cls._pathStamp(filePath)] for filePath in cls._listFiles(inputPath, recursive=False)]
+        if os.path.exists(inputPath):
+            fileStat = os.stat(inputPath)
+            return str(fileStat.st_size) + ":" + str(fileStat.st_mtime_ns)
+        return None
+
+
+    @classmethod
+    def fileDigest(cls, filePath):
+        fileStat = os.stat(filePath)
+        fileHash = hashlib.sha1()
+        with open(filePath, 'rb') as inFile:
+            if fileStat.st_size <= cls.HASHLIMIT:
+                for chunk in iter(lambda: inFile.read(cls.HASHCHUNK), b""):
+                    fileHash.update(chunk)
+                return fileHash.hexdigest()
+            fileHash.update(inFile.read(cls.HASHCHUNK))
+            inFile.seek(-cls.HASHCHUNK, os.SEEK_END)
+            fileHash.update(inFile.read(cls.HASHCHUNK))
+        return fileHash.hexdigest() + ":" + str(fileStat.st_size) + ":" + str(fileStat.st_mtime_ns)
+
+
+    @staticmethod
+    def _listFiles(folder, recursive):
+        if not os.path.isdir(folder):
+            return []
+        if not recursive:
+            return sorted(os.path.join(folder, f) for f in os.listdir(folder) if os.path.isfile(os.path.join(folder, f)))
+        fileList = []
+        for dirPath, dirNames, fileNames in os.walk(folder):
+            fileList.extend(os.path.join(dirPath, f) for f in fileNames)
+        return sorted(fileList)
+
+
+    @staticmethod
+    def _relativePath(step, filePath):
+        '''
+        paths inside the project are stored relative to the project root
+        '''
+        projectRoot = os.path.normpath(step.projectRoot)
+        if filePath.startswith(projectRoot + os.path.sep):
+            return os.path.relpath(filePath, projectRoot)
+        return filePath
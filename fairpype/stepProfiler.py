@@ -0,0 +1,161 @@
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+'''
+
+import os
+import sys
+import pstats
+import cProfile
+import logging
+import threading
+import collections
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+INDENT = 4
+
+
+class StepProfiler(object):
+    '''
+    profiles the `execute()` call of the steps listed with `--profile-steps`
+
+    modes:
+        cprofile: (default) deterministic profile of the thread running the step. Writes
+                  <log file>__step<no>_<CLASSID>.pstats and a text summary sorted by cumulative time
+        sample:   a background thread records the stack of the thread running the step every
+                  `sampleInterval` seconds. This has very little overhead so it can be used on
+                  full sized runs. Writes a text summary (functions and lines with the most samples)
+                  and a .collapsed file that can be turned into a flame graph
+
+    Only the thread that runs the step is profiled. Items processed in the worker pool
+    (`--item-workers` > 1) run in other processes and aren't included.
+    '''
+    MODECPROFILE    = "cprofile"
+    MODESAMPLE      = "sample"
+    MODES           = [MODECPROFILE, MODESAMPLE]
+    TOPENTRIES      = 40
+
+
+    def __init__(self, filePrefix, stepIDs, mode=MODECPROFILE, sampleInterval=0.01):
+        '''
+        Constructor
+        '''
+        if mode not in self.MODES:
+            logging.error("unrecognised profile mode <" + mode + ">. Options are <" + "|".join(self.MODES) + ">")
+            raise Exception("unrecognised profile mode <" + mode + ">. Options are <" + "|".join(self.MODES) + ">")
+        if sampleInterval <= 0:
+            logging.error("the sample interval must be > 0 (found <" + str(sampleInterval) + ">)")
+            raise Exception("the sample interval must be > 0 (found <" + str(sampleInterval) + ">)")
+        self.filePrefix = filePrefix
+        self.stepIDs = stepIDs
+        self.mode = mode
+        self.sampleInterval = sampleInterval
+
+
+    @contextmanager
+    def profile(self, stepNo, step):
+        '''
+        profile the code run inside the `with` block if the step is one of the steps to profile
+        '''
+        if step.CLASSID not in self.stepIDs:
+            yield
+            return
+
+        profilePrefix = self.filePrefix + "__step" + str(stepNo) + "_" + step.CLASSID
+        logging.info(INDENT*"-" + "--profiling step <" + str(stepNo) + "> [" + step.CLASSID + "] (" + self.mode + ")")
+        if self.mode == self.MODECPROFILE:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                self.writeCProfile(profiler, profilePrefix)
+        else:
+            sampler = StackSampler(threading.get_ident(), self.sampleInterval)
+            sampler.start()
+            try:
+                yield
+            finally:
+                sampler.stopSampling()
+                self.writeSamples(sampler, profilePrefix)
+
+
+    def writeCProfile(self, profiler, profilePrefix):
+        profiler.dump_stats(profilePrefix + ".pstats")
+        with open(profilePrefix + ".txt", 'w') as summaryFile:
+            stats = pstats.Stats(profiler, stream=summaryFile)
+            stats.sort_stats("cumulative").print_stats(self.TOPENTRIES)
+            stats.sort_stats("tottime").print_stats(self.TOPENTRIES)
+        logging.info(INDENT*"-" + "--profile written to <" + profilePrefix + ".pstats>")
+
+
+    def writeSamples(self, sampler, profilePrefix):
+        '''
+        write the summary and the collapsed stacks (`frame;frame;frame count`)
+        '''
+        totalSamples = sum(sampler.stacks.values())
+        selfLines = collections.Counter()
+        inclusiveFunctions = collections.Counter()
+        for stack, count in sampler.stacks.items():
+            selfLines[stack[-1]] += count
+            for function in set(frame.rsplit(":", 1)[0] for frame in stack[:-1]) | {stack[-1].rsplit(":", 1)[0]}:
+                inclusiveFunctions[function] += count
+
+        with open(profilePrefix + ".txt", 'w') as summaryFile:
+            summaryFile.write("<" + str(totalSamples) + "> samples taken every <" + str(self.sampleInterval) + "> s\n\n")
+            summaryFile.write("lines with the most samples\n")
+            for line, count in selfLines.most_common(self.TOPENTRIES):
+                summaryFile.write("%8d %6.1f%%  %s\n" % (count, 100.0*count/totalSamples, line))
+            summaryFile.write("\nfunctions with the most samples (including the functions they call)\n")
+            for function, count in inclusiveFunctions.most_common(self.TOPENTRIES):
+                summaryFile.write("%8d %6.1f%%  %s\n" % (count, 100.0*count/totalSamples, function))
+
+        with open(profilePrefix + ".collapsed", 'w') as collapsedFile:
+            for stack, count in sampler.stacks.most_common():
+                collapsedFile.write(";".join(stack) + " " + str(count) + "\n")
+        logging.info(INDENT*"-" + "--<" + str(totalSamples) + "> samples written to <" + profilePrefix + ".txt>")
+
+
+
+class StackSampler(threading.Thread):
+    '''
+    records the stack of another thread at regular intervals. Stack frames are
+    `file:function`, except the innermost which is `file:function:line`
+    '''
+
+    def __init__(self, threadID, sampleInterval):
+        '''
+        Constructor
+        '''
+        threading.Thread.__init__(self, name="sampler", daemon=True)
+        self.threadID = threadID
+        self.sampleInterval = sampleInterval
+        self.stacks = collections.Counter()
+        self._stopEvent = threading.Event()
+
+
+    def run(self):
+        while not self._stopEvent.wait(self.sampleInterval):
+            frame = sys._current_frames().get(self.threadID)
+            if frame is None:
+                continue
+            stack = [self.frameName(frame) + ":" + str(frame.f_lineno)]
+            frame = frame.f_back
+            while frame is not None:
+                stack.append(self.frameName(frame))
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+
+
+    def stopSampling(self):
+        self._stopEvent.set()
+        self.join()
+
+
+    @staticmethod
+    def frameName(frame):
+        return os.path.basename(frame.f_code.co_filename) + ":" + frame.f_code.co_name
@@ -0,0 +1,190 @@
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+'''
+
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+logger = logging.getLogger(__name__)
+INDENT = 4
+
+
+class StepScheduler(object):
+    '''
+    runs the steps of a project as a dependency graph rather than strictly one after another
+
+    A step depends on an earlier step in `stepsData` if
+        1. it reads something the earlier step writes (the inFolder/inFiles or a file
+           parameter such as `--gc_coverage_file` lies inside the earlier `outFolder`)
+        2. it writes to the same place as the earlier step, or
+        3. it writes over something the earlier step reads
+
+    Steps whose dependencies have all finished are run on a pool of `maxWorkers` threads.
+    The steps themselves spend most of their time in samtools/shorah or the item process
+    pool, so threads are enough to keep them busy.
+
+    failure policy:
+        failfast: (default) no new steps are started once a step fails. Steps that are
+                  already running are allowed to finish and the first error is raised
+        continue: steps that depend (directly or indirectly) on a failed step are skipped,
+                  everything else runs. An exception listing the failed steps is raised
+                  at the end
+    '''
+    FAILFAST        = "failfast"
+    CONTINUE        = "continue"
+    FAILUREPOLICIES = [FAILFAST, CONTINUE]
+
+    STATUSPENDING   = "pending"
+    STATUSDONE      = "done"
+    STATUSFAILED    = "failed"
+    STATUSSKIPPED   = "skipped"
+
+
+    def __init__(self, maxWorkers=1, failurePolicy=FAILFAST):
+        '''
+        Constructor
+        '''
+        if maxWorkers < 1:
+            logging.error("the number of workers must be > 0 (found <" + str(maxWorkers) + ">)")
+            raise Exception("the number of workers must be > 0 (found <" + str(maxWorkers) + ">)")
+        if failurePolicy not in self.FAILUREPOLICIES:
+            logging.error("unrecognised failure policy <" + failurePolicy + ">. Options are <" + "|".join(self.FAILUREPOLICIES) + ">")
+            raise Exception("unrecognised failure policy <" + failurePolicy + ">. Options are <" + "|".join(self.FAILUREPOLICIES) + ">")
+
+        self.maxWorkers = maxWorkers
+        self.failurePolicy = failurePolicy
+        self.dependencies = {}
+        self.status = {}
+        self.errors = {}
+
+
+    @staticmethod
+    def pathsOverlap(pathA, pathB):
+        '''
+        true if the two paths are the same or one is inside the other
+        '''
+        if pathA == pathB:
+            return True
+        return pathA.startswith(pathB.rstrip(os.path.sep) + os.path.sep) \
+            or pathB.startswith(pathA.rstrip(os.path.sep) + os.path.sep)
+
+
+    def dependsOn(self, laterStep, earlierStep):
+        '''
+        true if `laterStep` has to wait for `earlierStep` to finish
+        '''
+        laterInputs = laterStep.getInputPaths()
+        laterOutputs = laterStep.getOutputPaths()
+        earlierInputs = earlierStep.getInputPaths()
+        earlierOutputs = earlierStep.getOutputPaths()
+
+        for earlierOutput in earlierOutputs:
+            # read after write & write after write
+            for laterPath in laterInputs + laterOutputs:
+                if self.pathsOverlap(laterPath, earlierOutput):
+                    return True
+        for laterOutput in laterOutputs:
+            # write after read
+            for earlierInput in earlierInputs:
+                if self.pathsOverlap(laterOutput, earlierInput):
+                    return True
+        return False
+
+
+    def buildGraph(self, steps):
+        '''
+        work out which of the earlier steps each step depends on.
+        returns a dictionary mapping the step index to a set of step indices
+        '''
+        logging.info(INDENT*"-" + "building step dependency graph")
+        self.dependencies = {}
+        for stepNo, step in enumerate(steps):
+            self.dependencies[stepNo] = set()
+            for earlierNo in range(0, stepNo):
+                if self.dependsOn(step, steps[earlierNo]):
+                    self.dependencies[stepNo].add(earlierNo)
+            logging.info(INDENT*"-" + "--step <" + str(stepNo) + "> [" + step.CLASSID + "] depends on <" \
+                         + ",".join(str(d) for d in sorted(self.dependencies[stepNo])) + ">")
+        return self.dependencies
+
+
+    def run(self, steps, runStep, dependencies=None):
+        '''
+        run `runStep(step)` for each step, starting a step as soon as all the
+        steps it depends on have finished. `dependencies` is the graph from
+        `buildGraph()` if it has already been built (e.g. by `ProjectPlan.validate()`)
+        '''
+        if dependencies is None:
+            self.buildGraph(steps)
+        else:
+            self.dependencies = dependencies
+        self.status = dict((stepNo, self.STATUSPENDING) for stepNo in range(0, len(steps)))
+        self.errors = {}
+
+        logging.info(INDENT*"-" + "running <" + str(len(steps)) + "> steps using <" + str(self.maxWorkers) \
+                     + "> workers (on failure: " + self.failurePolicy + ")")
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.maxWorkers, thread_name_prefix="step") as executor:
+            while True:
+                if not (self.errors and self.failurePolicy == self.FAILFAST):
+                    self._skipBlockedSteps()
+                    for stepNo in self._readySteps(running):
+                        logging.info(INDENT*"-" + "--starting step <" + str(stepNo) + "> [" + steps[stepNo].CLASSID + "]")
+                        running[executor.submit(runStep, steps[stepNo])] = stepNo
+
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stepNo = running.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        self.status[stepNo] = self.STATUSDONE
+                        logging.info(INDENT*"-" + "--finished step <" + str(stepNo) + "> [" + steps[stepNo].CLASSID + "]")
+                    else:
+                        self.status[stepNo] = self.STATUSFAILED
+                        self.errors[stepNo] = error
+                        logging.error(INDENT*"-" + "--step <" + str(stepNo) + "> [" + steps[stepNo].CLASSID + "] failed: " + repr(error))
+
+        for stepNo, stepStatus in self.status.items():
+            if stepStatus == self.STATUSPENDING:
+                self.status[stepNo] = self.STATUSSKIPPED
+
+        if self.errors:
+            firstFailed = min(self.errors)
+            if self.failurePolicy == self.FAILFAST:
+                raise self.errors[firstFailed]
+            failedSteps = ", ".join(str(stepNo) + " [" + steps[stepNo].CLASSID + "]" for stepNo in sorted(self.errors))
+            raise Exception("the following steps failed: " + failedSteps) from self.errors[firstFailed]
+        return self.status
+
+
+    def _readySteps(self, running):
+        '''
+        pending steps, in project order, whose dependencies have all completed
+        '''
+        busy = set(running.values())
+        readySteps = []
+        for stepNo in sorted(self.status):
+            if self.status[stepNo] != self.STATUSPENDING or stepNo in busy:
+                continue
+            if all(self.status[d] == self.STATUSDONE for d in self.dependencies[stepNo]):
+                readySteps.append(stepNo)
+        return readySteps
+
+
+    def _skipBlockedSteps(self):
+        '''
+        mark pending steps that depend on a failed or skipped step as skipped
+        '''
+        for stepNo in sorted(self.status):
+            if self.status[stepNo] != self.STATUSPENDING:
+                continue
+            if any(self.status[d] in (self.STATUSFAILED, self.STATUSSKIPPED) for d in self.dependencies[stepNo]):
+                logging.warning(INDENT*"-" + "--skipping step <" + str(stepNo) + "> because a step it depends on failed")
+                self.status[stepNo] = self.STATUSSKIPPED
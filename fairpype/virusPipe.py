@@ -27,7 +27,11 @@ from argparse import ArgumentParser
 from argparse import RawDescriptionHelpFormatter
 
 from fairpype import virusProject
-from anaconda_navigator.utils.py3compat import getcwd
+from fairpype.stepScheduler import StepScheduler
+from fairpype.stepCache import StepCache
+from fairpype.stepProfiler import StepProfiler
+from pypesteps import workerPool
+from pypesteps.stepFactory import StepFactory
 
 
 
@@ -38,7 +42,6 @@ __updated__ = '2020-12-19'
 
 DEBUG = 1
 TESTRUN = 0
-PROFILE = 0
 
 class CLIError(Exception):
     '''Generic exception to raise and log different fatal errors.'''
@@ -60,7 +63,12 @@ def main(argv=None): # IGNORE:C0111
 
     md5String = hashlib.md5(b"CBGAMGOUS").hexdigest()
     parseArgs(argv)
+    if listSteps:
+        printAvailableSteps()
+        return 0
     initLogger(md5String)
+    if useCache:
+        virusProject.stepCache = StepCache(cacheDir, cacheSize)
     virusProject.projectFile = projectFile
     virusProject.md5string = md5String
     logging.info("project file is <" + projectFile + ">")
@@ -70,22 +78,35 @@ def main(argv=None): # IGNORE:C0111
 
     
     
+def printAvailableSteps():
+    '''
+    print the steps that can be used in a project file
+    '''
+    availableSteps = StepFactory().listAvailableSteps()
+    stepWidth = max(len(classID) for classID, description in availableSteps)
+    for classID, description in availableSteps:
+        print(classID.ljust(stepWidth) + "  " + description)
+
+    
 def initLogger(md5string):
     
     ''' setup log file based on project name'''
     projectBaseName = os.path.splitext(os.path.basename(projectFile))[0]
     now = datetime.now()
     dt_string = now.strftime("%Y%m%d_%H%M%S")
-    logFolder = os.path.join(getcwd(), "logfiles")
+    logFolder = os.path.join(os.getcwd(), "logfiles")
     if not os.path.exists(logFolder):
         print("--log folder <" + logFolder + "> doesn't exist, creating")
         os.makedirs(logFolder)   
     logfileName = os.path.join(logFolder, projectBaseName + "__" + dt_string + "__" + md5string +".log")
+    virusProject.perfReportFile = os.path.splitext(logfileName)[0] + "__perf.json"
+    if profileSteps:
+        virusProject.stepProfiler = StepProfiler(os.path.splitext(logfileName)[0], profileSteps, profileMode, sampleInterval/1000.0)
     handler = logging.StreamHandler(sys.stdout)
     logging.basicConfig(level=logging.DEBUG)
     
     fileh = logging.FileHandler(logfileName, 'a')
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter('%(asctime)s - %(threadName)s - %(name)s - %(levelname)s - %(message)s')
     fileh.setFormatter(formatter)
     
     log = logging.getLogger()  # root logger
@@ -125,6 +146,20 @@ USAGE
         # Setup argument parser
         parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
         parser.add_argument("-p", "--projectfile", dest="projectfile", action="store", help="project file in JSON format [default: %(default)s]")
+        parser.add_argument("--list-steps", dest="liststeps", action="store_true", help="list the available steps and exit")
+        parser.add_argument("-j", "--max-workers", dest="maxworkers", action="store", type=int, default=1, help="number of independent steps to run at the same time [default: %(default)s]")
+        parser.add_argument("--item-workers", dest="itemworkers", action="store", type=int, default=1, help="number of processes used to work on the input files of a step in parallel [default: %(default)s]")
+        parser.add_argument("--dry-run", dest="dryrun", action="store_true", help="check all the steps and write the execution plan to the log without running anything")
+        parser.add_argument("--resume", dest="resume", action="store_true", help="carry on from where the previous run of this project stopped (using the run journal in the project root)")
+        parser.add_argument("--no-cache", dest="nocache", action="store_true", help="don't restore or store step results in the cache")
+        parser.add_argument("--force-step", dest="forcesteps", action="store", default="", help="comma separated list of steps (e.g. StepBAMReadCoverage) that are always executed, even if their results are cached")
+        parser.add_argument("--cache-dir", dest="cachedir", action="store", default=os.path.join(os.path.expanduser("~"), ".fairpype", "cache"), help="folder for the step result cache [default: %(default)s]")
+        parser.add_argument("--cache-size", dest="cachesize", action="store", type=float, default=20, help="maximum size of the step result cache in GB [default: %(default)s]")
+        parser.add_argument("--reference-dir", dest="referencedir", action="store", default=None, help="folder for the reference registry, where the encoded reference sequences and their GC/composition tracks are kept [default: $FAIRPYPE_REFERENCES or ~/.fairpype/references]")
+        parser.add_argument("--profile-steps", dest="profilesteps", action="store", default="", help="comma separated list of steps (e.g. StepBAMReadCoverage) whose execute() is profiled. The profiles are written to the log folder")
+        parser.add_argument("--profile-mode", dest="profilemode", action="store", choices=StepProfiler.MODES, default=StepProfiler.MODECPROFILE, help="cprofile: profile every call, sample: record the stack every --sample-interval ms (low overhead) [default: %(default)s]")
+        parser.add_argument("--sample-interval", dest="sampleinterval", action="store", type=float, default=10, help="time between samples in ms for --profile-mode sample [default: %(default)s]")
+        parser.add_argument("--on-failure", dest="onfailure", action="store", choices=StepScheduler.FAILUREPOLICIES, default=StepScheduler.FAILFAST, help="failfast: stop starting new steps after a failure, continue: only skip steps that depend on the failed step [default: %(default)s]")
         
         #parser.add_argument("-v", "--verbose", dest="verbose", action="count", help="set verbosity level [default: %(default)s]")
         #parser.add_argument("-i", "--include", dest="include", help="only include paths matching this regex pattern. Note: exclude is given preference over include. [default: %(default)s]", metavar="RE" )
@@ -136,7 +171,38 @@ USAGE
         args = parser.parse_args()
 
         global projectFile 
+        global listSteps
         projectFile = args.projectfile
+        listSteps = args.liststeps
+        virusProject.maxWorkers = args.maxworkers
+        virusProject.failurePolicy = args.onfailure
+        workerPool.setMaxWorkers(args.itemworkers)
+        virusProject.resume = args.resume
+        virusProject.dryRun = args.dryrun
+        global useCache
+        global cacheDir
+        global cacheSize
+        # the cache is created in main(), after the logger is set up
+        useCache = not args.nocache
+        cacheDir = args.cachedir
+        cacheSize = int(args.cachesize*1024*1024*1024)
+        virusProject.forceSteps = [step.strip() for step in args.forcesteps.split(",") if step.strip()]
+        if args.referencedir is not None:
+            # imported here, the registry needs numpy/pandas and most commands don't use it
+            from pypesteps.referenceRegistry import ReferenceRegistry
+            ReferenceRegistry.setRoot(args.referencedir)
+        
+        global profileSteps
+        global profileMode
+        global sampleInterval
+        profileSteps = [step.strip() for step in args.profilesteps.split(",") if step.strip()]
+        profileMode = args.profilemode
+        sampleInterval = args.sampleinterval
+        availableSteps = StepFactory().getRegistry()
+        for profileStep in profileSteps:
+            if profileStep not in availableSteps:
+                logging.error("can't profile unrecognised step <" + profileStep + ">")
+                raise Exception("can't profile unrecognised step <" + profileStep + ">")
         #paths = args.paths
         #verbose = args.verbose
         #recurse = args.recurse
@@ -145,7 +211,8 @@ USAGE
 
         #if verbose > 0:
         #    print("Verbose mode on")
-        print(projectFile)
+        if not listSteps:
+            print(projectFile)
 
     except KeyboardInterrupt:
         ### handle keyboard interrupt ###
@@ -168,15 +235,4 @@ if __name__ == "__main__":
     if TESTRUN:
         import doctest
         doctest.testmod()
-    if PROFILE:
-        import cProfile
-        import pstats
-        profile_filename = 'fairpype.virusPipe_profile.txt'
-        cProfile.run('main()', profile_filename)
-        statsfile = open("profile_stats.txt", "wb")
-        p = pstats.Stats(profile_filename, stream=statsfile)
-        stats = p.strip_dirs().sort_stats('cumulative')
-        stats.print_stats()
-        statsfile.close()
-        sys.exit(0)
     sys.exit(main())
\ No newline at end of file
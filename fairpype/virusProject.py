@@ -6,8 +6,17 @@ Created on Dec 19, 2020
 
 import json
 import logging
+import threading
+from contextlib import nullcontext
 
 from fairpype import fairpypeConstants
+from fairpype.stepScheduler import StepScheduler
+from fairpype.stepCache import StepCache
+from fairpype.runJournal import RunJournal
+from fairpype.projectPlan import ProjectPlan
+from fairpype.artifactStore import ArtifactStore
+from fairpype.perfReport import PerfReport
+from pypesteps import workerPool
 from pypesteps.stepFactory import StepFactory
 from pypesteps.stepExit import StepExit
 
@@ -35,6 +44,37 @@ class VirusProject(object):
         
         self.md5string = " "
         
+        # steps without a shared input/output are run concurrently on this many workers
+        self.maxWorkers = 1
+        self.failurePolicy = StepScheduler.FAILFAST
+        
+        # if set, the outputs of steps are restored from this cache instead of re-running them 
+        # unless the CLASSID of the step is in `forceSteps`
+        self.stepCache = None
+        self.forceSteps = []
+        
+        # progress is recorded in the run journal. if `resume` is set, steps (and items)
+        # that completed in the previous run are skipped
+        self.resume = False
+        self.runJournal = None
+        
+        # if set, the steps are checked and the execution plan is written to the log, but nothing is run
+        self.dryRun = False
+        
+        # results published by steps for later steps in the run to use. the results of a step
+        # are released once all the steps that depend on it have finished
+        self.artifacts = ArtifactStore()
+        self.projectPlan = None
+        self.finishedSteps = set()
+        self._finishedLock = threading.Lock()
+        
+        # the resources used by each step are written to this file (next to the log file)
+        self.perfReportFile = None
+        self.perfReport = None
+        
+        # if set, the `execute()` of the selected steps is profiled
+        self.stepProfiler = None
+        
 
         
 
@@ -59,7 +99,37 @@ class VirusProject(object):
         
     def buildStepSet(self):
         '''
-        process the steps to translate them to executable format
+        process the steps to translate them to executable format, check the
+        input data of all of them and then hand them to the scheduler to execute
+        '''
+        projectPlan = self.parseSteps()
+        if self.dryRun:
+            projectPlan.report()
+            logging.info(INDENT*"-" + "dry run, no steps were executed")
+            return
+        
+        self.prepareRun()
+        scheduler = StepScheduler(self.maxWorkers, self.failurePolicy)
+        writeError = None
+        try:
+            scheduler.run(self.stepsToExecute, self.runStep, projectPlan.dependencies)
+        finally:
+            workerPool.shutdownPool()
+            # a failed write mustn't hide the error a step raised
+            try:
+                self.artifacts.flush()
+            except Exception as e:
+                logging.error(INDENT*"-" + "couldn't write all the output files: " + repr(e))
+                writeError = e
+            self.finishRun()
+        if writeError is not None:
+            raise writeError
+            
+    
+    def parseSteps(self):
+        '''
+        translate the steps to executable format and check the input data of all of them.
+        returns the `ProjectPlan`
         '''
         logging.debug(INDENT*"-" + "create StepFactory")
         vStepFactory = StepFactory()
@@ -70,7 +140,7 @@ class VirusProject(object):
             thisStep = vStepFactory.get_step(step['step'])
             if thisStep.CLASSID == StepExit.CLASSID:
                 logger.info("Found step [" + StepExit.CLASSID + "] - Exiting")
-                return
+                break
             
             logging.info(INDENT*"-" + "--found step [" + thisStep.CLASSID + "]")
             thisStep.projectRoot = self.projectRoot
@@ -79,10 +149,100 @@ class VirusProject(object):
             thisStep.jsonString = step
             thisStep.parseJSON(step)
             thisStep.parseParameterString()
-            thisStep.checkInputData()
-            thisStep.execute()
             self.stepsToExecute.append(thisStep)
             logging.debug(self.projectSteps)
+        
+        projectPlan = ProjectPlan(self.stepsToExecute)
+        projectPlan.validate()
+        self.projectPlan = projectPlan
+        return projectPlan
+    
+    
+    def prepareRun(self):
+        '''
+        set up the run journal and performance report and hand the artifact store to the steps
+        '''
+        self.runJournal = RunJournal(self.projectRoot, self.projectID, self.resume)
+        self.perfReport = PerfReport(self.perfReportFile, self.projectID)
+        self.finishedSteps = set()
+        for thisStep in self.stepsToExecute:
+            thisStep.artifacts = self.artifacts
+            
+            
+    def finishRun(self):
+        '''
+        write the performance report once all the steps have finished (or failed)
+        '''
+        self.perfReport.write()
+        self.perfReport.logSummary()
+        
+    
+    def runStep(self, thisStep):
+        '''
+        check the input data for a single step and execute it.
+        this is called by the scheduler once all the steps it depends on have finished
+        '''
+        logging.info(INDENT*"-" + "--running step [" + thisStep.CLASSID + "]")
+        stepNo = self.stepsToExecute.index(thisStep)
+        thisStep.perfRecorder = self.perfReport.stepRecorder(stepNo, thisStep)
+        try:
+            with thisStep.perfRecorder.measure("checkInputData"):
+                thisStep.checkInputData()
+            
+            # the journal only needs the size and modification time of the input files,
+            # they are only read (hashed) if the results may come from the step cache.
+            # the inputs an earlier step published may still be being written
+            self.artifacts.waitFor(thisStep.getInputPaths())
+            journalKey = StepCache.fingerprint(thisStep, quickInputs=True)
+            if self.runJournal.isStepDone(stepNo, journalKey):
+                logging.info(INDENT*"-" + "--step <" + str(stepNo) + "> [" + thisStep.CLASSID + "] completed in an earlier run, skipping")
+                return
+            
+            thisStep.itemCheckpoint = self.runJournal.startStep(stepNo, thisStep, journalKey)
+            stepProfile = nullcontext() if self.stepProfiler is None else self.stepProfiler.profile(stepNo, thisStep)
+            with thisStep.perfRecorder.measure("execute"), stepProfile:
+                self.executeStep(thisStep)
+        finally:
+            self.perfReport.write()
+            self.releaseArtifacts(stepNo)
+        # the step only counts as finished once its output files have been written
+        self.artifacts.onWritten(thisStep.getOutputPaths(), lambda: self.runJournal.finishStep(stepNo))
+        
+        
+    def releaseArtifacts(self, stepNo):
+        '''
+        record that a step has finished, and release the published results of the steps
+        (this one and the ones it depends on) that no step still to run depends on
+        '''
+        dependencies = self.projectPlan.dependencies if self.projectPlan is not None else {}
+        with self._finishedLock:
+            self.finishedSteps.add(stepNo)
+            releasedSteps = []
+            for earlierNo in sorted(set([stepNo]) | dependencies.get(stepNo, set())):
+                dependents = [laterNo for laterNo, laterDependencies in dependencies.items() if earlierNo in laterDependencies]
+                if earlierNo in self.finishedSteps and all(laterNo in self.finishedSteps for laterNo in dependents):
+                    releasedSteps.append(earlierNo)
+        for earlierNo in releasedSteps:
+            self.artifacts.release(self.stepsToExecute[earlierNo].getOutputPaths())
+            
+            
+    def executeStep(self, thisStep):
+        '''
+        execute the step, or restore its results from the step cache 
+        '''
+        if self.stepCache is None:
+            thisStep.execute()
+            return
+        
+        stepKey = StepCache.fingerprint(thisStep)
+        if thisStep.CLASSID in self.forceSteps:
+            logging.info(INDENT*"-" + "--step [" + thisStep.CLASSID + "] is forced, ignoring the cache")
+        elif self.stepCache.restore(stepKey, thisStep):
+            return
+        outputSnapshot = self.stepCache.snapshotOutputs(thisStep)
+        thisStep.execute()
+        self.artifacts.waitFor(thisStep.getOutputPaths())
+        self.stepCache.store(stepKey, thisStep, outputSnapshot)
             
         
     def registerSteps(self):
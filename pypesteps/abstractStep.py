@@ -3,8 +3,17 @@ Created on Dec 18, 2020
 
 @author: simonray
 '''
+import os
+import re
+import logging
+import threading
 from abc import ABC, abstractmethod
 
+from pypesteps import workerPool
+
+logger = logging.getLogger(__name__)
+INDENT = 6
+
 class AbstractStep(ABC):
     '''
     this is an Abstract class inherited by all other step classes.
@@ -13,6 +22,31 @@ class AbstractStep(ABC):
     INFOLDERID      = "inFolder"
     INFILESID       = "inFiles"
     OUTFOLDERID     = "outFolder"
+    
+    # the reference records (contigs/segments) a step works on, `--contig ID [ID ...]` in the 
+    # parameter string. All the records are used if none are given
+    CONTIGLONG      = "--contig"
+    contigs         = []
+    
+    # names of the attributes that hold file paths specified in the parameter string 
+    # (e.g. `refFastA`). These are inputs to the step in the same way as `inFiles`
+    # and are used by the scheduler to work out which steps depend on each other
+    FILEPARAMS      = []
+    
+    # matplotlib (and hence plotnine) isn't thread safe, so steps that run
+    # concurrently have to take turns at saving plots
+    PLOTLOCK        = threading.Lock()
+    
+    # attributes set by the pipeline while the step is running (rather than parsed from 
+    # the JSON). These aren't part of the step definition and aren't sent to the worker processes
+    RUNTIMEATTRS    = ["itemCheckpoint", "pendingOutputs", "artifacts", "perfRecorder"]
+    
+    # output folders of earlier steps that haven't run yet. This is set while the project
+    # is being planned so that `checkInputData()` accepts files that an earlier step will create
+    pendingOutputs  = []
+    
+    # the artifact store shared by the steps in a run (see `fairpype/artifactStore.py`), or None
+    artifacts       = None
 
     def __init__(self, params):
         '''
@@ -66,4 +100,192 @@ class AbstractStep(ABC):
     
     @abstractmethod
     def execute(self):
-        pass    
\ No newline at end of file
+        pass
+    
+    
+    def getInputPaths(self):
+        '''
+        return the absolute paths of all the files and folders this step reads.
+        
+        This is the input folder joined with each entry in `inFiles` (or the input 
+        folder itself if no files were specified) plus the paths held in the 
+        attributes listed in `FILEPARAMS`.
+        paths can be absolute or relative (to Project Root)
+        '''
+        inputFolder = os.path.join(self.projectRoot, self.inFolder)
+        inputPaths = [os.path.normpath(os.path.join(inputFolder, inputFile)) for inputFile in self.inputFiles if inputFile]
+        if not inputPaths:
+            inputPaths.append(os.path.normpath(inputFolder))
+        return inputPaths + self.getFileParamPaths()
+    
+    
+    def getFileParamPaths(self):
+        '''
+        return the absolute paths held in the attributes listed in `FILEPARAMS`
+        '''
+        paramPaths = []
+        for fileParam in self.FILEPARAMS:
+            paramPath = getattr(self, fileParam, "")
+            if paramPath:
+                paramPaths.append(os.path.normpath(os.path.join(self.projectRoot, paramPath)))
+        return paramPaths
+    
+    
+    def fileExists(self, filePath):
+        '''
+        true if the file or folder exists, or will be created by an earlier step (see `pendingOutputs`).
+        should be used in place of `os.path.exists()` when checking input data
+        paths can be absolute or relative (to Project Root)
+        '''
+        if os.path.exists(filePath):
+            return True
+        projectPath = os.path.normpath(os.path.join(self.projectRoot, filePath))
+        if os.path.exists(projectPath):
+            return True
+        if self.artifacts is not None and self.artifacts.has(projectPath):
+            # published by an earlier step, the file may still be being written
+            return True
+        for pendingOutput in self.pendingOutputs:
+            if projectPath == pendingOutput or projectPath.startswith(pendingOutput.rstrip(os.path.sep) + os.path.sep):
+                logging.info(INDENT*'-' + "<" + projectPath + "> will be created by an earlier step")
+                return True
+        return False
+    
+    
+    def publishArtifact(self, filePath, value, writer=None, kind="data"):
+        '''
+        make a result available to later steps in the run and write `filePath` with `writer(filePath)`.
+        the file is written in the background if there is an artifact store, otherwise straight away
+        '''
+        if self.artifacts is None:
+            if writer is not None:
+                writer(filePath)
+            return
+        self.artifacts.publish(filePath, value, writer, kind)
+        
+        
+    def loadArtifact(self, filePath, loader, kind="data"):
+        '''
+        return the result an earlier step published for `filePath`, or `loader(filePath)` if there isn't one
+        paths can be absolute or relative (to Project Root)
+        '''
+        filePath = os.path.join(self.projectRoot, filePath)
+        if self.artifacts is None:
+            return loader(filePath)
+        value = self.artifacts.get(filePath, kind)
+        if value is not None:
+            logging.info(INDENT*'-' + "--using result published for <" + filePath + "> (" + kind + ")")
+            return value
+        self.artifacts.waitFor([filePath])
+        return loader(filePath)
+    
+    
+    def savePlot(self, plot, plotFile):
+        '''
+        save a plotnine plot using the plot size and resolution of the step
+        '''
+        with self.PLOTLOCK:
+            plot.save(filename = plotFile, height=self.PLOTHEIGHT, width=self.PLOTWIDTH, dpi=self.PLOTDPI)
+    
+    
+    @staticmethod
+    def loadReferenceMetadata(fastaFile):
+        '''
+        the IDs and lengths of the records in a FASTA file. This is what steps publish
+        as the `metadata` artifact of a reference. The FASTA file is only read if it 
+        isn't already in the reference registry (see `referenceRegistry.py`)
+        '''
+        from pypesteps.referenceRegistry import ReferenceRegistry
+        entry = ReferenceRegistry().metadata(fastaFile)
+        return {"ids": list(entry["ids"]), "lengths": list(entry["lengths"])}
+    
+    
+    def selectContigs(self, refMetadata):
+        '''
+        the (ID, length) of the records in the reference that the step should work on
+        (those in `contigs`, or all of them)
+        '''
+        for contigID in self.contigs:
+            if contigID not in refMetadata["ids"]:
+                logging.error("contig <" + contigID + "> not found in the reference. Found <" + "|".join(refMetadata["ids"]) + ">")
+                raise Exception("contig <" + contigID + "> not found in the reference. Found <" + "|".join(refMetadata["ids"]) + ">")
+        return [(contigID, contigLen) for contigID, contigLen in zip(refMetadata["ids"], refMetadata["lengths"]) \
+                if not self.contigs or contigID in self.contigs]
+    
+    
+    @staticmethod
+    def contigLabel(contigID, refMetadata):
+        '''
+        the part of an output file name that identifies the contig. This is empty if the
+        reference only has one record, so single record references keep the same file names
+        '''
+        if len(refMetadata["ids"]) <= 1:
+            return ""
+        return "__" + re.sub(r"[^A-Za-z0-9._-]", "_", contigID)
+    
+    
+    def getOutputPaths(self):
+        '''
+        return the absolute paths of the folders this step writes to 
+        '''
+        return [os.path.normpath(os.path.join(self.projectRoot, self.outFolder))]
+    
+    
+    def processItem(self, item):
+        '''
+        process a single input item (usually one entry in `inputFiles`) and return 
+        whatever `reduceItems` needs to combine the results. 
+        
+        Steps that override this should write any per item output files here and
+        call `executeItems()` from `execute()`. This may run in a different process, 
+        so the return value has to be picklable and changes to `self` are not seen 
+        by `execute()`
+        '''
+        logging.error(self.CLASSID + " doesn't process individual items")
+        raise Exception(self.CLASSID + " doesn't process individual items")
+    
+    
+    def reduceItems(self, results):
+        '''
+        combine the results returned by `processItem` (in the same order as the items)
+        '''
+        return results
+    
+    
+    def executeItems(self, items):
+        '''
+        map `processItem` over the items on the shared process pool and then
+        combine the results with `reduceItems`
+        
+        if the pipeline has set an `itemCheckpoint`, items that were finished in an
+        earlier (failed) run are not processed again and their saved results are used.
+        if it has set a `perfRecorder`, the resources used by each item are recorded
+        '''
+        itemCheckpoint = getattr(self, "itemCheckpoint", None)
+        perfRecorder = getattr(self, "perfRecorder", None)
+        onItemMeasured = None if perfRecorder is None else perfRecorder.recordItem
+        if itemCheckpoint is None:
+            return self.reduceItems(workerPool.mapItems(self, items, onItemMeasured=onItemMeasured))
+        
+        results = [None]*len(items)
+        pendingItems = []
+        for itemNo, item in enumerate(items):
+            if itemCheckpoint.isDone(item):
+                results[itemNo] = itemCheckpoint.result(item)
+            else:
+                pendingItems.append(itemNo)
+        
+        pendingResults = workerPool.mapItems(self, [items[itemNo] for itemNo in pendingItems], itemCheckpoint.record, onItemMeasured)
+        for itemNo, result in zip(pendingItems, pendingResults):
+            results[itemNo] = result
+        return self.reduceItems(results)
+    
+    
+    def __getstate__(self):
+        '''
+        leave out the runtime attributes when the step is sent to a worker process
+        '''
+        state = self.__dict__.copy()
+        for attrName in self.RUNTIMEATTRS:
+            state.pop(attrName, None)
+        return state
@@ -0,0 +1,152 @@
+#!/usr/bin/python
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+'''
+
+import sys
+import zlib
+import shlex
+import bisect
+import getopt
+import logging
+import tempfile
+import subprocess
+
+try:
+    import pysam
+except ImportError:
+    pysam = None
+
+
+logger = logging.getLogger(__name__)
+INDENT = 6
+
+HASHRANGE       = float(1 << 32)
+BUFFERSIZE      = 1024*1024
+
+
+def readFraction(readName, seed=0):
+    '''
+    a value between 0 and 1 from the CRC32 of the read name. A read is kept in every
+    subsample with a fraction larger than this, so the mates of a pair are kept together,
+    each subsample is nested in the larger ones and the same reads are kept every time
+    '''
+    if isinstance(readName, str):
+        readName = readName.encode()
+    return zlib.crc32(readName, seed)/HASHRANGE
+
+
+def subsampleBAM(bamFile, outputs, softwarePath="samtools", seed=0):
+    '''
+    write subsamples of `bamFile` to each of `outputs`, a list of (fraction, BAM file),
+    reading `bamFile` once. The reads stay in the same order, so a sorted BAM file gives
+    sorted subsamples. Uses pysam if it is installed, otherwise streams `samtools view -h`
+    into a `samtools view -b` for each output. Returns the number of reads written to each
+    output
+    '''
+    outputs = sorted(outputs, key=lambda output: output[0])
+    for fraction, outFile in outputs:
+        if not 0 < fraction <= 1:
+            logging.error("subsample fraction for <" + outFile + "> must be > 0 and <= 1 (found <" + str(fraction) + ">)")
+            raise Exception("subsample fraction for <" + outFile + "> must be > 0 and <= 1 (found <" + str(fraction) + ">)")
+    logging.info(INDENT*'-' + "--subsampling <" + bamFile + "> into <" + str(len(outputs)) + "> BAM files")
+    if pysam is not None:
+        return subsamplePysam(bamFile, outputs, seed)
+    return subsampleSamtools(bamFile, outputs, softwarePath, seed)
+
+
+def subsamplePysam(bamFile, outputs, seed=0):
+    fractions = [fraction for fraction, outFile in outputs]
+    readCounts = [0]*len(outputs)
+    with pysam.AlignmentFile(bamFile, "rb") as bamIn:
+        writers = [pysam.AlignmentFile(outFile, "wb", template=bamIn) for fraction, outFile in outputs]
+        try:
+            for read in bamIn.fetch(until_eof=True):
+                # the read goes to every output with a fraction larger than its hash
+                for outputNo in range(bisect.bisect_right(fractions, readFraction(read.query_name, seed)), len(outputs)):
+                    writers[outputNo].write(read)
+                    readCounts[outputNo] += 1
+        finally:
+            for writer in writers:
+                writer.close()
+    return readCounts
+
+
+def subsampleSamtools(bamFile, outputs, softwarePath="samtools", seed=0):
+    fractions = [fraction for fraction, outFile in outputs]
+    readCounts = [0]*len(outputs)
+    command = softwarePath + ' view -h ' + bamFile
+    logging.debug(INDENT*'-' + "--SAMTools command is <"+ command + ">")
+    outFiles = [open(outFile, 'wb') for fraction, outFile in outputs]
+    with tempfile.TemporaryFile() as errFile:
+        writers = [subprocess.Popen(shlex.split(softwarePath + ' view -b -'), stdin=subprocess.PIPE, stdout=outBAM,
+                                    stderr=errFile, bufsize=BUFFERSIZE) for outBAM in outFiles]
+        process = subprocess.Popen(shlex.split(command), stdout=subprocess.PIPE, stderr=errFile, bufsize=BUFFERSIZE)
+        try:
+            for line in process.stdout:
+                if line.startswith(b'@'):
+                    for writer in writers:
+                        writer.stdin.write(line)
+                    continue
+                readName = line.split(b'\t', 1)[0]
+                for outputNo in range(bisect.bisect_right(fractions, readFraction(readName, seed)), len(outputs)):
+                    writers[outputNo].stdin.write(line)
+                    readCounts[outputNo] += 1
+        finally:
+            process.stdout.close()
+            for writer in writers:
+                writer.stdin.close()
+            returnCodes = [process.wait()] + [writer.wait() for writer in writers]
+            for outBAM in outFiles:
+                outBAM.close()
+        if any(returnCodes):
+            errFile.seek(0)
+            errorText = errFile.read().decode(errors="replace").strip()
+            logging.error("subsampling <" + bamFile + "> failed (" + errorText + ")")
+            raise Exception("subsampling <" + bamFile + "> failed (" + errorText + ")")
+    return readCounts
+
+
+def main(argv):
+    """write subsamples of a BAM file, reading it once
+
+    Parameters:
+    bamFile      (string): the BAM file to subsample
+    outputs      (string): one or more <fraction>:<BAM file>, e.g. 0.1:sample__sp_10_so.bam
+    softwarePath (string): samtools (only used if pysam isn't installed)
+    seed         (int)   : seed of the read name hash
+
+    """
+    softwarePath = 'samtools'
+    seed = 0
+    usage = 'python -m pypesteps.bamSubsampler [-p <samtools>] [-e <seed>] <bamfile> <fraction>:<outbamfile> [<fraction>:<outbamfile> ...]'
+    try:
+        opts, args = getopt.getopt(argv, "hp:e:", ["path_to_software=", "seed="])
+    except getopt.GetoptError:
+        print (usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print (usage)
+            sys.exit()
+        elif opt in ("-p", "--path_to_software"):
+            softwarePath = arg
+        elif opt in ("-e", "--seed"):
+            seed = int(arg)
+    if len(args) < 2:
+        print (usage)
+        sys.exit(2)
+
+    outputs = []
+    for output in args[1:]:
+        fraction, outFile = output.split(":", 1)
+        outputs.append((float(fraction), outFile))
+    readCounts = subsampleBAM(args[0], outputs, softwarePath, seed)
+    for (fraction, outFile), readCount in zip(sorted(outputs, key=lambda output: output[0]), readCounts):
+        print("<" + str(readCount) + "> reads written to <" + outFile + "> (" + str(fraction) + ")")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
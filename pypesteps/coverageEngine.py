@@ -0,0 +1,227 @@
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+'''
+
+import os
+import shlex
+import shutil
+import logging
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from pypesteps import bamSubsampler
+
+
+logger = logging.getLogger(__name__)
+INDENT = 6
+
+# rows of `samtools depth` output parsed at a time
+CHUNKROWS       = 1 << 20
+DEPTHCOLUMNS    = ["id", "pos", "depth"]
+
+# region shards start on a 16 kb boundary, the bin size of the BAM linear index,
+# so each `samtools depth -r` only reads the part of the BAM file for its shard
+SHARDALIGN      = 16384
+INDEXSUFFIXES   = [".bai", ".csi"]
+
+# the seed of the `samtools view -s` quick look subsample
+SUBSAMPLESEED   = 1
+
+
+def depthCommand(bamFile, region=None, softwarePath="samtools"):
+    '''
+    the `samtools depth` command for a BAM file. `-a` is used so every position of the
+    reference (or of `region`) is reported, including positions without any reads
+    '''
+    command = softwarePath + ' depth -a ' + bamFile
+    if region:
+        command += ' -r ' + region
+    return command
+
+
+def bamDepth(bamFile, genomeLen, region=None, softwarePath="samtools", tsvFile=None, chunkRows=CHUNKROWS, depth=None, offset=0):
+    '''
+    the read depth at each position of a record as an int32 array of `genomeLen` values
+    (position 1 is at index 0). `samtools depth` is run for `region` (the whole BAM
+    file if it isn't given) and its output is parsed as it arrives, `chunkRows` rows at
+    a time, so the per base table is never written to disk or held in memory as text.
+
+    if `tsvFile` is given the samtools output is also written there (this used to be the
+    `_ntcov.tsv` file the windows were calculated from)
+    
+    if `depth` is given the values are written to it instead, with position `offset + 1` 
+    at index 0 (this is how the region shards fill their part of the record)
+    '''
+    command = depthCommand(bamFile, region, softwarePath)
+    logging.debug(INDENT*'-' + "--SAMTools command is <"+ command + ">")
+    if depth is None:
+        depth = np.zeros(genomeLen, dtype=np.int32)
+    with tempfile.TemporaryFile() as errFile:
+        process = subprocess.Popen(shlex.split(command), stdout=subprocess.PIPE, stderr=errFile)
+        try:
+            streamDepth(process.stdout, depth, tsvFile, chunkRows, offset)
+        finally:
+            process.stdout.close()
+            returnCode = process.wait()
+        logger.info(INDENT*'-' + "--process finished with return code <" + str(returnCode) + ">")
+        if returnCode != 0:
+            errFile.seek(0)
+            errorText = errFile.read().decode(errors="replace").strip()
+            logging.error("samtools depth failed for <" + bamFile + "> (" + errorText + ")")
+            raise Exception("samtools depth failed for <" + bamFile + "> (" + errorText + ")")
+    return depth
+
+
+def subsampleArgument(fraction, seed):
+    '''
+    the `samtools view -s` argument, the integer part is the seed and the rest the fraction
+    '''
+    if not 0 < fraction < 1:
+        logging.error("subsample fraction must be > 0 and < 1 (found <" + str(fraction) + ">)")
+        raise Exception("subsample fraction must be > 0 and < 1 (found <" + str(fraction) + ">)")
+    return str(seed) + "." + "{:.8f}".format(fraction).split(".")[1]
+
+
+def bamDepthQuickLook(bamFile, genomeLen, fraction, region=None, softwarePath="samtools", seed=SUBSAMPLESEED, chunkRows=CHUNKROWS):
+    '''
+    the read depth of two independent halves of a subsample of `fraction` of the reads, from
+    a single pass through the BAM file. `samtools view -s` selects the subsample (which reads
+    are kept only depends on the read name and `seed`, so it is the same every time) and the
+    reads are split into halves by the hash of the read name (see `bamSubsampler.readFraction()`),
+    each piped into its own `samtools depth -a -`.
+
+    `(half1 + half2)/fraction` is an estimate of the depth of the whole BAM file, and the
+    difference between the halves is an estimate of its error (see
+    `coverageWindows.windowSplitHalfError()`)
+    '''
+    logging.info(INDENT*'-' + "--quick look coverage of <" + bamFile + "> from <" + str(fraction) + "> of the reads")
+    viewCommand = softwarePath + ' view -h -s ' + subsampleArgument(fraction, seed) + ' ' + bamFile
+    if region:
+        viewCommand += ' ' + region
+    command = softwarePath + ' depth -a -'
+    logging.debug(INDENT*'-' + "--SAMTools command is <"+ viewCommand + " | " + command + " (x2)>")
+    halfDepths = [np.zeros(genomeLen, dtype=np.int32) for halfNo in range(2)]
+    with tempfile.TemporaryFile() as errFile:
+        processes = [subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=errFile,
+                                      bufsize=bamSubsampler.BUFFERSIZE) for halfNo in range(2)]
+        viewProcess = subprocess.Popen(shlex.split(viewCommand), stdout=subprocess.PIPE, stderr=errFile, 
+                                       bufsize=bamSubsampler.BUFFERSIZE)
+        # the depth of each half is parsed while the reads are still being written to it
+        with ThreadPoolExecutor(max_workers=len(processes)) as executor:
+            futures = [executor.submit(streamDepth, process.stdout, halfDepth, None, chunkRows)
+                       for process, halfDepth in zip(processes, halfDepths)]
+            try:
+                for line in viewProcess.stdout:
+                    if line.startswith(b'@'):
+                        for process in processes:
+                            process.stdin.write(line)
+                        continue
+                    halfNo = int(bamSubsampler.readFraction(line.split(b'\t', 1)[0], seed) >= 0.5)
+                    processes[halfNo].stdin.write(line)
+            except BrokenPipeError:
+                # a `samtools depth` failed, its error is reported below
+                pass
+            finally:
+                viewProcess.stdout.close()
+                for process in processes:
+                    try:
+                        process.stdin.close()
+                    except BrokenPipeError:
+                        pass
+                for future in futures:
+                    future.result()
+                returnCodes = [viewProcess.wait()] + [process.wait() for process in processes]
+                for process in processes:
+                    process.stdout.close()
+        logger.info(INDENT*'-' + "--processes finished with return codes <" + ",".join(str(returnCode) for returnCode in returnCodes) + ">")
+        if any(returnCodes):
+            errFile.seek(0)
+            errorText = errFile.read().decode(errors="replace").strip()
+            logging.error("samtools view | depth failed for <" + bamFile + "> (" + errorText + ")")
+            raise Exception("samtools view | depth failed for <" + bamFile + "> (" + errorText + ")")
+    return halfDepths
+
+
+def shardRegions(genomeLen, noOfShards, shardAlign=SHARDALIGN):
+    '''
+    split a record into (at most) `noOfShards` (start, end) regions (0 based, end not
+    included) that start on a multiple of `shardAlign`
+    '''
+    if genomeLen <= 0:
+        return []
+    shardSize = -(-genomeLen//max(noOfShards, 1))
+    shardSize = max(-(-shardSize//shardAlign)*shardAlign, shardAlign)
+    return [(start, min(start + shardSize, genomeLen)) for start in range(0, genomeLen, shardSize)]
+
+
+def bamIndexExists(bamFile):
+    return any(os.path.exists(bamFile + suffix) or os.path.exists(os.path.splitext(bamFile)[0] + suffix) for suffix in INDEXSUFFIXES)
+
+
+def bamDepthSharded(bamFile, contigID, genomeLen, noOfShards, softwarePath="samtools", tsvFile=None, chunkRows=CHUNKROWS):
+    '''
+    the same as `bamDepth()` for the record `contigID`, but the record is split into index 
+    aligned region shards (see `shardRegions()`) and `samtools depth -r` is run for all the 
+    shards at the same time. Each shard fills its own part of the array, and the depth at 
+    a position doesn't depend on the rest of the record, so the result is identical to a 
+    single `samtools depth` run. The BAM file has to be indexed, otherwise it isn't sharded
+    '''
+    shards = shardRegions(genomeLen, noOfShards)
+    if len(shards) <= 1 or not bamIndexExists(bamFile):
+        if len(shards) > 1:
+            logging.warning(INDENT*'-' + "--BAM file <" + bamFile + "> isn't indexed, the coverage can't be calculated in shards")
+        return bamDepth(bamFile, genomeLen, contigID, softwarePath, tsvFile, chunkRows)
+
+    logging.info(INDENT*'-' + "--calculating coverage of <" + contigID + "> in <" + str(len(shards)) + "> shards")
+    depth = np.zeros(genomeLen, dtype=np.int32)
+    shardFiles = [None]*len(shards)
+    if tsvFile is not None:
+        shardFiles = [tsvFile + ".shard" + str(shardNo) for shardNo in range(len(shards))]
+    with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        futures = [executor.submit(bamDepth, bamFile, genomeLen, contigID + ":" + str(start + 1) + "-" + str(end), 
+                                   softwarePath, shardFile, chunkRows, depth[start:end], start)
+                   for (start, end), shardFile in zip(shards, shardFiles)]
+        for future in futures:
+            future.result()
+    
+    # stitch the per nt tables back together in order
+    if tsvFile is not None:
+        with open(tsvFile, 'wb') as tsvOut:
+            for shardFile in shardFiles:
+                with open(shardFile, 'rb') as shardIn:
+                    shutil.copyfileobj(shardIn, tsvOut)
+                os.remove(shardFile)
+    return depth
+
+
+def streamDepth(depthStream, depth, tsvFile=None, chunkRows=CHUNKROWS, offset=0):
+    '''
+    parse `samtools depth` output (ID, position, depth) from a file or stream into the
+    `depth` array, with position `offset + 1` at index 0. Positions outside the array 
+    are ignored. Returns the number of rows read
+    '''
+    if tsvFile is not None and os.path.exists(tsvFile):
+        os.remove(tsvFile)
+    rowCount = 0
+    try:
+        chunks = pd.read_csv(depthStream, sep='\t', header=None, names=DEPTHCOLUMNS, usecols=[0, 1, 2],
+                             dtype={"id": str, "pos": np.int64, "depth": np.int32}, chunksize=chunkRows)
+        for chunk in chunks:
+            positions = chunk["pos"].to_numpy() - 1 - offset
+            inRange = (positions >= 0) & (positions < len(depth))
+            depth[positions[inRange]] = chunk["depth"].to_numpy()[inRange]
+            rowCount += len(chunk)
+            if tsvFile is not None:
+                chunk.to_csv(tsvFile, sep='\t', header=False, index=False, mode='a')
+    except pd.errors.EmptyDataError:
+        # no reads and no positions (e.g. an empty region)
+        pass
+    if tsvFile is not None and not os.path.exists(tsvFile):
+        open(tsvFile, 'w').close()
+    return rowCount
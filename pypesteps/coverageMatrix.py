@@ -0,0 +1,161 @@
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+'''
+
+import os
+import json
+import logging
+import threading
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+INDENT = 6
+
+
+class CoverageMatrix(object):
+    '''
+    a samples x positions matrix of (sliding window) read coverage, kept on disk as a
+    memory mapped `.npy` file with the sample names, the positions and anything else
+    needed to interpret the values (window size, step size, record ID, ...) in a `.json`
+    file next to it
+
+        <base>.npy      the values, one row per sample, NaN where a sample has no value
+        <base>.json     {"samples": [...], "positions": [...], "metadata": {...}}
+
+    Each sample fills its own row, so there is no merging of tables, and the combined
+    tables (CSV files, plot data) are views of the matrix.
+
+        matrix = CoverageMatrix.create(basePath, samples, positions, {"windowSize": 100})
+        matrix.setRow("sample1", positions1, values1)
+        matrix.flush()
+        matrix = CoverageMatrix.load(basePath)
+    '''
+    MATRIXSUFFIX    = ".npy"
+    METADATASUFFIX  = ".json"
+
+
+    def __init__(self, basePath, samples, positions, values, metadata=None):
+        '''
+        Constructor (use `create()` or `load()`)
+        '''
+        self.basePath = basePath
+        self.samples = list(samples)
+        self.positions = np.asarray(positions, dtype=np.int64)
+        self.values = values
+        self.metadata = metadata if metadata is not None else {}
+
+
+    @classmethod
+    def create(cls, basePath, samples, positions, metadata=None, dtype=np.float64):
+        '''
+        create a matrix on disk with all the values set to NaN
+        '''
+        os.makedirs(os.path.dirname(os.path.abspath(basePath)), exist_ok=True)
+        values = np.lib.format.open_memmap(basePath + cls.MATRIXSUFFIX, mode="w+", dtype=dtype,
+                                           shape=(len(samples), len(positions)))
+        values[:] = np.nan
+        matrix = cls(basePath, samples, positions, values, metadata)
+        matrix.writeMetadata()
+        logging.info(INDENT*'-' + "--created coverage matrix <" + basePath + cls.MATRIXSUFFIX + "> (<" \
+                     + str(len(samples)) + "> samples x <" + str(len(positions)) + "> positions)")
+        return matrix
+
+
+    @classmethod
+    def load(cls, basePath, mode="r"):
+        '''
+        open a matrix that is already on disk (memory mapped, read only by default)
+        '''
+        with open(basePath + cls.METADATASUFFIX) as metadataFile:
+            matrixJSON = json.load(metadataFile)
+        values = np.load(basePath + cls.MATRIXSUFFIX, mmap_mode=mode)
+        if values.shape != (len(matrixJSON["samples"]), len(matrixJSON["positions"])):
+            logging.error("coverage matrix <" + basePath + "> doesn't match its metadata")
+            raise Exception("coverage matrix <" + basePath + "> doesn't match its metadata")
+        return cls(basePath, matrixJSON["samples"], matrixJSON["positions"], values, matrixJSON.get("metadata"))
+
+
+    @classmethod
+    def exists(cls, basePath):
+        return os.path.exists(basePath + cls.MATRIXSUFFIX) and os.path.exists(basePath + cls.METADATASUFFIX)
+
+
+    def __len__(self):
+        return len(self.samples)
+
+
+    def rowIndex(self, sample):
+        if sample not in self.samples:
+            logging.error("sample <" + str(sample) + "> not found in coverage matrix <" + self.basePath + ">")
+            raise Exception("sample <" + str(sample) + "> not found in coverage matrix <" + self.basePath + ">")
+        return self.samples.index(sample)
+
+
+    def row(self, sample):
+        return self.values[self.rowIndex(sample)]
+
+
+    def setRow(self, sample, positions, values):
+        '''
+        set the values of a sample. `positions` don't have to cover the whole matrix,
+        the other values of the row are set to NaN
+        '''
+        positions = np.asarray(positions, dtype=np.int64)
+        columns = np.searchsorted(self.positions, positions)
+        inMatrix = (columns < len(self.positions))
+        inMatrix[inMatrix] = self.positions[columns[inMatrix]] == positions[inMatrix]
+        if not inMatrix.all():
+            logging.warning(INDENT*'-' + "--<" + str(np.count_nonzero(~inMatrix)) + "> positions of <" + str(sample) \
+                            + "> aren't in the coverage matrix and were ignored")
+        rowValues = np.full(len(self.positions), np.nan)
+        rowValues[columns[inMatrix]] = np.asarray(values, dtype=np.float64)[inMatrix]
+        self.values[self.rowIndex(sample)] = rowValues
+
+
+    def clearRow(self, sample):
+        self.values[self.rowIndex(sample)] = np.nan
+
+
+    def filledRows(self):
+        '''
+        a boolean for each sample, True if it has at least one value
+        '''
+        return ~np.isnan(self.values).all(axis=1) if len(self.positions) else np.zeros(len(self.samples), dtype=bool)
+
+
+    def withSamples(self, samples):
+        '''
+        a matrix with these samples (in this order) in place of this one, keeping the rows
+        of the samples that are already in the matrix. New samples have no values (NaN).
+        If the samples are the same this matrix is opened for writing, otherwise the matrix
+        is rewritten
+        '''
+        if list(samples) == self.samples:
+            return CoverageMatrix.load(self.basePath, mode="r+")
+        tmpBase = self.basePath + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+        newMatrix = CoverageMatrix.create(tmpBase, samples, self.positions, self.metadata, self.values.dtype)
+        for rowNo, sample in enumerate(newMatrix.samples):
+            if sample in self.samples:
+                newMatrix.values[rowNo] = self.values[self.rowIndex(sample)]
+        newMatrix.flush()
+        del newMatrix
+        for suffix in [self.MATRIXSUFFIX, self.METADATASUFFIX]:
+            os.replace(tmpBase + suffix, self.basePath + suffix)
+        return CoverageMatrix.load(self.basePath, mode="r+")
+
+
+    def flush(self):
+        if isinstance(self.values, np.memmap):
+            self.values.flush()
+
+
+    def writeMetadata(self):
+        metadataPath = self.basePath + self.METADATASUFFIX
+        tmpFile = metadataPath + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+        with open(tmpFile, 'w') as metadataFile:
+            json.dump({"samples": self.samples, "positions": self.positions.tolist(), "metadata": self.metadata}, metadataFile)
+        os.replace(tmpFile, metadataPath)
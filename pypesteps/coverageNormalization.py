@@ -0,0 +1,91 @@
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+'''
+
+import logging
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+INDENT = 6
+
+NORMMINMAX          = "minmax"
+NORMCPM             = "cpm"
+NORMMEDIANRATIO     = "medianratio"
+NORMQUANTILE        = "quantile"
+NORMALIZATIONS      = [NORMMINMAX, NORMCPM, NORMMEDIANRATIO, NORMQUANTILE]
+
+
+def normalizeMatrix(values, method=NORMMINMAX):
+    '''
+    normalise a samples x windows coverage matrix (see `CoverageMatrix`). All the samples
+    are normalised at once. Rows without any values (NaN) stay NaN
+
+        minmax          each sample scaled to 0-1 (the same as sklearn's `MinMaxScaler`)
+        cpm             each sample scaled to a total of one million (total depth)
+        medianratio     each sample divided by its size factor, the median ratio of its coverage
+                        to the geometric mean coverage of the window over all the samples (DESeq)
+        quantile        every sample given the same distribution, the mean of the sorted samples
+    '''
+    normFunctions = {NORMMINMAX: minMaxRows, NORMCPM: cpmRows, NORMMEDIANRATIO: medianRatioRows, NORMQUANTILE: quantileRows}
+    if method not in normFunctions:
+        logging.error("unknown normalization <" + str(method) + ">. Options are <" + "|".join(NORMALIZATIONS) + ">")
+        raise Exception("unknown normalization <" + str(method) + ">. Options are <" + "|".join(NORMALIZATIONS) + ">")
+    values = np.asarray(values, dtype=np.float64)
+    normValues = np.full(values.shape, np.nan)
+    filledRows = ~np.isnan(values).all(axis=1) if values.shape[1] else np.zeros(len(values), dtype=bool)
+    if filledRows.any():
+        normValues[filledRows] = normFunctions[method](values[filledRows])
+    return normValues
+
+
+def minMaxRows(values):
+    '''
+    scale each row to 0-1. Rows without any variation are set to 0
+    '''
+    rowMin = np.nanmin(values, axis=1, keepdims=True)
+    rowRange = np.nanmax(values, axis=1, keepdims=True) - rowMin
+    return (values - rowMin)/np.where(rowRange > 0, rowRange, 1)
+
+
+def cpmRows(values):
+    '''
+    scale each row to a total of one million. Rows without any coverage are set to 0
+    '''
+    rowTotal = np.nansum(values, axis=1, keepdims=True)
+    return values*1e6/np.where(rowTotal > 0, rowTotal, 1)
+
+
+def medianRatioRows(values):
+    '''
+    divide each row by its size factor. Only windows with coverage in every sample are
+    used for the size factors. If there aren't any the rows are left as they are
+    '''
+    covered = (values > 0).all(axis=0)
+    if not covered.any():
+        logging.warning(INDENT*'-' + "--no windows are covered in every sample, the median of ratios can't be calculated")
+        return values.copy()
+    logValues = np.log(values[:, covered])
+    logRatios = logValues - logValues.mean(axis=0, keepdims=True)
+    sizeFactors = np.exp(np.median(logRatios, axis=1, keepdims=True))
+    return values/sizeFactors
+
+
+def quantileRows(values):
+    '''
+    replace each value with the mean (over all the rows) of the values with the same rank.
+    Rows with missing values are mapped onto the reference distribution by their quantile
+    '''
+    sortedValues = np.sort(values, axis=1)
+    validCounts = np.count_nonzero(~np.isnan(values), axis=1)
+    completeRows = validCounts == values.shape[1]
+    reference = np.mean(sortedValues[completeRows], axis=0) if completeRows.any() else np.nanmean(sortedValues, axis=0)
+
+    ranks = np.argsort(np.argsort(values, axis=1, kind="stable"), axis=1)
+    referencePos = ranks*(len(reference) - 1)/np.maximum(validCounts - 1, 1)[:, None]
+    normValues = np.interp(referencePos.ravel(), np.arange(len(reference)), reference).reshape(values.shape)
+    normValues[np.isnan(values)] = np.nan
+    return normValues
@@ -0,0 +1,177 @@
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+'''
+
+import os
+import csv
+import logging
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+INDENT = 6
+
+
+class RLECoverage(object):
+    '''
+    the read depth at each position of a record as runs of the same depth, which is much
+    smaller than the per nt table for most BAM files (long stretches with no reads, or the
+    same number of reads). Run `i` covers positions `runStarts[i]` to `runStarts[i+1] - 1`
+    (0 based) and has depth `runValues[i]`.
+
+    Saved as a `.npz` file with the run starts and depths, the record ID and length.
+    The queries (breadth, quantiles, low coverage intervals and window means) work on
+    the runs, the depth array is never rebuilt
+
+        rleCoverage = RLECoverage.fromDepth(ntCoverage, contigID)
+        rleCoverage.breadth(10)                  # fraction of the record covered >= 10 times
+        rleCoverage.quantiles([0.05, 0.5])       # depth quantiles
+        rleCoverage.lowCoverageIntervals(5)      # (start, end) of the regions covered < 5 times
+        rleCoverage.save(npzFile)
+    '''
+    NPZSUFFIX       = ".npz"
+
+
+    def __init__(self, seqID, runStarts, runValues, length):
+        '''
+        Constructor (use `fromDepth()` or `load()`)
+        '''
+        self.seqID = seqID
+        self.runStarts = np.asarray(runStarts, dtype=np.int64)
+        self.runValues = np.asarray(runValues, dtype=np.int32)
+        self.length = int(length)
+
+
+    @classmethod
+    def fromDepth(cls, depth, seqID=""):
+        depth = np.asarray(depth)
+        if len(depth) == 0:
+            return cls(seqID, [], [], 0)
+        runStarts = np.concatenate([[0], np.flatnonzero(np.diff(depth)) + 1])
+        return cls(seqID, runStarts, depth[runStarts], len(depth))
+
+
+    @classmethod
+    def load(cls, npzFile):
+        with np.load(npzFile) as rleData:
+            return cls(str(rleData["seqID"]), rleData["runStarts"], rleData["runValues"], int(rleData["length"]))
+
+
+    def save(self, npzFile):
+        '''
+        write the runs to `npzFile` (compressed). The file is written to a temporary file
+        first, so it is never left half written
+        '''
+        tmpFile = npzFile + "." + str(os.getpid()) + ".tmp" + self.NPZSUFFIX
+        np.savez_compressed(tmpFile, seqID=np.array(self.seqID), runStarts=self.runStarts,
+                            runValues=self.runValues, length=np.array(self.length))
+        os.replace(tmpFile, npzFile)
+
+
+    def __len__(self):
+        return len(self.runStarts)
+
+
+    @property
+    def runEnds(self):
+        return np.append(self.runStarts[1:], self.length)
+
+
+    @property
+    def runLengths(self):
+        return self.runEnds - self.runStarts
+
+
+    def toDepth(self):
+        '''
+        the per nt depth array
+        '''
+        return np.repeat(self.runValues, self.runLengths)
+
+
+    def breadth(self, minDepth=1):
+        '''
+        the fraction of the record covered at least `minDepth` times
+        '''
+        if self.length == 0:
+            return 0.0
+        return float(self.runLengths[self.runValues >= minDepth].sum())/self.length
+
+
+    def quantiles(self, quantiles):
+        '''
+        the depth quantiles (interpolated between positions, like `np.quantile()`)
+        '''
+        quantiles = np.asarray(quantiles, dtype=np.float64)
+        if self.length == 0:
+            return np.full(quantiles.shape, np.nan)
+        order = np.argsort(self.runValues, kind="stable")
+        sortedValues = self.runValues[order].astype(np.float64)
+        cumLengths = np.cumsum(self.runLengths[order])
+        position = quantiles*(self.length - 1)
+        lowerPos = np.floor(position).astype(np.int64)
+        upperPos = np.minimum(lowerPos + 1, self.length - 1)
+        lowerValue = sortedValues[np.searchsorted(cumLengths, lowerPos, side="right")]
+        upperValue = sortedValues[np.searchsorted(cumLengths, upperPos, side="right")]
+        return lowerValue + (position - lowerPos)*(upperValue - lowerValue)
+
+
+    def lowCoverageIntervals(self, minDepth):
+        '''
+        the (start, end) (0 based, end not included) of the regions covered fewer than
+        `minDepth` times, neighbouring runs are merged
+        '''
+        isLow = self.runValues < minDepth
+        if not isLow.any():
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        edges = np.diff(np.concatenate([[0], isLow.astype(np.int8), [0]]))
+        firstRuns = np.flatnonzero(edges == 1)
+        lastRuns = np.flatnonzero(edges == -1) - 1
+        return self.runStarts[firstRuns], self.runEnds[lastRuns]
+
+
+    def writeLowCoverageBED(self, bedFile, minDepth):
+        '''
+        write the regions covered fewer than `minDepth` times as a BED file
+        '''
+        starts, ends = self.lowCoverageIntervals(minDepth)
+        with open(bedFile, 'wt') as bedOut:
+            bedWriter = csv.writer(bedOut, delimiter='\t', lineterminator='\n')
+            bedWriter.writerow(["track name=low coverage description = depth < " + str(minDepth)])
+            for start, end in zip(starts, ends):
+                bedWriter.writerow([self.seqID, start, end, "lowcov"])
+        return len(starts)
+
+
+    def cumulative(self, positions, runValues=None):
+        '''
+        the total depth of positions 0 to `position - 1`, for each position
+        '''
+        if runValues is None:
+            runValues = self.runValues
+        runValues = np.asarray(runValues, dtype=np.int64)
+        runTotals = np.concatenate([[0], np.cumsum(runValues*self.runLengths)])
+        runNos = np.maximum(np.searchsorted(self.runStarts, positions, side="right") - 1, 0)
+        if len(self.runStarts) == 0:
+            return np.zeros(len(positions), dtype=np.int64)
+        return runTotals[runNos] + (positions - self.runStarts[runNos])*runValues[runNos]
+
+
+    def windowMeans(self, starts, windowSize):
+        '''
+        the mean depth of the windows starting at `starts`
+        '''
+        starts = np.asarray(starts, dtype=np.int64)
+        return (self.cumulative(starts + windowSize) - self.cumulative(starts))/windowSize
+
+
+    def windowFractions(self, starts, windowSize, minDepth):
+        '''
+        the fraction of the positions in each window covered at least `minDepth` times
+        '''
+        starts = np.asarray(starts, dtype=np.int64)
+        isCovered = (self.runValues >= minDepth).astype(np.int64)
+        return (self.cumulative(starts + windowSize, isCovered) - self.cumulative(starts, isCovered))/windowSize
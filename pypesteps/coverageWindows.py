@@ -0,0 +1,124 @@
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+'''
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+from pypesteps import seqTracks
+from pypesteps.coverageRLE import RLECoverage
+
+
+logger = logging.getLogger(__name__)
+INDENT = 6
+
+STATMEAN        = "mean"
+STATMEDIAN      = "median"
+STATMIN         = "min"
+STATMAX         = "max"
+STATFRACTION    = "fraction"
+WINDOWSTATS     = [STATMEAN, STATMEDIAN, STATMIN, STATMAX, STATFRACTION]
+
+# the order statistics (median, min, max) are calculated for this many
+# values at a time, so the copies of the windows stay small
+CHUNKVALUES     = 1 << 24
+
+
+def windowMeans(depth, starts, windowSize):
+    '''
+    the mean depth of each window, from the cumulative depth
+    '''
+    cumDepth = np.zeros(len(depth) + 1, dtype=np.int64)
+    np.cumsum(depth, out=cumDepth[1:])
+    return (cumDepth[starts + windowSize] - cumDepth[starts])/windowSize
+
+
+def windowFractions(depth, starts, windowSize, minDepth):
+    '''
+    the fraction of the positions in each window with a depth of at least `minDepth`
+    '''
+    cumCovered = np.zeros(len(depth) + 1, dtype=np.int64)
+    np.cumsum(depth >= minDepth, out=cumCovered[1:])
+    return (cumCovered[starts + windowSize] - cumCovered[starts])/windowSize
+
+
+def windowOrderStat(depth, starts, windowSize, statName):
+    '''
+    the median, min or max of each window. The windows are strided views of `depth`,
+    they are only copied a chunk at a time
+    '''
+    statFunctions = {STATMEDIAN: np.median, STATMIN: np.min, STATMAX: np.max}
+    values = np.zeros(len(starts), dtype=np.float64)
+    if len(starts) == 0:
+        return values
+    windows = np.lib.stride_tricks.sliding_window_view(depth, windowSize)
+    chunkSize = max(CHUNKVALUES//windowSize, 1)
+    for chunkStart in range(0, len(starts), chunkSize):
+        chunkStarts = starts[chunkStart:chunkStart + chunkSize]
+        values[chunkStart:chunkStart + len(chunkStarts)] = statFunctions[statName](windows[chunkStarts], axis=1)
+    return values
+
+
+def windowStats(depth, windowSize, stepSize, stats=(STATMEAN,), minDepth=1):
+    '''
+    sliding window statistics of a per nt depth array, as a dataframe with the window
+    centre (`pos`) and a column for each statistic in `stats` (the fraction column is
+    `fraction_ge<minDepth>`).
+
+    The windows are the same as the GC windows (see `seqTracks.windowStarts()`): window
+    `i` covers positions `i*stepSize` to `i*stepSize + windowSize - 1` and is centred on
+    `i*stepSize + windowSize/2`
+
+    `depth` can also be an `RLECoverage`, the mean and fraction are then calculated from
+    the runs (the order statistics still need the per nt array)
+    '''
+    if isinstance(depth, RLECoverage):
+        rleCoverage = depth
+        depth = None
+        starts = seqTracks.windowStarts(rleCoverage.length, windowSize, stepSize)
+    else:
+        rleCoverage = None
+        depth = np.asarray(depth)
+        starts = seqTracks.windowStarts(len(depth), windowSize, stepSize)
+    dfWindows = pd.DataFrame({"pos": starts + windowSize//2})
+    for statName in stats:
+        if statName == STATMEAN:
+            if rleCoverage is not None:
+                dfWindows[statName] = rleCoverage.windowMeans(starts, windowSize)
+            else:
+                dfWindows[statName] = windowMeans(depth, starts, windowSize)
+        elif statName == STATFRACTION:
+            if rleCoverage is not None:
+                dfWindows[fractionColumn(minDepth)] = rleCoverage.windowFractions(starts, windowSize, minDepth)
+            else:
+                dfWindows[fractionColumn(minDepth)] = windowFractions(depth, starts, windowSize, minDepth)
+        elif statName in (STATMEDIAN, STATMIN, STATMAX):
+            if depth is None:
+                depth = rleCoverage.toDepth()
+            dfWindows[statName] = windowOrderStat(depth, starts, windowSize, statName)
+        else:
+            logging.error("unknown window statistic <" + statName + ">. Options are <" + "|".join(WINDOWSTATS) + ">")
+            raise Exception("unknown window statistic <" + statName + ">. Options are <" + "|".join(WINDOWSTATS) + ">")
+    return dfWindows
+
+
+def windowSplitHalfError(halfDepths, windowSize, stepSize, fraction):
+    '''
+    the standard error of the window means estimated from two independent subsamples
+    (each of `fraction/2` of the reads, see `coverageEngine.bamDepthQuickLook()`). Each
+    half, scaled up, is an estimate of the window mean, and the standard error of the mean
+    of the two estimates is half their difference. The reads are sampled from a BAM file
+    rather than an infinite population, so this is scaled by sqrt(1 - fraction) (the error 
+    is 0 if all the reads are used)
+    '''
+    starts = seqTracks.windowStarts(len(halfDepths[0]), windowSize, stepSize)
+    halfMeans = [windowMeans(np.asarray(halfDepth), starts, windowSize)*2/fraction for halfDepth in halfDepths]
+    return np.abs(halfMeans[0] - halfMeans[1])/2*np.sqrt(1 - fraction)
+
+
+def fractionColumn(minDepth):
+    return STATFRACTION + "_ge" + str(minDepth)
@@ -0,0 +1,223 @@
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+'''
+
+import os
+import mmap
+import logging
+
+
+logger = logging.getLogger(__name__)
+INDENT = 6
+
+
+class IndexedFasta(object):
+    '''
+    reads a FASTA file through a samtools style `.fai` index and a memory map of the file,
+    so that a region of a record can be fetched without reading the rest of the file and
+    the records can be read one at a time, however big the file is.
+
+    The index is read from `<fasta>.fai` if it is there and newer than the FASTA file,
+    otherwise it is built (by scanning the file once) and written to `<fasta>.fai`. If the
+    index can't be written (e.g. the reference folder is read only) it is only kept in memory.
+
+    Each index entry is the record ID (the header up to the first white space), the length,
+    the offset of the first base and the number of bases/bytes in each line, as written by
+    `samtools faidx`. Like samtools, all the lines of a record apart from the last must be
+    the same length.
+
+        fasta = IndexedFasta(refFastA)
+        for seqID, seqLength in fasta.records():
+            ...
+        fasta.fetch("NC_045512.2", 21562, 25384)        # 0 based, end not included
+        fasta.fetchRegion("NC_045512.2:21563-25384")    # samtools style region, 1 based
+    '''
+    INDEXSUFFIX     = ".fai"
+    CHUNKSIZE       = 16*1024*1024
+
+
+    def __init__(self, fastaFile):
+        '''
+        Constructor
+        '''
+        self.fastaFile = fastaFile
+        self._fastaHandle = open(fastaFile, 'rb')
+        if os.path.getsize(fastaFile) > 0:
+            self._mmap = mmap.mmap(self._fastaHandle.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._mmap = b""
+        self.index = self.loadIndex()
+
+
+    def close(self):
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._fastaHandle.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+
+    @property
+    def ids(self):
+        return list(self.index)
+
+
+    @property
+    def lengths(self):
+        return [entry[0] for entry in self.index.values()]
+
+
+    def records(self):
+        '''
+        the (ID, length) of each record, in the order they are in the file
+        '''
+        return [(seqID, entry[0]) for seqID, entry in self.index.items()]
+
+
+    def __iter__(self):
+        '''
+        the (ID, sequence) of each record, reading one record at a time
+        '''
+        for seqID in self.index:
+            yield seqID, self.fetch(seqID)
+
+
+    def length(self, seqID):
+        return self._indexEntry(seqID)[0]
+
+
+    def fetch(self, seqID, start=0, end=None):
+        '''
+        the bases from `start` up to (but not including) `end` of a record, as bytes.
+        `end` defaults to the end of the record
+        '''
+        seqLength, offset, lineBases, lineWidth = self._indexEntry(seqID)
+        if end is None or end > seqLength:
+            end = seqLength
+        start = max(start, 0)
+        if start >= end:
+            return b""
+        startByte = offset + (start // lineBases)*lineWidth + start % lineBases
+        endByte = offset + (end // lineBases)*lineWidth + end % lineBases
+        region = self._mmap[startByte:endByte]
+        if lineWidth != lineBases:
+            region = region.replace(b"\n", b"").replace(b"\r", b"")
+        return region
+
+
+    def fetchChunks(self, seqID, chunkSize=CHUNKSIZE):
+        '''
+        the sequence of a record in pieces of (at most) `chunkSize` bases
+        '''
+        seqLength = self.length(seqID)
+        for start in range(0, seqLength, chunkSize):
+            yield self.fetch(seqID, start, start + chunkSize)
+
+
+    def fetchRegion(self, region):
+        '''
+        a samtools style region, `ID`, `ID:start` or `ID:start-end` (1 based, end included)
+        '''
+        seqID, _, interval = region.rpartition(":")
+        if not seqID or seqID not in self.index:
+            return self.fetch(region)
+        try:
+            startText, _, endText = interval.replace(",", "").partition("-")
+            start = int(startText) - 1
+            end = int(endText) if endText else None
+        except ValueError:
+            logging.error("couldn't parse region <" + region + ">")
+            raise Exception("couldn't parse region <" + region + ">")
+        return self.fetch(seqID, start, end)
+
+
+    def loadIndex(self):
+        '''
+        read the .fai index, or build it if it doesn't exist or is older than the FASTA file
+        '''
+        indexFile = self.fastaFile + self.INDEXSUFFIX
+        if os.path.exists(indexFile) and os.path.getmtime(indexFile) >= os.path.getmtime(self.fastaFile):
+            index = {}
+            with open(indexFile) as faiFile:
+                for line in faiFile:
+                    fields = line.rstrip("\n").split("\t")
+                    if len(fields) >= 5:
+                        index[fields[0]] = tuple(int(field) for field in fields[1:5])
+            return index
+
+        index = self.buildIndex()
+        try:
+            with open(indexFile + ".tmp", 'w') as faiFile:
+                for seqID, (seqLength, offset, lineBases, lineWidth) in index.items():
+                    faiFile.write("\t".join([seqID, str(seqLength), str(offset), str(lineBases), str(lineWidth)]) + "\n")
+            os.replace(indexFile + ".tmp", indexFile)
+            logging.info(INDENT*'-' + "--wrote FASTA index <" + indexFile + ">")
+        except OSError as e:
+            logging.warning(INDENT*'-' + "--couldn't write FASTA index <" + indexFile + ">, keeping it in memory (" + str(e) + ")")
+        return index
+
+
+    def buildIndex(self):
+        '''
+        scan the FASTA file and return {ID: (length, offset, line bases, line width)}
+        '''
+        index = {}
+        seqID = None
+        position = 0
+        fileSize = len(self._mmap)
+        while position < fileSize:
+            lineEnd = self._mmap.find(b"\n", position)
+            lineEnd = fileSize if lineEnd == -1 else lineEnd + 1
+            line = self._mmap[position:lineEnd]
+            if line.startswith(b">"):
+                if seqID is not None:
+                    index[seqID] = (seqLength, offset, lineBases, lineWidth)
+                headerFields = line[1:].split()
+                seqID = headerFields[0].decode() if headerFields else ""
+                if seqID in index:
+                    logging.error("duplicate record ID <" + seqID + "> in <" + self.fastaFile + ">")
+                    raise Exception("duplicate record ID <" + seqID + "> in <" + self.fastaFile + ">")
+                seqLength = 0
+                offset = lineEnd
+                lineBases = 0
+                lineWidth = 0
+                lastLine = False
+            elif seqID is not None and line.strip():
+                bases = len(line.rstrip(b"\r\n"))
+                if lastLine:
+                    logging.error("record <" + seqID + "> in <" + self.fastaFile + "> has lines of different lengths, it can't be indexed")
+                    raise Exception("record <" + seqID + "> in <" + self.fastaFile + "> has lines of different lengths, it can't be indexed")
+                if lineBases == 0:
+                    lineBases = bases
+                    lineWidth = len(line)
+                elif bases != lineBases or len(line) != lineWidth:
+                    # only the last line of a record can be different
+                    lastLine = True
+                    if bases > lineBases:
+                        logging.error("record <" + seqID + "> in <" + self.fastaFile + "> has lines of different lengths, it can't be indexed")
+                        raise Exception("record <" + seqID + "> in <" + self.fastaFile + "> has lines of different lengths, it can't be indexed")
+                seqLength += bases
+            elif seqID is not None:
+                # blank lines are only allowed at the end of a record
+                lastLine = lastLine or lineBases > 0
+            position = lineEnd
+        if seqID is not None:
+            index[seqID] = (seqLength, offset, lineBases, lineWidth)
+        return index
+
+
+    def _indexEntry(self, seqID):
+        if seqID not in self.index:
+            logging.error("record <" + str(seqID) + "> not found in <" + self.fastaFile + ">")
+            raise Exception("record <" + str(seqID) + "> not found in <" + self.fastaFile + ">")
+        seqLength, offset, lineBases, lineWidth = self.index[seqID]
+        # records without any bases have a line length of 0
+        return seqLength, offset, max(lineBases, 1), max(lineWidth, 1)
@@ -0,0 +1,222 @@
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+'''
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+
+import numpy as np
+
+from pypesteps import seqTracks
+from pypesteps.fastaReader import IndexedFasta
+
+
+logger = logging.getLogger(__name__)
+INDENT = 6
+
+
+class ReferenceRegistry(object):
+    '''
+    an on-disk store of the reference sequences used by the steps, so that a reference
+    is parsed once and then shared by all the steps of all the projects
+
+    Each reference is identified by the checksum of its sequences (record IDs and bases),
+    so the same reference in different folders, or under a different file name, is only
+    stored once. The entry for a reference is a folder `<root>/<checksum>` containing
+
+        metadata.json       the record IDs, lengths and the offset of each record in sequence.u8
+        sequence.u8         the encoded sequences (see `seqTracks.encodeSequence()`), one after
+                            another. This is memory mapped, so it isn't loaded into memory
+        tracks/             tracks (GC content, composition, ...) that have already been calculated
+                            for the reference, as .npy files
+
+    and `<root>/paths/` records the checksum of each FASTA file that has been registered (with
+    its size and modification time) so that the file only has to be read again if it changes.
+
+    The root folder is `~/.fairpype/references`, or the folder in the `FAIRPYPE_REFERENCES`
+    environment variable. `virusPipe --reference-dir` sets the variable so the processes
+    in the worker pool use the same registry.
+    '''
+    ROOTENV         = "FAIRPYPE_REFERENCES"
+    DEFAULTROOT     = os.path.join(os.path.expanduser("~"), ".fairpype", "references")
+    METADATAFILE    = "metadata.json"
+    SEQUENCEFILE    = "sequence.u8"
+    TRACKSFOLDER    = "tracks"
+    PATHSFOLDER     = "paths"
+
+    _entries = {}
+    _entriesLock = threading.Lock()
+
+
+    def __init__(self, root=None):
+        '''
+        Constructor
+        '''
+        if root is None:
+            root = os.environ.get(self.ROOTENV, self.DEFAULTROOT)
+        self.root = root
+
+
+    @classmethod
+    def setRoot(cls, root):
+        '''
+        use `root` for this process and the processes it starts
+        '''
+        os.environ[cls.ROOTENV] = root
+
+
+    def checksum(self, fastaFile):
+        '''
+        the checksum of the reference in `fastaFile`, registering it if needed
+        '''
+        fastaFile = os.path.abspath(fastaFile)
+        pathFile = os.path.join(self.root, self.PATHSFOLDER, hashlib.md5(fastaFile.encode()).hexdigest() + ".json")
+        fileStat = os.stat(fastaFile)
+        if os.path.exists(pathFile):
+            try:
+                with open(pathFile) as pathRecord:
+                    pathEntry = json.load(pathRecord)
+                if pathEntry["size"] == fileStat.st_size and pathEntry["mtime"] == fileStat.st_mtime \
+                   and os.path.exists(os.path.join(self.root, pathEntry["checksum"], self.METADATAFILE)):
+                    return pathEntry["checksum"]
+            except (OSError, ValueError, KeyError):
+                pass
+
+        checksum = self.register(fastaFile)
+        self._writeJSON(pathFile, {"path": fastaFile, "size": fileStat.st_size, "mtime": fileStat.st_mtime, "checksum": checksum})
+        return checksum
+
+
+    def register(self, fastaFile):
+        '''
+        read the FASTA file and add it to the registry (if it isn't already there).
+        the records are read through the .fai index a piece at a time, so the
+        whole sequence is never in memory
+        '''
+        logging.info(INDENT*'-' + "--registering reference <" + fastaFile + ">")
+        seqHash = hashlib.md5()
+        metadata = {"source": fastaFile, "ids": [], "lengths": [], "offsets": []}
+        tmpFolder = tempfile.mkdtemp(prefix=".register_", dir=self._makeRoot())
+        try:
+            offset = 0
+            with open(os.path.join(tmpFolder, self.SEQUENCEFILE), 'wb') as sequenceFile, IndexedFasta(fastaFile) as fasta:
+                for seqID, seqLength in fasta.records():
+                    seqHash.update(seqID.encode() + b"\n")
+                    for sequence in fasta.fetchChunks(seqID):
+                        seqHash.update(sequence.upper())
+                        sequenceFile.write(seqTracks.encodeSequence(sequence).tobytes())
+                    seqHash.update(b"\n")
+                    metadata["ids"].append(seqID)
+                    metadata["lengths"].append(seqLength)
+                    metadata["offsets"].append(offset)
+                    offset += seqLength
+            checksum = seqHash.hexdigest()
+            metadata["checksum"] = checksum
+            self._writeJSON(os.path.join(tmpFolder, self.METADATAFILE), metadata)
+
+            entryFolder = os.path.join(self.root, checksum)
+            if os.path.exists(os.path.join(entryFolder, self.METADATAFILE)):
+                logging.info(INDENT*'-' + "----already registered as <" + checksum + ">")
+            else:
+                shutil.rmtree(entryFolder, ignore_errors=True)
+                try:
+                    os.rename(tmpFolder, entryFolder)
+                    logging.info(INDENT*'-' + "----registered as <" + checksum + "> (<" + str(len(metadata["ids"])) + "> records)")
+                except OSError:
+                    # registered by another process in the meantime
+                    pass
+        finally:
+            shutil.rmtree(tmpFolder, ignore_errors=True)
+        return checksum
+
+
+    def metadata(self, fastaFile):
+        '''
+        the record IDs, lengths and offsets of the reference, and its checksum
+        '''
+        return self._entry(self.checksum(fastaFile))
+
+
+    def sequence(self, fastaFile, seqID=None):
+        '''
+        the encoded sequence of a record (the first if `seqID` isn't given) as a
+        read only memory mapped array
+        '''
+        entry = self.metadata(fastaFile)
+        recordNo = 0 if seqID is None else self._recordNo(entry, seqID)
+        return self._sequence(entry)[entry["offsets"][recordNo]:entry["offsets"][recordNo] + entry["lengths"][recordNo]]
+
+
+    def track(self, fastaFile, seqID, trackName, windowSize, stepSize, calculate, option=""):
+        '''
+        return the track from the registry, or calculate it with `calculate()` (which
+        returns the values, or a `SeqTrack`) and store it. `option` identifies anything else
+        the values depend on (such as how ambiguous bases are treated)
+        '''
+        entry = self.metadata(fastaFile)
+        recordNo = self._recordNo(entry, seqID)
+        trackFile = os.path.join(self.root, entry["checksum"], self.TRACKSFOLDER, "__".join(
+            [str(recordNo), trackName, "w" + str(windowSize) + "_s" + str(stepSize)] + ([option] if option else [])) + ".npy")
+        starts = seqTracks.windowStarts(entry["lengths"][recordNo], windowSize, stepSize)
+        if os.path.exists(trackFile):
+            try:
+                values = np.load(trackFile, mmap_mode="r")
+                if len(values) == len(starts):
+                    logging.debug(INDENT*'-' + "----loaded <" + trackName + "> track from the reference registry")
+                    return seqTracks.SeqTrack(seqID, trackName, windowSize, stepSize, starts, values)
+            except (OSError, ValueError):
+                pass
+
+        values = calculate()
+        if isinstance(values, seqTracks.SeqTrack):
+            values = values.values
+        os.makedirs(os.path.dirname(trackFile), exist_ok=True)
+        tmpFile = trackFile + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp.npy"
+        np.save(tmpFile, values)
+        os.replace(tmpFile, trackFile)
+        return seqTracks.SeqTrack(seqID, trackName, windowSize, stepSize, starts, values)
+
+
+    def _entry(self, checksum):
+        with self._entriesLock:
+            if checksum not in self._entries:
+                with open(os.path.join(self.root, checksum, self.METADATAFILE)) as metadataFile:
+                    self._entries[checksum] = json.load(metadataFile)
+            return self._entries[checksum]
+
+
+    def _sequence(self, entry):
+        if sum(entry["lengths"]) == 0:
+            return np.zeros(0, dtype=np.uint8)
+        return np.memmap(os.path.join(self.root, entry["checksum"], self.SEQUENCEFILE), dtype=np.uint8, mode="r")
+
+
+    @staticmethod
+    def _recordNo(entry, seqID):
+        if seqID not in entry["ids"]:
+            logging.error("record <" + str(seqID) + "> not found in reference <" + entry["source"] + ">")
+            raise Exception("record <" + str(seqID) + "> not found in reference <" + entry["source"] + ">")
+        return entry["ids"].index(seqID)
+
+
+    def _makeRoot(self):
+        if not os.path.exists(self.root):
+            logging.info(INDENT*'-' + "--reference registry folder <" + self.root + "> doesn't exist, creating")
+            os.makedirs(self.root, exist_ok=True)
+        return self.root
+
+
+    @staticmethod
+    def _writeJSON(jsonFile, contents):
+        os.makedirs(os.path.dirname(jsonFile), exist_ok=True)
+        tmpFile = jsonFile + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+        with open(tmpFile, 'w') as outFile:
+            json.dump(contents, outFile)
+        os.replace(tmpFile, jsonFile)
@@ -0,0 +1,90 @@
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+
+measures the resources used while a step (or a single item of a step) runs
+
+    wallSeconds         elapsed time
+    cpuSeconds          CPU time of the calling thread
+    peakRSSKB           peak resident memory of the process so far, and how much
+    peakRSSGrowthKB     it went up while this was running
+    readBytes           bytes read from/written to storage by the process (/proc/self/io)
+    writeBytes
+    readChars           bytes passed to read()/write() calls, including those served from the page cache
+    writeChars
+    childCpuSeconds     user + system CPU time of child processes (samtools, shorah, ...) that finished
+    childPeakRSSKB      largest peak resident memory of any child process so far
+
+Apart from the wall and CPU time these are for the whole process, so steps that run at the same
+time in different threads will see each others usage. Items processed in the worker pool are
+measured in the worker process. Values that can't be measured on this platform are None.
+'''
+
+import os
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+PROCIO          = "/proc/self/io"
+
+
+class ResourceUsage(object):
+    '''
+    takes a snapshot when created, `stop()` returns the usage since then
+    '''
+
+    def __init__(self):
+        '''
+        Constructor
+        '''
+        self.startSnapshot = self.snapshot()
+
+
+    def stop(self):
+        endSnapshot = self.snapshot()
+        usage = {"pid": os.getpid()}
+        for counter in ["wallSeconds", "cpuSeconds", "readBytes", "writeBytes", "readChars", "writeChars", "childCpuSeconds"]:
+            if endSnapshot[counter] is None or self.startSnapshot[counter] is None:
+                usage[counter] = None
+            else:
+                usage[counter] = endSnapshot[counter] - self.startSnapshot[counter]
+        usage["peakRSSKB"] = endSnapshot["peakRSSKB"]
+        usage["peakRSSGrowthKB"] = None if endSnapshot["peakRSSKB"] is None else endSnapshot["peakRSSKB"] - self.startSnapshot["peakRSSKB"]
+        usage["childPeakRSSKB"] = endSnapshot["childPeakRSSKB"]
+        return usage
+
+
+    @staticmethod
+    def snapshot():
+        snapshot = {"wallSeconds": time.perf_counter(), "cpuSeconds": time.thread_time(),
+                    "peakRSSKB": None, "childCpuSeconds": None, "childPeakRSSKB": None,
+                    "readBytes": None, "writeBytes": None, "readChars": None, "writeChars": None}
+        if resource is not None:
+            selfUsage = resource.getrusage(resource.RUSAGE_SELF)
+            childUsage = resource.getrusage(resource.RUSAGE_CHILDREN)
+            snapshot["peakRSSKB"] = selfUsage.ru_maxrss
+            snapshot["childCpuSeconds"] = childUsage.ru_utime + childUsage.ru_stime
+            snapshot["childPeakRSSKB"] = childUsage.ru_maxrss
+        snapshot.update(readProcIO())
+        return snapshot
+
+
+def readProcIO():
+    '''
+    the storage I/O counters of this process (linux only)
+    '''
+    ioCounters = {}
+    try:
+        with open(PROCIO) as ioFile:
+            for line in ioFile:
+                counter, value = line.split(":")
+                ioCounters[counter.strip()] = int(value)
+    except (OSError, ValueError):
+        return {}
+    return {"readBytes": ioCounters.get("read_bytes"), "writeBytes": ioCounters.get("write_bytes"),
+            "readChars": ioCounters.get("rchar"), "writeChars": ioCounters.get("wchar")}
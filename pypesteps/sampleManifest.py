@@ -0,0 +1,104 @@
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+'''
+
+import os
+import json
+import hashlib
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+INDENT = 6
+
+
+class SampleManifest(object):
+    '''
+    a record of the input files a step has already processed, so that an incremental
+    run only has to process the files that are new or have changed. For each sample it
+    keeps the path, size, modification time and checksum of the file, and for the whole
+    manifest the parameters the results depend on (if these change, every sample is
+    processed again)
+
+        manifest = SampleManifest(manifestFile, parameters)
+        if manifest.changed(sample, bamFile):
+            ...
+        manifest.update(sample, bamFile)
+        manifest.write()
+
+    A file is only read (to calculate the checksum) if its size or modification time
+    has changed, so touching a file doesn't cause it to be processed again
+    '''
+    BLOCKSIZE       = 1024*1024
+
+
+    def __init__(self, manifestFile, parameters=None):
+        '''
+        Constructor
+        '''
+        self.manifestFile = manifestFile
+        self.parameters = parameters if parameters is not None else {}
+        self.samples = {}
+        self._checksums = {}
+        if os.path.exists(manifestFile):
+            try:
+                with open(manifestFile) as manifestJSON:
+                    manifest = json.load(manifestJSON)
+            except (OSError, ValueError):
+                logging.warning(INDENT*'-' + "--couldn't read manifest <" + manifestFile + ">, all samples will be processed")
+                return
+            if manifest.get("parameters") == json.loads(json.dumps(self.parameters)):
+                self.samples = manifest.get("samples", {})
+            else:
+                logging.info(INDENT*'-' + "--parameters have changed since manifest <" + manifestFile + "> was written, all samples will be processed")
+
+
+    def changed(self, sample, filePath):
+        '''
+        True if the sample isn't in the manifest or its file is different
+        '''
+        entry = self.samples.get(sample)
+        if entry is None or entry["path"] != os.path.abspath(filePath):
+            return True
+        fileStat = os.stat(filePath)
+        if entry["size"] != fileStat.st_size:
+            return True
+        if entry["mtime"] == fileStat.st_mtime:
+            return False
+        return entry["checksum"] != self.checksum(filePath)
+
+
+    def update(self, sample, filePath):
+        fileStat = os.stat(filePath)
+        self.samples[sample] = {"path": os.path.abspath(filePath), "size": fileStat.st_size,
+                                "mtime": fileStat.st_mtime, "checksum": self.checksum(filePath)}
+
+
+    def remove(self, sample):
+        self.samples.pop(sample, None)
+
+
+    def checksum(self, filePath):
+        '''
+        the md5 checksum of the file (calculated once per manifest)
+        '''
+        fileStat = os.stat(filePath)
+        cacheKey = (os.path.abspath(filePath), fileStat.st_size, fileStat.st_mtime)
+        if cacheKey not in self._checksums:
+            fileHash = hashlib.md5()
+            with open(filePath, 'rb') as inFile:
+                for block in iter(lambda: inFile.read(self.BLOCKSIZE), b""):
+                    fileHash.update(block)
+            self._checksums[cacheKey] = fileHash.hexdigest()
+        return self._checksums[cacheKey]
+
+
+    def write(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifestFile)), exist_ok=True)
+        tmpFile = self.manifestFile + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+        with open(tmpFile, 'w') as manifestJSON:
+            json.dump({"parameters": self.parameters, "samples": self.samples}, manifestJSON, indent=1)
+        os.replace(tmpFile, self.manifestFile)
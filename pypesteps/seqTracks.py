@@ -0,0 +1,329 @@
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+
+sliding window tracks (GC content, GC skew, CpG o/e, ...) calculated from a reference sequence with NumPy
+
+The sequence is encoded once as a uint8 array (see `encodeSequence()`) and each track
+is calculated for all the windows at once from the cumulative count of the bases that
+are of interest, rather than by slicing out and counting every window. The cumulative
+counts are shared by all window sizes (see `SequenceCounts`).
+
+Windows follow the original `StepGCReadCoverage` loop: the first window starts at 0,
+windows start every `stepSize` nt while `start < len(sequence) - windowSize`, and the
+position of a window is its centre, `start + windowSize/2`.
+'''
+
+import numpy as np
+import pandas as pd
+
+import logging
+
+logger = logging.getLogger(__name__)
+INDENT = 6
+
+
+# base codes. U is encoded as T, any other character (N and the other IUPAC codes, gaps) is OTHER
+BASEA           = 0
+BASEC           = 1
+BASEG           = 2
+BASET           = 3
+BASES           = 4         # G or C
+BASEW           = 5         # A or T
+BASEOTHER       = 6
+BASECODES       = {"A": BASEA, "C": BASEC, "G": BASEG, "T": BASET, "U": BASET, "S": BASES, "W": BASEW}
+
+# how ambiguous bases are treated when calculating the GC content
+#   length:      GC is G, C and S over the full window length, so N lowers the GC content
+#                (this is what `Bio.SeqUtils.GC()` does, and is the default)
+#   informative: GC is G, C and S over the bases that are known to be G/C or A/T
+#                (A, C, G, T, S and W). Windows without any such bases are NaN
+AMBIGLENGTH         = "length"
+AMBIGINFORMATIVE    = "informative"
+AMBIGUOUSMODES      = [AMBIGLENGTH, AMBIGINFORMATIVE]
+
+# composition tracks that can be calculated as well as the GC content (see `compositionTracks()`)
+#   gcskew:      (G - C) / (G + C)
+#   cpgoe:       CpG observed/expected, CG dinucleotides * window size / (C * G)
+#   entropy:     Shannon entropy (bits) of the A/C/G/T frequencies, 0 to 2
+#   complexity:  linguistic complexity, the number of different k-mers in the window over the 
+#                largest number possible, min(4^k, window size - k + 1)
+# ambiguous bases are left out (as are k-mers that contain them). Windows where a track
+# can't be calculated (e.g. no G or C for the skew) are NaN
+TRACKGCSKEW         = "gcskew"
+TRACKCPGOE          = "cpgoe"
+TRACKENTROPY        = "entropy"
+TRACKCOMPLEXITY     = "complexity"
+COMPOSITIONTRACKS   = [TRACKGCSKEW, TRACKCPGOE, TRACKENTROPY, TRACKCOMPLEXITY]
+KMERSIZE            = 4
+
+_ENCODINGTABLE = np.full(256, BASEOTHER, dtype=np.uint8)
+for _base, _code in BASECODES.items():
+    _ENCODINGTABLE[ord(_base)] = _code
+    _ENCODINGTABLE[ord(_base.lower())] = _code
+
+
+
+class SeqTrack(object):
+    '''
+    the values of one track for one sequence, one value per window
+
+        starts        start of each window (int64)
+        values        value of each window (float64)
+        ambiguous     number of bases in each window that aren't A, C, G or T (int32)
+    '''
+
+    def __init__(self, seqID, name, windowSize, stepSize, starts, values, ambiguous=None):
+        '''
+        Constructor
+        '''
+        self.seqID = seqID
+        self.name = name
+        self.windowSize = windowSize
+        self.stepSize = stepSize
+        self.starts = starts
+        self.values = values
+        self.ambiguous = ambiguous
+
+
+    def __len__(self):
+        return len(self.starts)
+
+
+    @property
+    def positions(self):
+        '''
+        the centre of each window
+        '''
+        return self.starts + self.windowSize/2
+
+
+    def toDataFrame(self, xVar="pos"):
+        '''
+        the track as a DataFrame with columns `xVar` and the track name
+        '''
+        return pd.DataFrame({xVar: self.positions, self.name: self.values}, columns=[xVar, self.name])
+
+
+
+def encodeSequence(sequence):
+    '''
+    encode a sequence (str, bytes or a Biopython Seq) as a uint8 array of base codes.
+    lower case bases are treated the same as upper case
+    '''
+    if not isinstance(sequence, (bytes, bytearray, memoryview)):
+        sequence = str(sequence).encode("ascii", errors="replace")
+    return _ENCODINGTABLE[np.frombuffer(sequence, dtype=np.uint8)]
+
+
+
+def windowStarts(seqLength, windowSize, stepSize):
+    '''
+    the start positions of the sliding windows over a sequence of length `seqLength`
+    '''
+    if windowSize <= 0 or stepSize <= 0:
+        logging.error("both window and step size must be > 0: (found window size <" \
+                        + str(windowSize) + "> and step size <" + str(stepSize) + ">)")
+        raise Exception("both window and step size must be > 0: (found window size <" \
+                        + str(windowSize) + "> and step size <" + str(stepSize) + ">)")
+    return np.arange(0, max(seqLength - windowSize, 0), stepSize, dtype=np.int64)
+
+
+
+def pyramidWindows(windowSize, stepSize, factor, levels):
+    '''
+    the window/step pairs of a pyramid: the window and step size are multiplied by
+    `factor` at each level, e.g. (50, 5, 2, 3) gives [(50, 5), (100, 10), (200, 20)]
+    '''
+    if factor < 2 or levels < 1:
+        logging.error("the pyramid factor must be > 1 and the number of levels > 0 (found factor <" \
+                        + str(factor) + "> and levels <" + str(levels) + ">)")
+        raise Exception("the pyramid factor must be > 1 and the number of levels > 0 (found factor <" \
+                        + str(factor) + "> and levels <" + str(levels) + ">)")
+    return [(windowSize*factor**level, stepSize*factor**level) for level in range(levels)]
+
+
+
+class SequenceCounts(object):
+    '''
+    the cumulative counts of classes of bases (GC, ambiguous, ...) along an encoded sequence.
+    
+    each cumulative count is calculated the first time it is needed and then kept, so 
+    the tracks for every window size come from the same arrays
+    '''
+    BASECLASSES     = {
+        "gc":           lambda codes: (codes == BASEC) | (codes == BASEG) | (codes == BASES),
+        "ambiguous":    lambda codes: codes > BASET,
+        "other":        lambda codes: codes == BASEOTHER,
+        "a":            lambda codes: codes == BASEA,
+        "c":            lambda codes: codes == BASEC,
+        "g":            lambda codes: codes == BASEG,
+        "t":            lambda codes: codes == BASET,
+        # a CG dinucleotide is counted at the position of the C
+        "cpg":          lambda codes: np.append((codes[:-1] == BASEC) & (codes[1:] == BASEG), False),
+    }
+
+
+    def __init__(self, codes):
+        '''
+        Constructor
+        '''
+        self.codes = codes
+        self._cumCounts = {}
+        self._previousKmers = {}
+
+
+    def __len__(self):
+        return len(self.codes)
+
+
+    def cumulative(self, baseClass):
+        if baseClass not in self._cumCounts:
+            cumCounts = np.zeros(len(self.codes) + 1, dtype=np.int64)
+            np.cumsum(self.BASECLASSES[baseClass](self.codes), out=cumCounts[1:])
+            self._cumCounts[baseClass] = cumCounts
+        return self._cumCounts[baseClass]
+
+
+    def windowCounts(self, baseClass, starts, windowSize):
+        '''
+        the number of bases of this class in each window
+        '''
+        cumCounts = self.cumulative(baseClass)
+        return cumCounts[starts + windowSize] - cumCounts[starts]
+
+
+    def previousKmers(self, kmerSize):
+        '''
+        for each k-mer start, the start of the previous occurrence of the same k-mer (-1 if
+        there isn't one). k-mers containing ambiguous bases are given their own start (and a code 
+        that doesn't match any other k-mer), so they are never counted
+        '''
+        if kmerSize not in self._previousKmers:
+            noOfKmers = max(len(self.codes) - kmerSize + 1, 0)
+            kmerStarts = np.arange(noOfKmers, dtype=np.int64)
+            kmerCodes = np.zeros(noOfKmers, dtype=np.uint64)
+            for offset in range(kmerSize):
+                kmerCodes = kmerCodes*np.uint64(4) + np.minimum(self.codes[offset:offset + noOfKmers], BASET).astype(np.uint64)
+            valid = self.windowCounts("ambiguous", kmerStarts, kmerSize) == 0
+            kmerCodes[~valid] = np.uint64(4**kmerSize) + kmerStarts[~valid].astype(np.uint64)
+
+            # sort by k-mer (stable, so equal k-mers stay in order) and look at the neighbour
+            order = np.argsort(kmerCodes, kind="stable")
+            sortedCodes = kmerCodes[order]
+            previous = np.full(noOfKmers, -1, dtype=np.int64)
+            sameAsPrevious = np.zeros(noOfKmers, dtype=bool)
+            sameAsPrevious[1:] = sortedCodes[1:] == sortedCodes[:-1]
+            previous[order[sameAsPrevious]] = order[np.flatnonzero(sameAsPrevious) - 1]
+            self._previousKmers[kmerSize] = np.where(valid, previous, kmerStarts)
+        return self._previousKmers[kmerSize]
+
+
+
+def gcTrack(seqCounts, windowSize, stepSize, seqID="", ambiguousMode=AMBIGLENGTH, name="gcpercent"):
+    '''
+    the GC percentage of each window of an encoded sequence. `seqCounts` is a `SequenceCounts`
+    (or the encoded sequence, see `encodeSequence()`)
+    '''
+    if ambiguousMode not in AMBIGUOUSMODES:
+        logging.error("unrecognised ambiguous base mode <" + ambiguousMode + ">. Options are <" + "|".join(AMBIGUOUSMODES) + ">")
+        raise Exception("unrecognised ambiguous base mode <" + ambiguousMode + ">. Options are <" + "|".join(AMBIGUOUSMODES) + ">")
+    if not isinstance(seqCounts, SequenceCounts):
+        seqCounts = SequenceCounts(seqCounts)
+
+    starts = windowStarts(len(seqCounts), windowSize, stepSize)
+    gcCounts = seqCounts.windowCounts("gc", starts, windowSize)
+    ambiguous = seqCounts.windowCounts("ambiguous", starts, windowSize).astype(np.int32)
+    if ambiguousMode == AMBIGLENGTH:
+        values = gcCounts * 100.0 / windowSize
+    else:
+        informative = windowSize - seqCounts.windowCounts("other", starts, windowSize)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = np.where(informative > 0, gcCounts * 100.0 / informative, np.nan)
+    return SeqTrack(seqID, name, windowSize, stepSize, starts, values, ambiguous)
+
+
+
+def gcTracks(codes, windowPairs, seqID="", ambiguousMode=AMBIGLENGTH, name="gcpercent"):
+    '''
+    the GC tracks for a list of (window size, step size) pairs, all calculated from the 
+    same cumulative counts
+    '''
+    seqCounts = SequenceCounts(codes)
+    return [gcTrack(seqCounts, windowSize, stepSize, seqID, ambiguousMode, name) for windowSize, stepSize in windowPairs]
+
+
+
+def gcSkewTrack(seqCounts, starts, windowSize):
+    gCounts = seqCounts.windowCounts("g", starts, windowSize)
+    cCounts = seqCounts.windowCounts("c", starts, windowSize)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(gCounts + cCounts > 0, (gCounts - cCounts) / (gCounts + cCounts), np.nan)
+
+
+
+def cpgObservedExpectedTrack(seqCounts, starts, windowSize):
+    # only dinucleotides that are completely inside the window
+    cpgCounts = seqCounts.windowCounts("cpg", starts, windowSize - 1)
+    expected = seqCounts.windowCounts("c", starts, windowSize) * seqCounts.windowCounts("g", starts, windowSize)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(expected > 0, cpgCounts * windowSize / expected, np.nan)
+
+
+
+def entropyTrack(seqCounts, starts, windowSize):
+    baseCounts = np.stack([seqCounts.windowCounts(base, starts, windowSize) for base in ["a", "c", "g", "t"]])
+    totals = baseCounts.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frequencies = baseCounts / totals
+        entropy = -np.where(baseCounts > 0, frequencies*np.log2(frequencies), 0.0).sum(axis=0)
+    return np.where(totals > 0, entropy, np.nan)
+
+
+
+def complexityTrack(seqCounts, starts, windowSize, kmerSize=KMERSIZE):
+    '''
+    the k-mer starting at i is the first of its kind in the windows whose k-mers start in
+    [a, a + kmersPerWindow) for a in (max(previous occurrence, i - kmersPerWindow), i], so 
+    the number of different k-mers in every window comes from one cumulative sum
+    '''
+    kmersPerWindow = windowSize - kmerSize + 1
+    if kmersPerWindow <= 0:
+        return np.full(len(starts), np.nan)
+    previous = seqCounts.previousKmers(kmerSize)
+    kmerStarts = np.arange(len(previous), dtype=np.int64)
+    firstWindow = np.maximum(previous, kmerStarts - kmersPerWindow) + 1
+    noOfStarts = len(seqCounts) + 2
+    distinctKmers = np.cumsum(np.bincount(firstWindow, minlength=noOfStarts)[:noOfStarts] \
+                              - np.bincount(kmerStarts + 1, minlength=noOfStarts)[:noOfStarts])
+    return distinctKmers[starts] / min(4**kmerSize, kmersPerWindow)
+
+
+
+TRACKFUNCTIONS = {TRACKGCSKEW: gcSkewTrack, TRACKCPGOE: cpgObservedExpectedTrack, 
+                  TRACKENTROPY: entropyTrack, TRACKCOMPLEXITY: complexityTrack}
+
+
+
+def compositionTracks(seqCounts, windowSize, stepSize, trackNames, seqID="", kmerSize=KMERSIZE):
+    '''
+    the composition tracks listed in `trackNames` (see `COMPOSITIONTRACKS`) for one window size,
+    calculated from the same `SequenceCounts` as the GC content
+    '''
+    for trackName in trackNames:
+        if trackName not in TRACKFUNCTIONS:
+            logging.error("unrecognised track <" + trackName + ">. Options are <" + "|".join(COMPOSITIONTRACKS) + ">")
+            raise Exception("unrecognised track <" + trackName + ">. Options are <" + "|".join(COMPOSITIONTRACKS) + ">")
+    if not isinstance(seqCounts, SequenceCounts):
+        seqCounts = SequenceCounts(seqCounts)
+
+    starts = windowStarts(len(seqCounts), windowSize, stepSize)
+    compTracks = []
+    for trackName in trackNames:
+        if trackName == TRACKCOMPLEXITY:
+            values = complexityTrack(seqCounts, starts, windowSize, kmerSize)
+        else:
+            values = TRACKFUNCTIONS[trackName](seqCounts, starts, windowSize)
+        compTracks.append(SeqTrack(seqID, trackName, windowSize, stepSize, starts, values))
+    return compTracks
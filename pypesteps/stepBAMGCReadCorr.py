@@ -15,6 +15,7 @@ import glob
 import pandas as pd
 import plotnine as p9
 
+from pypesteps import seqTracks
 
 import logging
 
@@ -44,6 +45,11 @@ class StepBAMGCReadCorr(abstractStep.AbstractStep):
         both values need to be specified
         (-w/--window_size & (-s/--step_size)
     
+    By default the read coverage is compared with the GC content. Any of the composition 
+    tracks written by StepGCReadCoverage (gcskew, cpgoe, entropy, complexity) can be used 
+    instead with --track, in which case the composition CSV file for the window size has to
+    be given as the gc coverage file
+    
     '''
     CLASSID             = "StepBAMGCReadCorr"
     OUTPUTFOLDER        = "gcreadcorrelation"
@@ -57,7 +63,11 @@ class StepBAMGCReadCorr(abstractStep.AbstractStep):
     STEPSIZELONG        = "--step_size"
     BAMFILEFOLDERSHORT  = "-b"
     BAMFILEFOLDERLONG   = "--bam_file_folder"
+    TRACKLONG           = "--track"
+    TRACKGCPERCENT      = "gcpercent"
+    FILEPARAMS          = ["gcCoverageFile", "readCoverageFile", "bamFileFolder"]
     
+    GCBEDCOLUMNS        = ["ID", "start", "stop", "nothing1", "GCpercent", "nothing2"]
     PLOTHEIGHT          = 8
     PLOTWIDTH           = 10
     PLOTUNITS           = 'in'
@@ -75,6 +85,7 @@ class StepBAMGCReadCorr(abstractStep.AbstractStep):
         self.gcCoverageFile = gccoveragefile
         self.readCoverageFile = readcoveragefile
         self.bamFileFolder = bamFileFolder
+        self.track = self.TRACKGCPERCENT
 
         
     def checkInputData(self):
@@ -84,18 +95,18 @@ class StepBAMGCReadCorr(abstractStep.AbstractStep):
         '''
         
         # Check input folders exist
-        if( os.path.exists(os.path.join(self.projectRoot, self.inFolder)) is False):
+        if( self.fileExists(os.path.join(self.projectRoot, self.inFolder)) is False):
             logging.error("input folder for BAM files <" + os.path.join(self.projectRoot, self.inFolder) + "> not found")
             raise Exception("input folder for BAM files <" + os.path.join(self.projectRoot, self.inFolder) + "> not found")
        
                 
-        if os.path.exists(self.gcCoverageFile) == False:
+        if self.fileExists(self.gcCoverageFile) == False:
             raise RuntimeError ("gc coverage file <" + self.gcCoverageFile + "> not found")
             logging.error("gc coverage file <" + self.gcCoverageFile + "> not found")
         else:
             logging.info(INDENT*'-' + "found gc coverage file <" + self.gcCoverageFile + ">")
         
-        if os.path.exists(self.readCoverageFile) == False:
+        if self.fileExists(self.readCoverageFile) == False:
             raise RuntimeError ("read coverage file <" + self.readCoverageFile + "> not found")
             logging.error("read coverage file <" + self.readCoverageFile + "> not found")
         else:
@@ -110,10 +121,17 @@ class StepBAMGCReadCorr(abstractStep.AbstractStep):
             logging.info("No sliding window selected")            
         else:
             logging.error("both window and step size must be specified and > 0: (found window size <" \
-                            + self.windowSize + " and step size <" + self.stepSize + ">)")
+                            + str(self.windowSize) + " and step size <" + str(self.stepSize) + ">)")
             raise Exception("both window and step size must be specified and > 0: (found window size <" \
-                            + self.windowSize + " and step size <" + self.stepSize + ">)")
+                            + str(self.windowSize) + " and step size <" + str(self.stepSize) + ">)")
+            
             
+        if self.track not in [self.TRACKGCPERCENT] + seqTracks.COMPOSITIONTRACKS:
+            logging.error("unrecognised track <" + self.track + ">. Options are <" + "|".join([self.TRACKGCPERCENT] + seqTracks.COMPOSITIONTRACKS) + ">")
+            raise Exception("unrecognised track <" + self.track + ">. Options are <" + "|".join([self.TRACKGCPERCENT] + seqTracks.COMPOSITIONTRACKS) + ">")
+        if self.track != self.TRACKGCPERCENT and self.gcCoverageFile.endswith(".bed"):
+            logging.error("the <" + self.track + "> track is in the composition file written by StepGCReadCoverage, not the BED file <" + self.gcCoverageFile + ">")
+            raise Exception("the <" + self.track + "> track is in the composition file written by StepGCReadCoverage, not the BED file <" + self.gcCoverageFile + ">")
             
         # do the window and step size match for the GC and Read Coverage files?
         if len(self.inputFiles) == 1 & (not self.inputFiles[0]):
@@ -137,22 +155,30 @@ class StepBAMGCReadCorr(abstractStep.AbstractStep):
             logging.info(INDENT*'-' + "----folder doesn't exist, creating")
             os.makedirs(resultFolder)        
         
-        dfGCcoverage = pd.read_csv(self.gcCoverageFile, skiprows=1, delimiter="\t")
-        dfGCcoverage.columns=["ID", "start", "stop", "nothing1", "GCpercent", "nothing2"]
-        dfReadCoverage = pd.read_csv(self.readCoverageFile)
+        # use the results published by the earlier steps if they were run in this project,
+        # otherwise read the files
+        if self.gcCoverageFile.endswith(".bed"):
+            dfGCcoverage = self.loadArtifact(self.gcCoverageFile, self.loadGCCoverage)
+        else:
+            dfGCcoverage = self.loadArtifact(self.gcCoverageFile, pd.read_csv)
+        dfReadCoverage = self.loadArtifact(self.readCoverageFile, pd.read_csv)
         dfGCRC= pd.merge(left=dfReadCoverage, right=dfGCcoverage, how='left', left_on='pos', right_on='start')
+        trackColumn = self.trackColumn(dfGCcoverage)
+        self.logCorrelation(dfGCRC, trackColumn)
         
             # plot GC coverage
         logging.info(INDENT*'-' + "--plotting")
-        gcPlotFile = os.path.join(resultFolder, self.projectID + "_w" + str(self.windowSize) + "s" + str(self.stepSize) + self.md5string + ".png")
-        gcPlotTitle = self.CLASSID + "_" + self.projectID + "_w" + str(self.windowSize) + "s" + str(self.stepSize)
+        trackLabel = "" if self.track == self.TRACKGCPERCENT else "_" + self.track
+        gcPlotFile = os.path.join(resultFolder, self.projectID + trackLabel + "_w" + str(self.windowSize) + "s" + str(self.stepSize) + self.md5string + ".png")
+        gcPlotTitle = self.CLASSID + "_" + self.projectID + trackLabel + "_w" + str(self.windowSize) + "s" + str(self.stepSize)
         
         p = (p9.ggplot(data=dfGCRC,
                    mapping=p9.aes(x='normcoverage',
-                                  y="GCpercent", colour="datasource"))
+                                  y=trackColumn, colour="datasource"))
             + p9.geom_point( alpha=0.25, size=0.25) + p9.labs(title=gcPlotTitle) 
         )
-        p.save(filename = gcPlotFile, height=self.PLOTHEIGHT, width=self.PLOTWIDTH, dpi=self.PLOTDPI)   
+        with self.PLOTLOCK:
+            p.save(filename = gcPlotFile, height=self.PLOTHEIGHT, width=self.PLOTWIDTH, dpi=self.PLOTDPI)   
                          
             
             
@@ -164,6 +190,35 @@ class StepBAMGCReadCorr(abstractStep.AbstractStep):
             
         
 
+    def trackColumn(self, dfGCcoverage):
+        '''
+        the column of the GC coverage (BED file) or composition file that holds the track
+        '''
+        if self.track == self.TRACKGCPERCENT and "GCpercent" in dfGCcoverage.columns:
+            return "GCpercent"
+        if self.track not in dfGCcoverage.columns:
+            logging.error("track <" + self.track + "> not found in <" + self.gcCoverageFile + ">. Found <" + "|".join(dfGCcoverage.columns) + ">")
+            raise Exception("track <" + self.track + "> not found in <" + self.gcCoverageFile + ">. Found <" + "|".join(dfGCcoverage.columns) + ">")
+        return self.track
+    
+    
+    def logCorrelation(self, dfGCRC, trackColumn):
+        '''
+        log the correlation between the normalised read coverage and the track for each data source
+        '''
+        for dataSource, dfSource in dfGCRC.groupby("datasource"):
+            pearson = dfSource["normcoverage"].corr(dfSource[trackColumn])
+            spearman = dfSource["normcoverage"].rank().corr(dfSource[trackColumn].rank())
+            logging.info(INDENT*'-' + "--<" + str(dataSource) + "> coverage vs " + self.track + ": pearson <" \
+                         + str(round(pearson, 3)) + ">, spearman <" + str(round(spearman, 3)) + ">")
+    
+    
+    def loadGCCoverage(self, gcCoverageFile):
+        dfGCcoverage = pd.read_csv(gcCoverageFile, skiprows=1, delimiter="\t")
+        dfGCcoverage.columns = self.GCBEDCOLUMNS
+        return dfGCcoverage
+    
+    
     def shortDescription(self):
         print('calculate GC coverage for fasta file with an optional sliding window')
 
@@ -175,6 +230,8 @@ class StepBAMGCReadCorr(abstractStep.AbstractStep):
         print('calculate an moving average.')
         print('  window size: -w / --window_size')
         print('    step size: -s / -- step_size')
+        print('        track: --track gcpercent|gcskew|cpgoe|entropy|complexity [default: gcpercent]')
+        print('               tracks other than gcpercent need the composition file from StepGCReadCoverage')
         print('')      
         print('The output is in BED format. If an output file is not specified, ')
         print('the output file the same as the input file with a bed extension.')
@@ -241,7 +298,11 @@ class StepBAMGCReadCorr(abstractStep.AbstractStep):
         params = self.paramString.split(",")
         for param in params:
             
-            if self.STEPSIZESHORT in param or self.STEPSIZELONG in param:
+            if self.TRACKLONG in param:
+                self.track = param.split(self.TRACKLONG)[1].strip()
+                logging.info(INDENT*'-' + "track set to <" + self.track + ">")
+            
+            elif self.STEPSIZESHORT in param or self.STEPSIZELONG in param:
                 if self.STEPSIZELONG in param:
                     self.stepSize = int(param.split(self.STEPSIZELONG)[1].strip())
                 else:
@@ -8,15 +8,19 @@ Created on Dec 18, 2020
 '''
 import os
 import csv
-import subprocess
-import shlex
 import glob
 
 import numpy as np
 import pandas as pd
 import plotnine as p9
-from sklearn import preprocessing
-from Bio import SeqIO
+
+from pypesteps import seqTracks
+from pypesteps import coverageEngine
+from pypesteps import coverageWindows
+from pypesteps import coverageNormalization
+from pypesteps.coverageMatrix import CoverageMatrix
+from pypesteps.sampleManifest import SampleManifest
+from pypesteps.coverageRLE import RLECoverage
 
 import logging
 
@@ -33,7 +37,13 @@ class StepBAMReadCoverage(abstractStep.AbstractStep):
         1. SAMTools is used to calculate the read coverage/nt, 
         2. This data to calculate a sliding window average (if requested)
     
-    SAMTools is used because it's faster
+    SAMTools is used because it's faster. Its output is parsed as it is generated
+    (see `coverageEngine`), so the per nt coverage table is only written to a 
+    `_ntcov.tsv` file if this is requested (--keep_ntcov)
+    
+    In incremental mode (--incremental) only the BAM files that are new or have changed
+    since the last run (see `SampleManifest`) are processed, and their rows are added to
+    (or replaced in) the coverage matrix from the last run
     
     required parameters
         the FASTA file that was used for the alignment 
@@ -48,6 +58,10 @@ class StepBAMReadCoverage(abstractStep.AbstractStep):
         the location of the samtools software package (some Python installations have trouble locating installs)
         (-s/--software_location)
     
+        the records (contigs/segments) of the reference to calculate the coverage for. 
+        Each record is processed separately and written to its own files
+        (--contig ID [ID ...])
+    
     To do: generate integrated read coverage plot
     '''
     CLASSID             = "StepBAMReadCoverage"
@@ -62,6 +76,15 @@ class StepBAMReadCoverage(abstractStep.AbstractStep):
     SOFTWARELOCLONG     = "--path_to_software"
     BAMFILEFOLDERSHORT  = "-b"
     BAMFILEFOLDERLONG   = "--bam_file_folder"
+    KEEPNTCOVLONG       = "--keep_ntcov"
+    WINSTATSLONG        = "--window_stats"
+    MINDEPTHLONG        = "--min_depth"
+    DEPTHTHREADSLONG    = "--depth_threads"
+    INCREMENTALLONG     = "--incremental"
+    NORMALIZATIONLONG   = "--normalization"
+    LOWCOVERAGELONG     = "--low_coverage"
+    QUICKLOOKLONG       = "--quick_look"
+    FILEPARAMS          = ["refFastA", "bamFileFolder"]
     
     PLOTHEIGHT          = 3
     PLOTWIDTH           = 10
@@ -69,6 +92,7 @@ class StepBAMReadCoverage(abstractStep.AbstractStep):
     PLOTDPI             = 1000
     XVAR                = "pos"
     YVAR                = "readcoverage"
+    STDERRVAR           = "stderr"
     SAMCOL0             = "id"
     NORMCOL             = "normcoverage"
     STEPNORM            = "steppednorm"
@@ -82,6 +106,14 @@ class StepBAMReadCoverage(abstractStep.AbstractStep):
         self.stepSize = stepSize
         self.softwarePath = softwarePath
         self.refFastA = refFastA
+        self.keepNtCov = False
+        self.windowStats = []
+        self.minDepth = 1
+        self.depthThreads = 1
+        self.incremental = False
+        self.normalization = coverageNormalization.NORMMINMAX
+        self.lowCoverage = 0
+        self.quickLook = 0.0
 
         
     def checkInputData(self):
@@ -90,7 +122,7 @@ class StepBAMReadCoverage(abstractStep.AbstractStep):
         filepath can be absolute or relative (to Project Root)
         '''
 
-        if( os.path.exists(os.path.join(self.projectRoot, self.inFolder)) is False):
+        if( self.fileExists(os.path.join(self.projectRoot, self.inFolder)) is False):
             raise Exception("input folder <" + os.path.join(self.projectRoot, self.inFolder) + "> not found")
         
         bamFileFolder = os.path.join(self.projectRoot, self.inFolder)
@@ -98,14 +130,14 @@ class StepBAMReadCoverage(abstractStep.AbstractStep):
         if len(self.inputFiles) == 1 & (not self.inputFiles[0]):
             self.inputFiles = glob.glob(os.path.join(self.projectRoot, self.bamFileFolder) + os.path.sep + "*gen__trim_paired__sorted.bam")
         for inputFile in self.inputFiles:            
-            if os.path.exists(os.path.join(bamFileFolder, inputFile)) == False:
-                logging.error("input file <" + os.path.exists(os.path.join(bamFileFolder, inputFile)) + "> not found")
+            if self.fileExists(os.path.join(bamFileFolder, inputFile)) == False:
+                logging.error("input file <" + os.path.join(bamFileFolder, inputFile) + "> not found")
                 raise RuntimeError ("input file <" + os.path.join(bamFileFolder, inputFile) + "> not found")
             else:
                 logging.info(INDENT*'-' + "found input file <" + os.path.join(bamFileFolder, inputFile) + ">")
         
         ## check reference FastA file
-        if os.path.exists(self.refFastA) == False:
+        if self.fileExists(self.refFastA) == False:
             logging.error("reference FastA file <" + self.refFastA + "> not found")
             raise RuntimeError ("reference FastA file <" + self.refFastA + "> not found")
         else:
@@ -119,9 +151,32 @@ class StepBAMReadCoverage(abstractStep.AbstractStep):
             logging.info("No sliding window selected")            
         else:
             logging.error("both window and step size must be specified and > 0: (found window size <" \
-                            + self.windowSize + " and step size <" + self.stepSize + ">)")
+                            + str(self.windowSize) + " and step size <" + str(self.stepSize) + ">)")
             raise Exception("both window and step size must be specified and > 0: (found window size <" \
-                            + self.windowSize + " and step size <" + self.stepSize + ">)")
+                            + str(self.windowSize) + " and step size <" + str(self.stepSize) + ">)")
+            
+        ## check the extra window statistics
+        for statName in self.windowStats:
+            if statName not in coverageWindows.WINDOWSTATS:
+                logging.error("unknown window statistic <" + statName + ">. Options are <" + "|".join(coverageWindows.WINDOWSTATS) + ">")
+                raise Exception("unknown window statistic <" + statName + ">. Options are <" + "|".join(coverageWindows.WINDOWSTATS) + ">")
+        if self.normalization not in coverageNormalization.NORMALIZATIONS:
+            logging.error("unknown normalization <" + self.normalization + ">. Options are <" + "|".join(coverageNormalization.NORMALIZATIONS) + ">")
+            raise Exception("unknown normalization <" + self.normalization + ">. Options are <" + "|".join(coverageNormalization.NORMALIZATIONS) + ">")
+        if self.depthThreads < 1:
+            logging.error("depth threads must be >= 1 (found <" + str(self.depthThreads) + ">)")
+            raise Exception("depth threads must be >= 1 (found <" + str(self.depthThreads) + ">)")
+        if self.lowCoverage < 0:
+            logging.error("low coverage depth must be >= 0 (found <" + str(self.lowCoverage) + ">)")
+            raise Exception("low coverage depth must be >= 0 (found <" + str(self.lowCoverage) + ">)")
+        if self.quickLook and not 0 < self.quickLook < 1:
+            logging.error("quick look fraction must be > 0 and < 1 (found <" + str(self.quickLook) + ">)")
+            raise Exception("quick look fraction must be > 0 and < 1 (found <" + str(self.quickLook) + ">)")
+        if self.quickLook and self.keepNtCov:
+            logging.warning(INDENT*'-' + "--the per nt coverage isn't written in quick look mode")
+        if self.minDepth < 0:
+            logging.error("min depth must be >= 0 (found <" + str(self.minDepth) + ">)")
+            raise Exception("min depth must be >= 0 (found <" + str(self.minDepth) + ">)")
             
             
         
@@ -134,24 +189,14 @@ class StepBAMReadCoverage(abstractStep.AbstractStep):
         '''
         logger.info(INDENT*'-' + "executing step")
 
-        # load the genome to get the number of nucleotides
-        recordCount = 0
-        for record in SeqIO.parse(self.refFastA, "fasta"):
-            genomeSeq = record.seq
-            genomeID  = record.id
-            genomeLen = len(genomeSeq)
-            recordCount += 1
-            
-        if recordCount > 1:
-            logging.warn(INDENT*'-' + "----fasta file contains more than one record. Using the last loaded record (#" + recordCount + ")")
-            logging.warn(INDENT*'-' + "----Using the last loaded record <" + genomeID + "> which is <" + genomeLen + "> nt" )
+        # load the genome to get the records (contigs) and their lengths
+        # (if an earlier step has already loaded the reference, it will have published the metadata)
+        self.refMetadata = self.loadArtifact(self.refFastA, self.loadReferenceMetadata, kind="metadata")
+        contigs = self.selectContigs(self.refMetadata)
+        if len(self.refMetadata["ids"]) > 1:
+            logging.info(INDENT*'-' + "----fasta file contains <" + str(len(self.refMetadata["ids"])) + "> records, the coverage of <" \
+                         + str(len(contigs)) + "> will be calculated separately")
                     
-        # create dataframe with genomeLen rows
-        a = np.arange(self.windowSize/2, 1000, self.stepSize)
-        dfAllCSV = pd.DataFrame(np.arange(self.windowSize/2, 1000, self.stepSize), columns = ['nt']).astype(int) # for CSV file
-        dfAllPlot = pd.DataFrame(columns=[self.XVAR, self.YVAR, self.NORMCOL]) # for plotting
-        
-        bamFileFolder = os.path.join(self.projectRoot, self.inFolder)
         resultFolder = os.path.join(self.projectRoot, self.outFolder)
         
         logging.info(INDENT*'-' + "--results will be written to output folder <" + resultFolder + ">")
@@ -159,132 +204,318 @@ class StepBAMReadCoverage(abstractStep.AbstractStep):
             logging.info(INDENT*'-' + "----folder doesn't exist, creating")
             os.makedirs(resultFolder)        
 
+        # in incremental mode, only process the BAM files that have changed since the last run
+        self.changedFiles = None
+        self.manifest = None
+        if self.incremental and self.windowSize > 0:
+            self.manifest = SampleManifest(self.fileBase("") + "__manifest__" + self.md5string + ".json", self.manifestParameters())
+            oldMatrices = [self.loadMatrix(contigID, contigLen) for contigID, contigLen in contigs]
+            if all(oldMatrix is not None for oldMatrix in oldMatrices):
+                # a BAM file is processed if it has changed, or it isn't in the coverage matrices
+                bamFileFolder = os.path.join(self.projectRoot, self.inFolder)
+                self.changedFiles = [inputFile for inputFile in self.inputFiles \
+                                     if self.manifest.changed(self.sampleName(inputFile), os.path.join(bamFileFolder, inputFile)) \
+                                     or any(self.sampleName(inputFile) not in oldMatrix.samples for oldMatrix in oldMatrices)]
+                logging.info(INDENT*'-' + "--incremental run, <" + str(len(self.changedFiles)) + "> of <" \
+                             + str(len(self.inputFiles)) + "> BAM files are new or have changed")
+            else:
+                logging.info(INDENT*'-' + "--incremental run, but there are no coverage matrices from an earlier run. All BAM files will be processed")
+
+        # each record of each BAM file is processed separately (see `processItem`) and the 
+        # results are combined in `reduceItems`
+        self.executeItems(self.coverageItems())
         
-        offset = 1  # the y distance for no SNV in a single sample
-        dOffset = 4 # the y distance between successive samples on the plot
-        delta = 2   # the y distance for SNV in a single sample
         
-        for inputFile in self.inputFiles:
-            basename = os.path.splitext(os.path.basename(inputFile))[0]            
-        # for each BAM file
-            #   1. generate coverage/nt using SAMTools
-            #   2. generate sliding window coverage if requested
-            
-            
-            
-            # 1. use SAMTools to get read coverage at each base
-            bamFile = os.path.join(bamFileFolder, inputFile)
-            ntCovFile = os.path.join(resultFolder, os.path.splitext(os.path.basename(bamFile))[0] + "_ntcov.tsv")
-            stderrFile = os.path.basename(bamFile) + "_ntcov.stderr"
-
-            command = self.softwarePath + ' depth -a ' + bamFile 
-            logging.debug(INDENT*'-' + "--SAMTools command is <"+ command + ">")
-            with open(ntCovFile,"wb") as fout, open(stderrFile,"wb") as err:
-                process = subprocess.Popen(shlex.split(command), stdout=subprocess.PIPE)
-
-                while True:
-                    output = process.stdout.readline()
-                    if process.poll()==0:
-                        break
-                    if output:
-                        fout.write(output)
-            
-                logger.info(INDENT*'-' + "--process finished with return code <" + str(process.poll()) + ">")
+    def coverageItems(self):
+        '''
+        the (BAM file, record ID) items, in the order `reduceItems()` gets their results
+        '''
+        inputFiles = self.inputFiles if self.changedFiles is None else self.changedFiles
+        return [(inputFile, contigID) for inputFile in inputFiles for contigID, contigLen in self.selectContigs(self.refMetadata)]
+    
+    
+    @staticmethod
+    def sampleName(inputFile):
+        return os.path.splitext(os.path.basename(inputFile))[0]
+    
+    
+    def fileBase(self, contigLabel):
+        '''
+        the start of the names of the combined files
+        '''
+        return os.path.join(self.projectRoot, self.outFolder, self.projectID + contigLabel + "__normreads__" 
+                            + "__w" + str(self.windowSize) + "_s" + str(self.stepSize))
+    
+    
+    def manifestParameters(self):
+        '''
+        the parameters the coverage of a sample depends on. If any of these change, all the 
+        samples are processed again in an incremental run
+        '''
+        return {"windowSize": self.windowSize, "stepSize": self.stepSize, "windowStats": self.windowStats, 
+                "minDepth": self.minDepth, "lowCoverage": self.lowCoverage, "quickLook": self.quickLook, "contigs": self.selectContigs(self.refMetadata)}
+    
+    
+    def loadMatrix(self, contigID, contigLen):
+        '''
+        the coverage matrix of a record from an earlier run, or None if there isn't one
+        (or it was calculated with different windows, or in the other quick look/full mode)
+        '''
+        basePath = self.fileBase(self.contigLabel(contigID, self.refMetadata)) + "__matrix__" + self.md5string
+        if not CoverageMatrix.exists(basePath):
+            return None
+        try:
+            matrix = CoverageMatrix.load(basePath)
+        except Exception as e:
+            logging.warning(INDENT*'-' + "--couldn't load coverage matrix <" + basePath + "> (" + str(e) + ")")
+            return None
+        if matrix.metadata.get("contigLength") != contigLen or matrix.metadata.get("windowSize") != self.windowSize \
+           or matrix.metadata.get("stepSize") != self.stepSize or matrix.metadata.get("quickLook", 0.0) != self.quickLook:
+            return None
+        return matrix
+        
+        
+    def processItem(self, item):
+        '''
+        calculate the read coverage for one record (contig) of a single BAM file. 
+        `item` is the (BAM file, record ID)
+            1. generate coverage/nt using SAMTools
+            2. generate sliding window coverage if requested
+        
+        writes the per BAM file BED and plot and returns the record ID and the sliding 
+        window coverage as a dataframe (or None if no sliding window was requested).
+        If the reference has more than one record, the file names include the record ID
+        '''
+        inputFile, contigID = item
+        bamFileFolder = os.path.join(self.projectRoot, self.inFolder)
+        resultFolder = os.path.join(self.projectRoot, self.outFolder)
+        contigLabel = self.contigLabel(contigID, self.refMetadata)
+        basename = os.path.splitext(os.path.basename(inputFile))[0]            
+        
+        # 1. use SAMTools to get read coverage at each base
+        bamFile = os.path.join(bamFileFolder, inputFile)
+        ntCovFile = None
+        if self.keepNtCov:
+            ntCovFile = os.path.join(resultFolder, os.path.splitext(os.path.basename(bamFile))[0] + contigLabel + "_ntcov.tsv")
+            logging.info(INDENT*'-' + "--per nt coverage will be written to <" + ntCovFile + ">")
+        genomeLen = self.refMetadata["lengths"][self.refMetadata["ids"].index(contigID)]
+        halfDepths = None
+        if self.quickLook:
+            # estimate the depth from two subsamples of the reads, scaled up to the whole BAM file
+            halfDepths = coverageEngine.bamDepthQuickLook(bamFile, genomeLen, self.quickLook, 
+                                                          contigID if contigLabel else None, self.softwarePath)
+            ntCoverage = np.rint((halfDepths[0] + halfDepths[1].astype(np.int64))/self.quickLook).astype(np.int32)
+        elif self.depthThreads > 1:
+            # split the record into region shards, so a deep BAM file uses more than one core
+            ntCoverage = coverageEngine.bamDepthSharded(bamFile, contigID, genomeLen, self.depthThreads, self.softwarePath, ntCovFile)
+        else:
+            ntCoverage = coverageEngine.bamDepth(bamFile, genomeLen, contigID if contigLabel else None, self.softwarePath, ntCovFile)
+        
+        # keep the coverage as runs of the same depth, much smaller than the per nt table
+        rleCoverage = RLECoverage.fromDepth(ntCoverage, contigID)
+        rleFile = os.path.join(resultFolder, basename + contigLabel + "__coverage__" + self.md5string + RLECoverage.NPZSUFFIX)
+        rleCoverage.save(rleFile)
+        depthQuantiles = rleCoverage.quantiles([0.05, 0.5, 0.95])
+        logging.info(INDENT*'-' + "--run length encoded coverage (<" + str(len(rleCoverage)) + "> runs) written to <" + rleFile + ">")
+        logging.info(INDENT*'-' + "--breadth >=" + str(self.minDepth) + "x is <" + "{:.4f}".format(rleCoverage.breadth(self.minDepth)) 
+                     + ">, depth 5%/50%/95% is <" + "/".join("{:g}".format(value) for value in depthQuantiles) + ">")
+        if self.lowCoverage > 0:
+            lowCoverageFile = os.path.join(resultFolder, basename + contigLabel + "__lowcov_lt" + str(self.lowCoverage) 
+                                           + "__" + self.md5string + ".bed")
+            noOfIntervals = rleCoverage.writeLowCoverageBED(lowCoverageFile, self.lowCoverage)
+            logging.info(INDENT*'-' + "--<" + str(noOfIntervals) + "> regions covered < " + str(self.lowCoverage) 
+                         + " times written to <" + lowCoverageFile + ">")
+        
+        
+        # 2. if window parameters have been set, calculate sliding window coverage
+        if(self.windowSize <= 0):
+            return contigID, None
+        
+        # the windows are the same as the GC windows, centred on `pos` (see `coverageWindows`)
+        extraStats = [statName for statName in self.windowStats if statName != coverageWindows.STATMEAN]
+        dfThisBAMWin = coverageWindows.windowStats(ntCoverage, self.windowSize, self.stepSize, 
+                                                   [coverageWindows.STATMEAN] + extraStats, self.minDepth)
+        dfThisBAMWin = dfThisBAMWin.rename(columns={"pos": self.XVAR, coverageWindows.STATMEAN: self.YVAR})
+        
+        # the coverage is normalised over all the BAM files in `reduceItems`
+        dfThisBAMWin['datasource'] = basename
+                                      
+        # create output filename
+        inBaseName = os.path.splitext(os.path.basename(bamFile))[0] + contigLabel
+        outputFolder = os.path.join(self.projectRoot, self.outFolder)
+        logging.info(INDENT*'-' + "--read coverage results will be written to output folder <" + outputFolder + ">")
             
+        ntCovFileWinAv = inBaseName + "__w" + str(self.windowSize) + "_s" + str(self.stepSize) + "__" + self.md5string + ".bed"
+        ntCovFileWinAv = os.path.join(outputFolder, ntCovFileWinAv)
+        logging.info(INDENT*'-' + "--read coverage output BED file is <" + ntCovFileWinAv + ">")
+        logging.info(INDENT*'-' + "--writing")
+        
+        with open(ntCovFileWinAv, 'wt+') as bedfile:
+            bedwriter = csv.writer(bedfile, delimiter='\t')
+            bedwriter.writerow(["track name=read coverage description = sliding window " \
+                               + str(self.windowSize) + "nt/step size " + str(self.stepSize) + "nt"])
+            for index, row in dfThisBAMWin.iterrows():                       
+                bedwriter.writerow([os.path.splitext(os.path.basename(bamFile))[0], str(row[self.XVAR]), str(row[self.XVAR]), ".", str(row[self.YVAR]), "."])
+        logging.info(INDENT*'-' + "--done")
+        
+        # write the extra window statistics
+        if extraStats:
+            windowStatsFile = os.path.join(outputFolder, inBaseName + "__w" + str(self.windowSize) + "_s" + str(self.stepSize) \
+                                           + "__windowstats__" + self.md5string + ".csv")
+            logging.info(INDENT*'-' + "--window statistics will be written to <" + windowStatsFile + ">")
+            dfThisBAMWin.drop(columns=['datasource']).to_csv(windowStatsFile, index=False)
+        
+        # the estimated error of the quick look coverage
+        if halfDepths is not None:
+            dfQuickLook = dfThisBAMWin[[self.XVAR, self.YVAR]].copy()
+            dfQuickLook[self.STDERRVAR] = coverageWindows.windowSplitHalfError(halfDepths, self.windowSize, self.stepSize, self.quickLook)
+            quickLookFile = os.path.join(outputFolder, inBaseName + "__w" + str(self.windowSize) + "_s" + str(self.stepSize) \
+                                         + "__quicklook__" + self.md5string + ".csv")
+            dfQuickLook.to_csv(quickLookFile, index=False)
+            covered = dfQuickLook[self.YVAR] > 0
+            relativeError = (dfQuickLook[self.STDERRVAR][covered]/dfQuickLook[self.YVAR][covered]).median() if covered.any() else np.nan
+            logging.info(INDENT*'-' + "--quick look median relative error is <" + "{:.3f}".format(relativeError) 
+                         + ">, window errors written to <" + quickLookFile + ">")
+        
+        # plot read coverage for this BAM file
+        logging.info(INDENT*'-' + "--plotting")
+        gcPlotFile = os.path.join(outputFolder, inBaseName + "_w" + str(self.windowSize) + "s" + str(self.stepSize) + self.md5string + ".png")
+        gcPlotTitle = self.CLASSID + "_" + inBaseName + "_w" + str(self.windowSize) + "s" + str(self.stepSize)
+        
+        p = (p9.ggplot(data=dfThisBAMWin,
+                   mapping=p9.aes(x=self.XVAR,
+                                  y=self.YVAR, colour=self.YVAR))
+            + p9.geom_point( alpha=0.1, size=0.25) + p9.labs(title=gcPlotTitle) 
+        )
+        with self.PLOTLOCK:
+            p.save(filename = gcPlotFile, height=self.PLOTHEIGHT, width=self.PLOTWIDTH, dpi=self.PLOTDPI)   
+        
+        return contigID, dfThisBAMWin
+    
+    
+    def reduceItems(self, results):
+        '''
+        put the sliding window coverage from all the BAM files into a coverage matrix for each
+        record (contig) and write the combined CSV, plot data and plot
+        '''
+        if self.windowSize <= 0:
+            logging.info(INDENT*'-' + "no sliding window, there is no combined coverage to write")
+            return
+        items = self.coverageItems()
+        for contigID, contigLen in self.selectContigs(self.refMetadata):
+            contigResults = [(self.sampleName(inputFile), dfThisBAMWin) 
+                             for (inputFile, itemContig), (resultContig, dfThisBAMWin) in zip(items, results) if itemContig == contigID]
+            self.reduceContig(contigID, contigLen, contigResults)
             
-            # 2. if window parameters have been set, calculate sliding window coverage
-            if(self.windowSize > 0):
-                dfThisBAMCoverage = pd.read_csv(ntCovFile, sep='\t', header=None)
-                #dfThisBAMCoverage.columns = [self.SAMCOL0, self.XVAR, self.YVAR]
-                meanCovWin = []
-                
-                posInGenome = int(self.windowSize/2)
-                while (posInGenome < len(dfThisBAMCoverage)- self.windowSize/2):
-                    meanCovWin.append({self.XVAR: posInGenome, self.YVAR: (dfThisBAMCoverage.iloc[posInGenome:posInGenome+self.windowSize+1][2].mean())})
-                    posInGenome += self.stepSize
-                dfThisBAMWin = pd.DataFrame.from_dict(meanCovWin)
-                
-                # calculate mean of column + normalise the reads 
-                min_max_scaler = preprocessing.MinMaxScaler()
-                #  x= dfThisBAMWin[self.YVAR]
-                
-                dfThisBAMWin[self.NORMCOL] = min_max_scaler.fit_transform(dfThisBAMWin[[self.YVAR]].astype(float)) # + offset
-                dfThisBAMWin['datasource'] = basename
-
-                dfAllCSV = pd.merge(left=dfAllCSV, right=dfThisBAMWin.loc[:, [self.XVAR, self.YVAR, self.NORMCOL]], how='left', left_on='nt', right_on=self.XVAR)
-                dfAllCSV = dfAllCSV.rename(
-                    columns={self.YVAR:self.YVAR + "_" + basename, self.NORMCOL:self.NORMCOL + "_" + basename, self.XVAR: self.XVAR + "_" + basename,})
-                #dfThisBAMWin = dfThisBAMWin.rename(columns={"snvplot":"snvplot_"+ basename, "frqMean":"frqMean_"+ basename, "Pos":"Pos_"+ basename,})
-
-                # x = df[['score']].values.astype(float)
-                # min_max_scaler = preprocessing.MinMaxScaler()
-                # x_scaled = min_max_scaler.fit_transform(x)
-                # df_normalized = pd.DataFrame(x_scaled)
-                dfThisBAMWin[self.STEPNORM] = dfThisBAMWin[self.NORMCOL] + offset
-                dfAllPlot = dfAllPlot.append(dfThisBAMWin)  
-                                              
-                # create output filename
-                inBaseName = os.path.splitext(os.path.basename(bamFile))[0]
-                outputFolder = os.path.join(self.projectRoot, self.outFolder)
-                logging.info(INDENT*'-' + "--read coverage results will be written to output folder <" + outputFolder + ">")
-                if not os.path.exists(outputFolder):
-                    logging.info(INDENT*'-' + "----folder doesn't exist, creating")
-                    os.makedirs(outputFolder)
-                    
-                ntCovFileWinAv = os.path.splitext(os.path.basename(bamFile))[0] + "__w" + str(self.windowSize) + "_s" + str(self.stepSize) + "__" + self.md5string + ".bed"
-                ntCovFileWinAv = os.path.join(outputFolder, ntCovFileWinAv)
-                logging.info(INDENT*'-' + "--read coverage output BED file is <" + ntCovFileWinAv + ">")
-                logging.info(INDENT*'-' + "--writing")
-                
-                with open(ntCovFileWinAv, 'wt+') as bedfile:
-                    bedwriter = csv.writer(bedfile, delimiter='\t')
-                    bedwriter.writerow(["track name=read coverage description = sliding window " \
-                                       + str(self.windowSize) + "nt/step size " + str(self.stepSize) + "nt"])
-                    for index, row in dfThisBAMWin.iterrows():                       
-                        bedwriter.writerow([inBaseName, str(row[self.XVAR]), str(row[self.XVAR]), ".", str(row[self.YVAR]), "."])
-                logging.info(INDENT*'-' + "--done")
+        if self.manifest is not None:
+            bamFileFolder = os.path.join(self.projectRoot, self.inFolder)
+            for inputFile in (self.inputFiles if self.changedFiles is None else self.changedFiles):
+                self.manifest.update(self.sampleName(inputFile), os.path.join(bamFileFolder, inputFile))
+            for sample in list(self.manifest.samples):
+                if sample not in [self.sampleName(inputFile) for inputFile in self.inputFiles]:
+                    self.manifest.remove(sample)
+            self.manifest.write()
             
-            # plot read coverage for this BAM file
-            logging.info(INDENT*'-' + "--plotting")
-            gcPlotFile = os.path.join(outputFolder, inBaseName + "_w" + str(self.windowSize) + "s" + str(self.stepSize) + self.md5string + ".png")
-            gcPlotTitle = self.CLASSID + "_" + inBaseName + "_w" + str(self.windowSize) + "s" + str(self.stepSize)
             
-            p = (p9.ggplot(data=dfThisBAMWin,
-                       mapping=p9.aes(x=self.XVAR,
-                                      y=self.YVAR, colour=self.YVAR))
-                + p9.geom_point( alpha=0.1, size=0.25) + p9.labs(title=gcPlotTitle) 
-            )
-            p.save(filename = gcPlotFile, height=self.PLOTHEIGHT, width=self.PLOTWIDTH, dpi=self.PLOTDPI)   
-                         
-            offset += dOffset
+    def reduceContig(self, contigID, contigLen, results):
+        '''
+        fill the coverage matrix of one record with the sliding window coverage of each BAM 
+        file (one row per BAM file) and write the combined files, which are views of the matrix.
+        the matrix covers all the windows of the record, `results` are (sample, dataframe) pairs.
+        
+        in an incremental run `results` are only for the new or changed BAM files, the other 
+        rows are kept from the last run. The combined files are only written if a row has changed
+        '''
+        contigLabel = self.contigLabel(contigID, self.refMetadata)
+        fileBase = self.fileBase(contigLabel)
+        samples = [self.sampleName(inputFile) for inputFile in self.inputFiles]
+        
+        oldMatrix = self.loadMatrix(contigID, contigLen) if self.changedFiles is not None else None
+        if oldMatrix is not None:
+            if not results and oldMatrix.samples == samples and oldMatrix.metadata.get("normalization") == self.normalization:
+                logging.info(INDENT*'-' + "--no BAM files have changed, the combined files for <" + contigID + "> are up to date")
+                return
+            matrix = oldMatrix.withSamples(samples)
+            logging.info(INDENT*'-' + "--updating <" + str(len(results)) + "> rows of coverage matrix <" + matrix.basePath + ">")
+        else:
+            positions = seqTracks.windowStarts(contigLen, self.windowSize, self.stepSize) + self.windowSize//2
+            matrix = CoverageMatrix.create(fileBase + "__matrix__" + self.md5string, samples, positions, 
+                                           {"contig": contigID, "contigLength": contigLen, "windowSize": self.windowSize, 
+                                            "stepSize": self.stepSize, "value": self.YVAR, "quickLook": self.quickLook})
+        for sample, dfThisBAMWin in results:
+            if dfThisBAMWin is not None:
+                matrix.setRow(sample, dfThisBAMWin[self.XVAR].to_numpy(), dfThisBAMWin[self.YVAR].to_numpy())
+            else:
+                matrix.clearRow(sample)
+        matrix.flush()
+        normValues = coverageNormalization.normalizeMatrix(matrix.values, self.normalization)
+        if matrix.metadata.get("normalization") != self.normalization or matrix.metadata.get("quickLook") != self.quickLook:
+            matrix.metadata["normalization"] = self.normalization
+            matrix.metadata["quickLook"] = self.quickLook
+            matrix.writeMetadata()
+        dfAllCSV = self.matrixToCSV(matrix, normValues)
+        dfAllPlot = self.matrixToPlotData(matrix, normValues)
             
         logging.info(INDENT*'-' + "finishing")
 
         # write out single file containing normalised read coverage for all files
-        allDataAsCSV = os.path.join(resultFolder, self.projectID + "__normreads__" 
-                                     + "__w" + str(self.windowSize) + "_s" + str(self.stepSize) + "__"+ self.md5string + ".csv")
+        # (the data is also published so that later steps don't have to read the files back)
+        allDataAsCSV = fileBase + "__"+ self.md5string + ".csv"
         logging.info(INDENT*'-' + "--saving combined data to <" + allDataAsCSV +">")
-        dfAllCSV.to_csv(allDataAsCSV)
-        plotDataAsCSV = os.path.join(resultFolder, self.projectID + "__normreads__" 
-                                     + "__w" + str(self.windowSize) + "_s" + str(self.stepSize) + "__plot__"+ self.md5string + ".csv")
-        logging.info(INDENT*'-' + "--saving plot data to <" + allDataAsCSV +">")
-        dfAllPlot.to_csv(plotDataAsCSV)
+        self.publishArtifact(allDataAsCSV, dfAllCSV, dfAllCSV.to_csv)
+        plotDataAsCSV = fileBase + "__plot__"+ self.md5string + ".csv"
+        logging.info(INDENT*'-' + "--saving plot data to <" + plotDataAsCSV +">")
+        self.publishArtifact(plotDataAsCSV, dfAllPlot, dfAllPlot.to_csv)
                 
         # plot read coverage for all BAM files
         logging.info(INDENT*'-' + "--plotting combined SNV data")
-        covPlotFile = os.path.join(resultFolder, self.projectID + "__normreads__" 
-                                     + "__w" + str(self.windowSize) + "_s" + str(self.stepSize) + "__"+ self.md5string + ".png")
+        covPlotFile = fileBase + "__"+ self.md5string + ".png"
         logging.info(INDENT*'-' + "--plot file is to <" + covPlotFile +">")
 
-        dfAllPlot[self.XVAR] = pd.to_numeric(dfAllPlot[self.XVAR])
         p = (p9.ggplot(data=dfAllPlot, mapping=p9.aes(x=self.XVAR, y=self.STEPNORM, color='datasource', size = self.XVAR)) \
              + p9.geom_point( alpha=0.1) + p9.scale_size(range = [0, 1]) \
-             + p9.labs(title=self.projectID)
+             + p9.labs(title=self.projectID + contigLabel)
         + p9.scale_x_continuous(name=self.XVAR) + p9.ylab(self.YVAR)) 
         #+ p9.scale_x_continuous(name=self.XVAR, breaks=np.arange(0, 30000, 5000), limits=[0, 30000] ) + p9.ylab(self.YVAR)) 
 
-        p.save(filename = covPlotFile, height=self.PLOTHEIGHT, width=self.PLOTWIDTH,  dpi=self.PLOTDPI)   
+        self.publishArtifact(covPlotFile, None, lambda plotFile: self.savePlot(p, plotFile))   
 
+
+    def matrixToCSV(self, matrix, normValues):
+        '''
+        the combined CSV: the window positions (`nt`) and the position, coverage and 
+        normalised coverage of each BAM file, side by side
+        '''
+        columns = {'nt': matrix.positions}
+        filledRows = matrix.filledRows()
+        for rowNo, sample in enumerate(matrix.samples):
+            if not filledRows[rowNo]:
+                continue
+            hasValue = ~np.isnan(matrix.values[rowNo])
+            columns[self.XVAR + "_" + sample] = pd.array(np.where(hasValue, matrix.positions, 0), dtype="Int64")
+            columns[self.XVAR + "_" + sample][~hasValue] = pd.NA
+            columns[self.YVAR + "_" + sample] = np.asarray(matrix.values[rowNo])
+            columns[self.NORMCOL + "_" + sample] = normValues[rowNo]
+        return pd.DataFrame(columns)
+
+
+    def matrixToPlotData(self, matrix, normValues):
+        '''
+        the plot data: one row per (BAM file, window), with the normalised coverage of each 
+        BAM file stepped up the y axis so the files don't overlap
+        '''
+        offset = 1  # the y distance for no SNV in a single sample
+        dOffset = 4 # the y distance between successive samples on the plot
+        
+        rowNos, columnNos = np.nonzero(~np.isnan(matrix.values))
+        dfAllPlot = pd.DataFrame({self.XVAR: matrix.positions[columnNos], 
+                                  self.YVAR: np.asarray(matrix.values)[rowNos, columnNos],
+                                  self.NORMCOL: normValues[rowNos, columnNos],
+                                  'datasource': np.array(matrix.samples, dtype=object)[rowNos] if len(rowNos) else np.array([], dtype=object)})
+        dfAllPlot[self.STEPNORM] = dfAllPlot[self.NORMCOL] + offset + dOffset*rowNos
+        # the index is the window number
+        dfAllPlot.index = columnNos
+        return dfAllPlot
         
             
         
@@ -300,7 +531,34 @@ class StepBAMReadCoverage(abstractStep.AbstractStep):
         print('calculate an moving average.')
         print('  window size: -w / --window_size')
         print('    step size: -s / -- step_size')
+        print('       contig: --contig ID [ID ...]')
+        print('               records (contigs/segments) to calculate the coverage for [default: all]')
+        print('   keep ntcov: --keep_ntcov')
+        print('               also write the coverage at each nt to <BAM>_ntcov.tsv')
+        print(' window stats: --window_stats median min max fraction')
+        print('               other statistics to calculate for each window, written to ')
+        print('               <BAM>__w..._s...__windowstats__<md5>.csv')
+        print('    min depth: --min_depth N  the depth for the fraction of the window covered >= N times [default: 1]')
+        print('depth threads: --depth_threads N')
+        print('               split each record into N region shards and run samtools depth on ')
+        print('               them at the same time (the BAM file must be indexed) [default: 1]')
+        print('normalization: --normalization minmax|cpm|medianratio|quantile')
+        print('               how the coverage of the BAM files is normalised [default: minmax]')
+        print(' low coverage: --low_coverage N')
+        print('               write the regions covered fewer than N times to ')
+        print('               <BAM>__lowcov_ltN__<md5>.bed')
+        print('   quick look: --quick_look FRACTION')
+        print('               estimate the coverage from FRACTION (e.g. 0.05) of the reads, much faster ')
+        print('               for deep BAM files. The error of each window is written to ')
+        print('               <BAM>__w..._s...__quicklook__<md5>.csv')
+        print('  incremental: --incremental')
+        print('               only process the BAM files that are new or have changed since the ')
+        print('               last run, and add them to the combined coverage from that run')
         print('')      
+        print('The coverage at each nt is also written (run length encoded) to ')
+        print('<BAM>__coverage__<md5>.npz, see `RLECoverage`')
+        print('If the reference has more than one record, each record is written to its ')
+        print('own files, named <BAM>__<record ID>__w..._s...')
         print('The output is in BED format. If an output file is not specified, ')
         print('the output file the same as the input file with a bed extension.')
         print('')
@@ -360,12 +618,58 @@ class StepBAMReadCoverage(abstractStep.AbstractStep):
             
         optional:
         `software_location`
+        `contig`
+        `keep_ntcov`
+        `window_stats` and `min_depth`
+        `depth_threads`
+        `incremental`
+        `normalization`
+        `low_coverage`
+        `quick_look`
         '''
         logging.info(INDENT*'-' + "parsing parameters strings")
         params = self.paramString.split(",")
         for param in params:
             param = param.strip()
-            if self.WINSIZESHORT in param or self.WINSIZELONG in param:
+            # checked first, a record ID can contain the other flags
+            if self.CONTIGLONG in param:
+                self.contigs = param.split(self.CONTIGLONG)[1].split()
+                logging.info(INDENT*'-' + "contigs set to <" + " ".join(self.contigs) + ">")
+                
+            elif self.QUICKLOOKLONG in param:
+                self.quickLook = float(param.split(self.QUICKLOOKLONG)[1].strip())
+                logging.info(INDENT*'-' + "quick look mode, the coverage will be estimated from <" + str(self.quickLook) + "> of the reads")
+                
+            elif self.LOWCOVERAGELONG in param:
+                self.lowCoverage = int(param.split(self.LOWCOVERAGELONG)[1].strip())
+                logging.info(INDENT*'-' + "low coverage regions (depth < " + str(self.lowCoverage) + ") will be written to a BED file")
+                
+            elif self.KEEPNTCOVLONG in param:
+                self.keepNtCov = True
+                logging.info(INDENT*'-' + "per nt coverage will be written to a TSV file")
+                
+            # `--window_stats` contains `-w`
+            elif self.WINSTATSLONG in param:
+                self.windowStats = param.split(self.WINSTATSLONG)[1].split()
+                logging.info(INDENT*'-' + "window statistics set to <" + " ".join(self.windowStats) + ">")
+                
+            elif self.NORMALIZATIONLONG in param:
+                self.normalization = param.split(self.NORMALIZATIONLONG)[1].strip()
+                logging.info(INDENT*'-' + "normalization set to <" + self.normalization + ">")
+                
+            elif self.INCREMENTALLONG in param:
+                self.incremental = True
+                logging.info(INDENT*'-' + "incremental mode, only new or changed BAM files will be processed")
+                
+            elif self.DEPTHTHREADSLONG in param:
+                self.depthThreads = int(param.split(self.DEPTHTHREADSLONG)[1].strip())
+                logging.info(INDENT*'-' + "depth threads set to <" + str(self.depthThreads) + ">")
+                
+            elif self.MINDEPTHLONG in param:
+                self.minDepth = int(param.split(self.MINDEPTHLONG)[1].strip())
+                logging.info(INDENT*'-' + "min depth set to <" + str(self.minDepth) + ">")
+                
+            elif self.WINSIZESHORT in param or self.WINSIZELONG in param:
                 if self.WINSIZELONG in param:
                     self.windowSize = int(param.split(self.WINSIZELONG)[1].strip())
                 else:
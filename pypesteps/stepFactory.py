@@ -3,20 +3,24 @@ Created on Dec 20, 2020
 
 @author: simonray
 '''
+import os
+import ast
+import glob
 import logging
+import importlib
 logger = logging.getLogger(__name__)
-from pypesteps.stepGCReadCoverage import StepGCReadCoverage
-from pypesteps.stepSliceAndSampleBAM import StepSliceAndSampleBAM
-from pypesteps.stepBAMReadCoverage import StepBAMReadCoverage
-from pypesteps.stepSNVGenerateShorahCmds import StepSNVgenerateShorahCmds
-from pypesteps.stepSNVProcessShorahResults import StepSNVProcessShorahResults
-from pypesteps.stepBAMGCReadCorr import StepBAMGCReadCorr
-from pypesteps.stepExit import StepExit
 
 class StepFactory:
     '''
     creates an instance of a Step, derived from the AbstractStep class
+
+    The available steps are found by scanning the `pypesteps/step*.py` files for classes
+    that define a `CLASSID`. The files are parsed rather than imported, so finding (or listing)
+    the steps doesn't load plotnine/pandas/Biopython etc. A step module (and whatever it
+    imports) is only loaded when `get_step()` is asked for that step.
     '''
+    STEPPATTERN     = "step*.py"
+    STEPPACKAGE     = "pypesteps"
 
 
     def __init__(self):
@@ -24,40 +28,100 @@ class StepFactory:
         Constructor
         '''
         self._creators = {}
-        
-        
+        self._registry = None
+
+
     def get_step(self, classID):
-        if classID == StepSliceAndSampleBAM.CLASSID:
-            return StepSliceAndSampleBAM()
-        if classID == StepGCReadCoverage.CLASSID:
-            return StepGCReadCoverage()
-        if classID == StepBAMReadCoverage.CLASSID:
-            return StepBAMReadCoverage()
-        if classID == StepSNVgenerateShorahCmds.CLASSID:
-            return StepSNVgenerateShorahCmds()
-        if classID == StepSNVProcessShorahResults.CLASSID:
-            return StepSNVProcessShorahResults()
-        if classID == StepBAMGCReadCorr.CLASSID:
-            return StepBAMGCReadCorr()
-        if classID == StepExit.CLASSID:
-            return StepExit()
-        
-       
-        logging.error("didn't recognise the specified step ID <" + classID + ">")
-        raise ValueError(format)
+        if classID in self._creators:
+            return self._creators[classID]()
+
+        stepEntry = self.getRegistry().get(classID)
+        if stepEntry is None:
+            logging.error("didn't recognise the specified step ID <" + classID + ">")
+            raise ValueError("didn't recognise the specified step ID <" + classID + ">")
+
+        logging.debug("loading step [" + classID + "] from <" + stepEntry["module"] + ">")
+        stepModule = importlib.import_module(stepEntry["module"])
+        return getattr(stepModule, stepEntry["class"])()
 
 
 
     def register_step(self, stepType, creator):
         '''
-        at this point, I'm not even clear if i need this
+        add (or replace) a step that isn't one of the `pypesteps/step*.py` modules
         '''
         self._creators[stepType] = creator
 
+
+    def getRegistry(self):
+        '''
+        return a dictionary mapping CLASSID to the module, class name and description of each step.
+        the step folder is only scanned the first time this is called
+        '''
+        if self._registry is None:
+            self._registry = self.scanSteps(os.path.dirname(os.path.abspath(__file__)))
+        return self._registry
+
+
+    @classmethod
+    def scanSteps(cls, stepFolder):
+        '''
+        parse each step module and find the classes that define a CLASSID
+        '''
+        registry = {}
+        for stepFile in sorted(glob.glob(os.path.join(stepFolder, cls.STEPPATTERN))):
+            moduleName = os.path.splitext(os.path.basename(stepFile))[0]
+            with open(stepFile) as f:
+                try:
+                    moduleTree = ast.parse(f.read(), filename=stepFile)
+                except SyntaxError as e:
+                    logging.warning("couldn't parse step module <" + stepFile + ">: " + str(e))
+                    continue
+
+            for node in moduleTree.body:
+                if not isinstance(node, ast.ClassDef):
+                    continue
+                classID = cls._classID(node)
+                if classID is None:
+                    continue
+                registry[classID] = {"module": cls.STEPPACKAGE + "." + moduleName, "class": node.name,
+                                     "description": cls._description(node)}
+        return registry
+
+
     def listAvailableSteps(self):
         '''
         The user needs to be able to get a list of all available Steps
-        Need to determine the best way to do this.
+        returns a list of (CLASSID, description) pairs
         '''
+        registry = self.getRegistry()
+        stepList = [(classID, registry[classID]["description"]) for classID in sorted(registry)]
+        for classID in sorted(self._creators):
+            if classID not in registry:
+                stepList.append((classID, ""))
+        return stepList
+
 
-#factory = SerializerFactory()
\ No newline at end of file
+    @staticmethod
+    def _classID(classNode):
+        '''
+        the value of `CLASSID = "..."` in the body of the class, if there is one
+        '''
+        for node in classNode.body:
+            if isinstance(node, ast.Assign) and len(node.targets) == 1 \
+                and isinstance(node.targets[0], ast.Name) and node.targets[0].id == "CLASSID" \
+                and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+                return node.value.value
+        return None
+
+
+    @staticmethod
+    def _description(classNode):
+        '''
+        first line of the class docstring (skipping the 'classdocs' placeholder)
+        '''
+        docString = ast.get_docstring(classNode) or ""
+        for line in docString.splitlines():
+            if line.strip() and line.strip() != "classdocs":
+                return line.strip()
+        return ""
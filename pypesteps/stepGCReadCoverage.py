@@ -7,12 +7,13 @@ Created on Dec 18, 2020
 @contact:    simon.rayner@medisin.uio.no
 '''
 import os
-from Bio import SeqIO
-from Bio.SeqUtils import GC
 import csv
 import pandas as pd
 import plotnine as p9
 
+from pypesteps import seqTracks
+from pypesteps.referenceRegistry import ReferenceRegistry
+
 
 import logging
 
@@ -27,6 +28,24 @@ class StepGCReadCoverage(abstractStep.AbstractStep):
     a sliding window and step size must be specified to calculate average value
     (using -w/--window_size & -s/--step_size)
     
+    several window sizes can be calculated in the same run, either as a list of 
+    window:step pairs (--window_list 50:5 100:10 500:50) or as a pyramid 
+    (--pyramid 50:5:2:4 gives 50:5 100:10 200:20 400:40). Each fasta file is only
+    read and encoded once, and all the window sizes share the same cumulative counts.
+    A BED file is written for each window size, plus a CSV file with all the tracks side by side
+    
+    other composition tracks (GC skew, CpG observed/expected, Shannon entropy and 
+    k-mer linguistic complexity) can be calculated from the same counts with 
+    --tracks gcskew cpgoe entropy complexity (or --tracks all). These are written, with
+    the GC content, to a composition CSV file for each window size
+    
+    the GC content of all the windows is calculated in one pass with NumPy (see `seqTracks.py`).
+    The encoded sequence and the tracks are kept in the reference registry (see 
+    `referenceRegistry.py`), so a reference that has already been used, in any project, 
+    isn't read or calculated again.
+    By default ambiguous bases count as not GC (as in `Bio.SeqUtils.GC()`), use 
+    `--ambiguous informative` to calculate the GC content over the A/C/G/T/S/W bases only
+    
     output is written to an output file in BED format
     
     To do: add parameters to set x axis plot range in GC plot
@@ -37,6 +56,12 @@ class StepGCReadCoverage(abstractStep.AbstractStep):
     WINSIZELONG         = "--window_size"
     STEPSIZESHORT       = "-s"
     STEPSIZELONG        = "--step_size"
+    AMBIGUOUSLONG       = "--ambiguous"
+    WINLISTLONG         = "--window_list"
+    PYRAMIDLONG         = "--pyramid"
+    TRACKSLONG          = "--tracks"
+    KMERSIZELONG        = "--kmer_size"
+    ALLTRACKS           = "all"
     
     PLOTHEIGHT          = 5
     PLOTWIDTH           = 10
@@ -44,15 +69,21 @@ class StepGCReadCoverage(abstractStep.AbstractStep):
     PLOTDPI             = 1000
     XVAR                = "pos"
     YVAR                = "gcpercent"
+    BEDCOLUMNS          = ["ID", "start", "stop", "nothing1", "GCpercent", "nothing2"]
     
 
-    def __init__(self, windowSize=0, stepSize=0):
+    def __init__(self, windowSize=0, stepSize=0, ambiguousMode=seqTracks.AMBIGLENGTH):
         '''
         Constructor
         '''
 
         self.windowSize = windowSize
         self.stepSize = stepSize
+        self.ambiguousMode = ambiguousMode
+        self.windowList = []
+        self.pyramid = None
+        self.tracks = []
+        self.kmerSize = seqTracks.KMERSIZE
 
         
     def checkInputData(self):
@@ -60,7 +91,7 @@ class StepGCReadCoverage(abstractStep.AbstractStep):
         build file paths and check all input resources exist
         '''
         
-        if( os.path.exists(os.path.join(self.projectRoot, self.inFolder)) is False):
+        if( self.fileExists(os.path.join(self.projectRoot, self.inFolder)) is False):
             logging.error("input folder <" + os.path.join(self.projectRoot, self.inFolder) + "> not found")
             raise Exception("input folder <" + os.path.join(self.projectRoot, self.inFolder) + "> not found")
         
@@ -69,99 +100,207 @@ class StepGCReadCoverage(abstractStep.AbstractStep):
         for inputFile in self.inputFiles:    
             inFile = os.path.join(os.path.join(inputFolder,inputFile))
        
-            if os.path.exists(inFile) == False:
+            if self.fileExists(inFile) == False:
                 logging.error("input file <" + inFile + "> not found")
                 raise RuntimeError ("input file <" + inFile + "> not found")
             else:
                 logging.info(INDENT*'-' + "found input file <" + inFile + ">")
         
-        ## check window size and step size are positive integers (this must be specified for GC coverage calculation)
-        if(self.windowSize > 0 and self.stepSize > 0):
-            logging.info("Read Coverage will be calculated using a sliding window of <" +\
-                          str(self.windowSize) + "> nt and a step size of <" + str(self.stepSize) + "> nt")
-        elif(self.windowSize <= 0 and self.stepSize <= 0):
+        ## check window sizes and step sizes are positive integers (at least one pair must be specified for GC coverage calculation)
+        self.windowPairs = self.getWindowPairs()
+        if not self.windowPairs:
             logging.error("No sliding window selected")            
             raise Exception("No sliding window selected") 
-        else:
-            logging.error("both window and step size must be specified and > 0: (found window size <" \
-                            + str(self.windowSize) + " and step size <" + str(self.stepSize) + ">)")
-            raise Exception("both window and step size must be specified and > 0: (found window size <" \
-                            + str(self.windowSize) + " and step size <" + str(self.stepSize) + ">)")       
+        for windowSize, stepSize in self.windowPairs:
+            if(windowSize <= 0 or stepSize <= 0):
+                logging.error("both window and step size must be specified and > 0: (found window size <" \
+                                + str(windowSize) + "> and step size <" + str(stepSize) + ">)")
+                raise Exception("both window and step size must be specified and > 0: (found window size <" \
+                                + str(windowSize) + "> and step size <" + str(stepSize) + ">)")       
+            logging.info("GC coverage will be calculated using a sliding window of <" +\
+                          str(windowSize) + "> nt and a step size of <" + str(stepSize) + "> nt")
+
+        for trackName in self.tracks:
+            if trackName not in seqTracks.COMPOSITIONTRACKS:
+                logging.error("unrecognised track <" + trackName + ">. Options are <" + "|".join(seqTracks.COMPOSITIONTRACKS + [self.ALLTRACKS]) + ">")
+                raise Exception("unrecognised track <" + trackName + ">. Options are <" + "|".join(seqTracks.COMPOSITIONTRACKS + [self.ALLTRACKS]) + ">")
+        if self.kmerSize < 1 or self.kmerSize > 31:
+            logging.error("the k-mer size must be between 1 and 31 (found <" + str(self.kmerSize) + ">)")
+            raise Exception("the k-mer size must be between 1 and 31 (found <" + str(self.kmerSize) + ">)")
+
+        if self.ambiguousMode not in seqTracks.AMBIGUOUSMODES:
+            logging.error("unrecognised ambiguous base mode <" + self.ambiguousMode + ">. Options are <" + "|".join(seqTracks.AMBIGUOUSMODES) + ">")
+            raise Exception("unrecognised ambiguous base mode <" + self.ambiguousMode + ">. Options are <" + "|".join(seqTracks.AMBIGUOUSMODES) + ">")
         
         
         
     def execute(self):
         '''
         contains the main operations for the step
+        each record (contig) of each fasta file is processed separately (see `processItem`), 
+        so the segments of a segmented genome are processed in parallel
         '''
         logger.info(INDENT*'-' + "executing step")
 
-        inputFolder = os.path.join(self.projectRoot, self.inFolder)
         resultFolder = os.path.join(self.projectRoot, self.outFolder)    
+        logging.info(INDENT*'-' + "--GC results will be written to output folder <" + resultFolder + ">")
+        if not os.path.exists(resultFolder):
+            logging.info(INDENT*'-' + "----folder doesn't exist, creating")
+            os.makedirs(resultFolder)
             
+        inputFolder = os.path.join(self.projectRoot, self.inFolder)
+        items = []
         for inputFile in self.inputFiles:
-        # for each fasta file
-            #   read file
-            inFile = os.path.join(os.path.join(inputFolder,inputFile))
-            logger.info(INDENT*'-' + "processing file <" + inFile + ">")
-            for record in SeqIO.parse(inFile, "fasta"):
-                genomeSeq = record.seq
-                genomeID  = record.id
-                genomeLen = len(genomeSeq)
-                logger.info(INDENT*'-' + "-- found record ID <" + genomeID + ">")
-                
-                # calc GC content
-                posInGenome = 0
-                gcData = []
-                logging.debug(INDENT*'-' + "-- calculating sliding window")
-                while posInGenome < genomeLen - self.windowSize:
-                    gcData.append({self.XVAR: (posInGenome + self.windowSize/2), self.YVAR: (GC(genomeSeq[posInGenome:posInGenome+self.windowSize]))})
-                    posInGenome += self.stepSize
-                dfGCdata = pd.DataFrame.from_dict(gcData)
-                logging.debug(INDENT*'-' + "-- done")
-
-                # create output filename
-                outputFolder = os.path.join(os.path.dirname(inputFile), self.OUTPUTFOLDER)
-                logging.info(INDENT*'-' + "--GC results will be written to output folder <" + resultFolder + ">")
-                if not os.path.exists(resultFolder):
-                    logging.info(INDENT*'-' + "----folder doesn't exist, creating")
-                    os.makedirs(resultFolder)
-                
-                inBaseName = os.path.splitext(os.path.basename(inputFile))[0]
-                gcResultsFile = os.path.join(resultFolder, inBaseName + "__w" + str(self.windowSize) + "_s" + str(self.stepSize) + "__" + self.md5string + ".bed")
-                logging.info(INDENT*'-' + "--GC output BED file is <" + gcResultsFile + ">")
-                logging.info(INDENT*'-' + "--writing")
-                
-                with open(gcResultsFile, 'wt+') as bedfile:
-                    bedwriter = csv.writer(bedfile, delimiter='\t')
-                    bedwriter.writerow(["track name=GC percentage description = sliding window " \
-                                       + str(self.windowSize) + "nt/step size " + str(self.stepSize) + "nt"])
-                    for entry in gcData:                        
-                        bedwriter.writerow([genomeID, int(entry['pos']), int(entry['pos']), ".", str(entry['gcpercent']), "."])
-                logging.info(INDENT*'-' + "--done")
-                
-                # plot GC coverage
-                logging.info(INDENT*'-' + "--plotting")
-                gcPlotFile = os.path.join(resultFolder, inBaseName + "__w" + str(self.windowSize) + "_s" + str(self.stepSize) + "__" + self.md5string + ".png")
-                logging.info(INDENT*'-' + "--plot file is <" + gcPlotFile + ">")
-                gcPlotTitle = inBaseName + "_w" + str(self.windowSize) + "s" + str(self.stepSize)
-                
-                p = (p9.ggplot(data=dfGCdata,
-                           mapping=p9.aes(x=self.XVAR,
-                                          y=self.YVAR, colour=self.YVAR))
-                    + p9.geom_point( alpha=0.25, size=0.25) + p9.labs(title=gcPlotTitle) 
-                    + p9.scale_x_continuous(name=self.XVAR, limits=[0, 30000] ) + p9.ylab(self.YVAR)
-                )
-                p.save(filename = gcPlotFile, height=self.PLOTHEIGHT, width=self.PLOTWIDTH, dpi=self.PLOTDPI)   
-                             
-                
-                logging.info(INDENT*'-' + "finishing")
-
-
-
+            refMetadata = self.loadReferenceMetadata(os.path.join(inputFolder, inputFile))
+            items.extend((inputFile, contigID) for contigID, contigLen in self.selectContigs(refMetadata))
+        self.executeItems(items)
+        logging.info(INDENT*'-' + "finishing")
+        
+        
+    def getWindowPairs(self):
+        '''
+        the (window size, step size) pairs to calculate: the `window_size`/`step_size` pair,
+        then the `window_list` and the `pyramid`, without duplicates
+        '''
+        windowPairs = []
+        if self.windowSize > 0 or self.stepSize > 0:
+            windowPairs.append((self.windowSize, self.stepSize))
+        windowPairs.extend(self.windowList)
+        if self.pyramid is not None:
+            windowPairs.extend(seqTracks.pyramidWindows(*self.pyramid))
+        return list(dict.fromkeys(windowPairs))
+        
+        
+    def reduceItems(self, results):
+        '''
+        publish the GC coverage and the reference metadata for each fasta file so that
+        later steps can use them without reading the files. The BED files are written in the background
+        '''
+        inputFolder = os.path.join(self.projectRoot, self.inFolder)
+        for inputFile in self.inputFiles:
+            self.publishArtifact(os.path.join(inputFolder, inputFile), 
+                                 self.loadReferenceMetadata(os.path.join(inputFolder, inputFile)), kind="metadata")
+        for inputFile, gcResults, csvResults in results:
+            for gcResultsFile, windowSize, stepSize, dfGCcoverage in gcResults:
+                self.publishArtifact(gcResultsFile, dfGCcoverage, 
+                                     lambda bedFile, df=dfGCcoverage, w=windowSize, s=stepSize: self.writeBED(df, bedFile, w, s))
+            for csvResultsFile, dfResults in csvResults:
+                self.publishArtifact(csvResultsFile, dfResults, lambda csvFile, df=dfResults: df.to_csv(csvFile, index=False))
+        return results
+    
+    
+    def writeBED(self, dfGCcoverage, gcResultsFile, windowSize, stepSize):
+        logging.info(INDENT*'-' + "--writing GC output BED file <" + gcResultsFile + ">")
+        with open(gcResultsFile, 'wt+') as bedfile:
+            bedwriter = csv.writer(bedfile, delimiter='\t')
+            bedwriter.writerow(["track name=GC percentage description = sliding window " \
+                               + str(windowSize) + "nt/step size " + str(stepSize) + "nt"])
+            for row in dfGCcoverage.itertuples(index=False):
+                bedwriter.writerow([row.ID, row.start, row.stop, ".", str(row.GCpercent), "."])
         
+        
+    def processItem(self, item):
+        '''
+        calculate the sliding window GC content (and the composition tracks) for one record 
+        (contig) of a fasta file and write the plot. `item` is the (fasta file, record ID).
+        The sequence is encoded once and all the window sizes and tracks are calculated from it. 
+        Tracks that are already in the reference registry are loaded rather than calculated.
+        If the fasta file has more than one record, the output file names include the record ID
+        
+        returns 
+          1. the fasta file
+          2. a (BED file name, window size, step size, GC coverage) entry for each window size, 
+             with the GC coverage in the same layout as the BED file
+          3. a (CSV file name, DataFrame) entry for the file with all the GC tracks side by side 
+             (if there is more than one window size) and the composition file of each window size
+        '''
+        inputFile, genomeID = item
+        inputFolder = os.path.join(self.projectRoot, self.inFolder)
+        resultFolder = os.path.join(self.projectRoot, self.outFolder)    
             
+        inFile = os.path.join(os.path.join(inputFolder,inputFile))
+        logger.info(INDENT*'-' + "processing file <" + inFile + "> record ID <" + genomeID + ">")
+        registry = ReferenceRegistry()
+        refMetadata = self.loadReferenceMetadata(inFile)
         
+        # calc GC content. the cumulative counts are only calculated if a track isn't in the registry
+        logging.debug(INDENT*'-' + "-- calculating sliding windows")
+        seqCounts = seqTracks.SequenceCounts(registry.sequence(inFile, genomeID))
+        gcTracks = [registry.track(inFile, genomeID, self.YVAR, windowSize, stepSize, 
+                                   lambda w=windowSize, s=stepSize: seqTracks.gcTrack(seqCounts, w, s, genomeID, self.ambiguousMode, self.YVAR), 
+                                   self.ambiguousMode) 
+                    for windowSize, stepSize in self.windowPairs]
+        logging.debug(INDENT*'-' + "-- done (<" + str(sum(len(gcTrack) for gcTrack in gcTracks)) + "> windows, <" \
+                      + str(len(gcTracks)) + "> window sizes)")
+
+        # create output filenames (keyed by contig if there is more than one)
+        inBaseName = os.path.splitext(os.path.basename(inputFile))[0] + self.contigLabel(genomeID, refMetadata)
+        gcResults = []
+        csvResults = []
+        for gcTrack in gcTracks:
+            gcResultsFile = os.path.join(resultFolder, inBaseName + "__w" + str(gcTrack.windowSize) + "_s" + str(gcTrack.stepSize) + "__" + self.md5string + ".bed")
+            logging.info(INDENT*'-' + "--GC output BED file is <" + gcResultsFile + ">")
+            windowPositions = gcTrack.positions.astype(int)
+            dfGCcoverage = pd.DataFrame({"ID": genomeID, 
+                                         "start": windowPositions, 
+                                         "stop": windowPositions, 
+                                         "nothing1": ".", 
+                                         "GCpercent": gcTrack.values, 
+                                         "nothing2": "."},
+                                        columns=self.BEDCOLUMNS)
+            gcResults.append((gcResultsFile, gcTrack.windowSize, gcTrack.stepSize, dfGCcoverage))
+            
+            if self.tracks:
+                compositionFile = os.path.join(resultFolder, inBaseName + "__w" + str(gcTrack.windowSize) + "_s" + str(gcTrack.stepSize) + "__composition__" + self.md5string + ".csv")
+                logging.info(INDENT*'-' + "--composition file is <" + compositionFile + ">")
+                dfComposition = pd.DataFrame({"ID": genomeID, "start": windowPositions, "stop": windowPositions, 
+                                              self.YVAR: gcTrack.values}, columns=["ID", "start", "stop", self.YVAR])
+                for trackName in self.tracks:
+                    compTrack = registry.track(inFile, genomeID, trackName, gcTrack.windowSize, gcTrack.stepSize, 
+                                               lambda t=trackName, w=gcTrack.windowSize, s=gcTrack.stepSize: 
+                                                   seqTracks.compositionTracks(seqCounts, w, s, [t], genomeID, self.kmerSize)[0], 
+                                               "k" + str(self.kmerSize) if trackName == seqTracks.TRACKCOMPLEXITY else "")
+                    dfComposition[compTrack.name] = compTrack.values
+                csvResults.append((compositionFile, dfComposition))
+        
+        # plot GC coverage
+        logging.info(INDENT*'-' + "--plotting")
+        if len(gcTracks) == 1:
+            gcTrack = gcTracks[0]
+            gcPlotFile = os.path.join(resultFolder, inBaseName + "__w" + str(gcTrack.windowSize) + "_s" + str(gcTrack.stepSize) + "__" + self.md5string + ".png")
+            gcPlotTitle = inBaseName + "_w" + str(gcTrack.windowSize) + "s" + str(gcTrack.stepSize)
+            dfGCdata = gcTrack.toDataFrame(self.XVAR)
+            facet = None
+        else:
+            # all the tracks side by side, and the same data stacked for the plot
+            tracksFile = os.path.join(resultFolder, inBaseName + "__gctracks__" + self.md5string + ".csv")
+            logging.info(INDENT*'-' + "--GC tracks file is <" + tracksFile + ">")
+            dfGCtracks = pd.concat([gcTrack.toDataFrame(self.XVAR).add_suffix("__w" + str(gcTrack.windowSize) + "_s" + str(gcTrack.stepSize)) 
+                                    for gcTrack in gcTracks], axis=1)
+            dfGCtracks.insert(0, "ID", genomeID)
+            csvResults.append((tracksFile, dfGCtracks))
+            gcPlotFile = os.path.join(resultFolder, inBaseName + "__gctracks__" + self.md5string + ".png")
+            gcPlotTitle = inBaseName + "_gctracks"
+            dfGCdata = pd.concat([gcTrack.toDataFrame(self.XVAR).assign(window="w" + str(gcTrack.windowSize) + "s" + str(gcTrack.stepSize)) 
+                                  for gcTrack in gcTracks])
+            dfGCdata["window"] = pd.Categorical(dfGCdata["window"], categories=dfGCdata["window"].unique())
+            facet = p9.facet_wrap("~window", ncol=1)
+        logging.info(INDENT*'-' + "--plot file is <" + gcPlotFile + ">")
+        
+        p = (p9.ggplot(data=dfGCdata,
+                   mapping=p9.aes(x=self.XVAR,
+                                  y=self.YVAR, colour=self.YVAR))
+            + p9.geom_point( alpha=0.25, size=0.25) + p9.labs(title=gcPlotTitle) 
+            + p9.scale_x_continuous(name=self.XVAR, limits=[0, 30000] ) + p9.ylab(self.YVAR)
+        )
+        if facet is not None:
+            p = p + facet
+        with self.PLOTLOCK:
+            p.save(filename = gcPlotFile, height=self.PLOTHEIGHT, width=self.PLOTWIDTH, dpi=self.PLOTDPI)   
+    
+        return inputFile, gcResults, csvResults
+
+
 
     def shortDescription(self):
         print('calculate GC coverage for fasta file with a sliding window')
@@ -172,7 +311,20 @@ class StepGCReadCoverage(abstractStep.AbstractStep):
         print('')
         print('  window size: -w / --window_size')
         print('    step size: -s / -- step_size')
+        print('  window list: --window_list 50:5 100:10 ...')
+        print('               window:step pairs to calculate together')
+        print('      pyramid: --pyramid window:step:factor:levels')
+        print('               window and step multiplied by factor at each level')
+        print('       tracks: --tracks gcskew cpgoe entropy complexity | all')
+        print('               composition tracks to calculate as well as the GC content')
+        print('    kmer size: --kmer_size  k-mer size for the complexity track [default: ' + str(seqTracks.KMERSIZE) + ']')
+        print('    ambiguous: --ambiguous length|informative')
+        print('               how N and the other ambiguous bases are counted [default: length]')
+        print('       contig: --contig ID [ID ...]')
+        print('               records (contigs/segments) to process [default: all]')
         print('')      
+        print('If the fasta file has more than one record, each record is written to its ')
+        print('own files, named <fasta>__<record ID>__w..._s...')
         print('The output is in BED format. If an output file is not specified, ')
         print('the output file the same as the input file with a bed extension.')
         print('')
@@ -227,11 +379,49 @@ class StepGCReadCoverage(abstractStep.AbstractStep):
             both need to be present (i.e., you can't specify a `window_size` without
             specifying the `step_size` )
         2.  `output_file`, otherwise set the output filename to the input with .BED extension
+        3.  `ambiguous` (optional), how ambiguous bases are counted
+        4.  `window_list` and/or `pyramid` (optional), more window sizes to calculate in the same pass
+        5.  `tracks` and `kmer_size` (optional), the composition tracks to calculate
+        6.  `contig` (optional), the records to process
         '''
         logging.info(INDENT*'-' + "parsing parameters strings")
         params = self.paramString.split(",")
         for param in params:
-            if self.WINSIZESHORT in param or self.WINSIZELONG in param:
+            # the new parameters are checked first (`--window_list` contains `-w`)
+            if self.CONTIGLONG in param:
+                self.contigs = param.split(self.CONTIGLONG)[1].split()
+                logging.info(INDENT*'-' + "contigs set to <" + " ".join(self.contigs) + ">")
+
+            elif self.TRACKSLONG in param:
+                self.tracks = param.split(self.TRACKSLONG)[1].split()
+                if self.ALLTRACKS in self.tracks:
+                    self.tracks = list(seqTracks.COMPOSITIONTRACKS)
+                logging.info(INDENT*'-' + "composition tracks set to <" + " ".join(self.tracks) + ">")
+
+            elif self.KMERSIZELONG in param:
+                self.kmerSize = int(param.split(self.KMERSIZELONG)[1].strip())
+                logging.info(INDENT*'-' + "k-mer size set to <" + str(self.kmerSize) + ">")
+
+            elif self.WINLISTLONG in param:
+                self.windowList = [self.parseWindowPair(windowPair) for windowPair in param.split(self.WINLISTLONG)[1].split()]
+                logging.info(INDENT*'-' + "window list set to <" + " ".join(str(w) + ":" + str(s) for w, s in self.windowList) + ">")
+
+            elif self.PYRAMIDLONG in param:
+                pyramidSpec = param.split(self.PYRAMIDLONG)[1].strip()
+                try:
+                    self.pyramid = tuple(int(value) for value in pyramidSpec.split(":"))
+                except ValueError:
+                    self.pyramid = ()
+                if len(self.pyramid) != 4:
+                    logging.error("pyramid must be given as window:step:factor:levels (found <" + pyramidSpec + ">)")
+                    raise Exception("pyramid must be given as window:step:factor:levels (found <" + pyramidSpec + ">)")
+                logging.info(INDENT*'-' + "pyramid set to <" + pyramidSpec + ">")
+
+            elif self.AMBIGUOUSLONG in param:
+                self.ambiguousMode = param.split(self.AMBIGUOUSLONG)[1].strip()
+                logging.info(INDENT*'-' + "ambiguous base mode set to <" + self.ambiguousMode + ">")
+
+            elif self.WINSIZESHORT in param or self.WINSIZELONG in param:
                 if self.WINSIZELONG in param:
                     self.windowSize = int(param.split(self.WINSIZELONG)[1].strip())
                 else:
@@ -242,13 +432,25 @@ class StepGCReadCoverage(abstractStep.AbstractStep):
                 if self.STEPSIZELONG in param:
                     self.stepSize = int(param.split(self.STEPSIZELONG)[1].strip())
                 else:
-                    self.stepSize = int(param.split(self.STEPSIZE)[1].strip())
+                    self.stepSize = int(param.split(self.STEPSIZESHORT)[1].strip())
                 logging.info(INDENT*'-' + "step size set to <" + str(self.stepSize) + ">")
             
         
            
 
         
+    def parseWindowPair(self, windowPair):
+        '''
+        parse a `window:step` pair
+        '''
+        try:
+            windowSize, stepSize = [int(value) for value in windowPair.split(":")]
+        except ValueError:
+            logging.error("window sizes must be given as window:step (found <" + windowPair + ">)")
+            raise Exception("window sizes must be given as window:step (found <" + windowPair + ">)")
+        return windowSize, stepSize
+
+        
     def gcPrint(self):
         pass
         
@@ -46,6 +46,7 @@ class StepSNVgenerateShorahCmds(abstractStep.AbstractStep):
     NOOFGRPSLONG        = "--no_of_groups"
     SOFTWARELOCSHORT    = "-p"
     SOFTWARELOCLONG     = "--path_to_software"
+    FILEPARAMS          = ["refFastA"]
 
     
     # the following constants have no meaning in this step
@@ -71,7 +72,7 @@ class StepSNVgenerateShorahCmds(abstractStep.AbstractStep):
         build file paths and check all input resources exist
         filepath can be absolute or relative (to Project Root)
         '''
-        if( os.path.exists(os.path.join(self.projectRoot, self.inFolder)) is False):
+        if( self.fileExists(os.path.join(self.projectRoot, self.inFolder)) is False):
             raise Exception("input folder <" + os.path.join(self.projectRoot, self.inFolder) + "> not found")
         
         bamFileFolder = os.path.join(self.projectRoot, self.inFolder)
@@ -80,14 +81,14 @@ class StepSNVgenerateShorahCmds(abstractStep.AbstractStep):
             self.inputFiles = glob.glob(os.path.join(self.projectRoot, self.inFolder) + os.path.sep + "*gen__trim_paired__sorted.bam")
         
         for inputFile in self.inputFiles:            
-            if os.path.exists(os.path.join(bamFileFolder, inputFile)) == False:
+            if self.fileExists(os.path.join(bamFileFolder, inputFile)) == False:
                 raise RuntimeError ("input file <" + os.path.join(bamFileFolder, inputFile) + "> not found")
-                logging.error("input file <" + os.path.exists(os.path.join(bamFileFolder, inputFile)) + "> not found")
+                logging.error("input file <" + os.path.join(bamFileFolder, inputFile) + "> not found")
             else:
                 logging.info(INDENT*'-' + "found input file <" + os.path.join(bamFileFolder, inputFile) + ">")
         
         ## check reference FastA file
-        if os.path.exists(self.refFastA) == False:
+        if self.fileExists(self.refFastA) == False:
             raise RuntimeError ("reference FastA file <" + self.refFastA + "> not found")
             logging.error("reference FastA file <" + self.refFastA + "> not found")
         else:
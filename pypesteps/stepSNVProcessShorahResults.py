@@ -8,7 +8,6 @@ Created on Dec 18, 2020
 '''
 import os
 
-from Bio import SeqIO
 
 import pandas as pd
 import numpy as np
@@ -63,8 +62,11 @@ class StepSNVProcessShorahResults(abstractStep.AbstractStep):
     REFFASTALONG        = "--ref_fasta"
     BAMFILEFOLDERSHORT  = "-b"
     BAMFILEFOLDERLONG   = "--bam_file_folder"
+    FILEPARAMS          = ["refFastA", "bamFileFolder"]
 
     SNVFILEEND          = "snv/SNVs_0.010000_final.csv"
+    SNVCONTIGCOL        = "Chromosome"
+    CONTIGCOL           = "contig"
     PLOTHEIGHT          = 5
     PLOTWIDTH           = 20
     PLOTUNITS           = 'in'
@@ -87,7 +89,7 @@ class StepSNVProcessShorahResults(abstractStep.AbstractStep):
         build file paths and check all input resources exist
         filepath can be absolute or relative (to Project Root)
         '''
-        if( os.path.exists(os.path.join(self.projectRoot, self.inFolder)) is False):
+        if( self.fileExists(os.path.join(self.projectRoot, self.inFolder)) is False):
             raise Exception("input folder <" + os.path.join(self.projectRoot, self.inFolder) + "> not found")
         
 
@@ -99,14 +101,14 @@ class StepSNVProcessShorahResults(abstractStep.AbstractStep):
             resultFolder = os.path.join(self.projectRoot, self.inFolder)
             snv_vcf_file = os.path.join(resultFolder, basename, self.SNVFILEEND)        
                                          
-            if os.path.exists(snv_vcf_file) is False:
+            if self.fileExists(snv_vcf_file) is False:
                 #raise RuntimeError ("input file <" + snv_vcf_file + "> not found")
                 logging.warn("input file <" + snv_vcf_file + "> not found")
             else:
                 logging.info(INDENT*'-' + "found SNV VCF file <" + snv_vcf_file + ">")
         
         ## check reference FastA file
-        if os.path.exists(self.refFastA) == False:
+        if self.fileExists(self.refFastA) == False:
             raise RuntimeError ("reference FastA file <" + self.refFastA + "> not found")
             logging.error("reference FastA file <" + self.refFastA + "> not found")
         else:
@@ -121,7 +123,6 @@ class StepSNVProcessShorahResults(abstractStep.AbstractStep):
         contains the main operations for the step
         '''
         logger.info(INDENT*'-' + "executing step")
-        sourceFolder = os.path.join(self.projectRoot, self.inFolder)
         resultFolder = os.path.join(self.projectRoot, self.outFolder)
         
         logging.info(INDENT*'-' + "--results will be written to output folder <" + resultFolder + ">")
@@ -130,72 +131,27 @@ class StepSNVProcessShorahResults(abstractStep.AbstractStep):
             os.makedirs(resultFolder)        
         
 
-        # load the genome to get the number of nucleotides
-        recordCount = 0
-        for record in SeqIO.parse(self.refFastA, "fasta"):
-            genomeSeq = record.seq
-            genomeID  = record.id
-            genomeLen = len(genomeSeq)
-            recordCount += 1
-            
-        if recordCount > 1:
-            logging.warn(INDENT*'-' + "----fasta file contains more than one record. Using the last loaded record (#" + recordCount + ")")
-            logging.warn(INDENT*'-' + "----Using the last loaded record <" + genomeID + "> which is <" + genomeLen + "> nt" )
+        # get the records (contigs) and their lengths from the reference registry
+        self.refMetadata = self.loadArtifact(self.refFastA, self.loadReferenceMetadata, kind="metadata")
                     
-        # create dataframe with genomeLen rows
-        dfSNV = pd.DataFrame(list(range(1,genomeLen+1)), columns = ['nt']).astype(int)
-        bamFileCount = 1
+        # each SNV file is loaded separately (see `processItem`) and the results
+        # are combined in `reduceItems`. The SNVs of each record are written to their own files
+        dfAll = self.executeItems(self.inputFiles)
+        for genomeID, genomeLen in self.selectContigs(self.refMetadata):
+            self.writeContig(genomeID, genomeLen, dfAll[dfAll[self.CONTIGCOL] == genomeID].copy())
         
-        # The following is for plot cosmetics. 
-        offset = 1  # the y distance for no SNV in a single sample
-        dOffset = 1 # the y distance between successive samples on the plot
-        delta = 2   # the y distance for SNV in a single sample
+        logger.info(INDENT*'-' + "done")
+        
+        
+    def writeContig(self, genomeID, genomeLen, dfAll):
+        '''
+        write the CSV file and plot for the SNVs of one record
+        '''
+        resultFolder = os.path.join(self.projectRoot, self.outFolder)
+        contigLabel = self.contigLabel(genomeID, self.refMetadata)
         
-        dfAll = pd.DataFrame(columns=["Pos","frqMean","snvplot","datasource"])
-        for inputFile in self.inputFiles:
-            
-            # for each VCF file
-            #    1. Skip first 18 header lines
-            #    2. grab POS (#2) and Frq1 (#4), Frq2 (#5) & Frq3 (#6) columns
-            #    3. add command to execute shorah with absolute filepaths
-            
-            # I'm not sure what we gain from working with the VCF files as 
-            # it requires more work to parse and the CSV contains the same information.
-            # The only advantage is that the VCF format is fixed, we know what each column
-            # contains.
-            # However, for now, work with CSV as we are just trying to figure out the data
-            # 
-            basename = os.path.splitext(os.path.basename(inputFile))[0]
-
-            snv_vcf_file = os.path.join(sourceFolder, basename, self.SNVFILEEND) 
-            if os.path.exists(snv_vcf_file) is False:
-                #raise RuntimeError ("input file <" + snv_vcf_file + "> not found")
-                logging.warn("input file <" + snv_vcf_file + "> not found")
-                continue
-            
-            #dfTempVCF = pd.read_csv(snv_vcf_file, delimiter="\t", skiprows=17)
-            dfTempCSV = pd.read_csv(snv_vcf_file)
-            dfTempCSV['Frq1'] = pd.to_numeric(dfTempCSV['Frq1'], errors='coerce')
-            dfTempCSV['Frq2'] = pd.to_numeric(dfTempCSV['Frq2'], errors='coerce')
-            dfTempCSV['Frq3'] = pd.to_numeric(dfTempCSV['Frq3'], errors='coerce')
-            dfTempCSV['frqMean'] = np.nanmean(dfTempCSV.loc[:, 'Frq1':'Frq3'], axis=1)
-    
-            dfSNV = pd.merge(left=dfSNV, right=dfTempCSV.loc[:, ['Pos','frqMean']], how='left', left_on='nt', right_on='Pos')
-            dfSNV['snvplot'] = np.where(dfSNV['Pos'].isnull(), offset, offset+delta)
-            dfSNV = dfSNV.rename(columns={"snvplot":"snvplot_"+ basename, "frqMean":"frqMean_"+ basename, "Pos":"Pos_"+ basename,})
-            
-            
-            dfTemp = dfTempCSV.loc[:, ['Pos','frqMean']]
-            dfTemp['snvplot'] = offset+delta
-            dfTemp['datasource'] = basename
-            dfAll = dfAll.append(dfTemp)
-
-            offset += dOffset
-            
-            bamFileCount+=1
-
         # write the unified dataframe as CSV
-        plotFileAsCSV = os.path.join(resultFolder, self.projectID + "__SNVs__"+ self.md5string + ".csv")
+        plotFileAsCSV = os.path.join(resultFolder, self.projectID + contigLabel + "__SNVs__"+ self.md5string + ".csv")
         logging.info(INDENT*'-' + "--saving combined SNV data to <" + plotFileAsCSV +">")
         dfAll.to_csv(plotFileAsCSV)
         
@@ -203,7 +159,7 @@ class StepSNVProcessShorahResults(abstractStep.AbstractStep):
         
         # plot the SNV data
         logging.info(INDENT*'-' + "--plotting combined SNV data")
-        snvPlotFile = os.path.join(resultFolder, self.projectID + "__SNVs__"+ self.md5string + ".png")
+        snvPlotFile = os.path.join(resultFolder, self.projectID + contigLabel + "__SNVs__"+ self.md5string + ".png")
         logging.info(INDENT*'-' + "--plot file is to <" + snvPlotFile +">")
         
         xAxisStart = 0
@@ -215,13 +171,92 @@ class StepSNVProcessShorahResults(abstractStep.AbstractStep):
 
         p = (p9.ggplot(data=dfAll, mapping=p9.aes(x='Pos', y='snvplot', color='datasource', size = 'frqMean')) \
              + p9.geom_point( alpha=0.1) + p9.scale_size(range = [0, 10]) \
-             + p9.labs(title=self.projectID)
+             + p9.labs(title=self.projectID + contigLabel)
         + p9.scale_x_continuous(name=self.XVAR) + p9.ylab(self.YVAR)) 
         #+ p9.scale_x_continuous(name=self.XVAR, breaks=np.arange(0, 30000, 5000), limits=[0, 30000] ) + p9.ylab(self.YVAR)) 
 
-        p.save(filename = snvPlotFile, height=self.PLOTHEIGHT, width=self.PLOTWIDTH,  dpi=self.PLOTDPI)   
+        with self.PLOTLOCK:
+            p.save(filename = snvPlotFile, height=self.PLOTHEIGHT, width=self.PLOTWIDTH,  dpi=self.PLOTDPI)   
         
-        logger.info(INDENT*'-' + "done")
+
+    def getInputPaths(self):
+        '''
+        this step reads the shorah results for each BAM file rather than the BAM file itself
+        '''
+        sourceFolder = os.path.join(self.projectRoot, self.inFolder)
+        inputPaths = [os.path.normpath(os.path.join(sourceFolder, os.path.splitext(os.path.basename(inputFile))[0], self.SNVFILEEND)) \
+                      for inputFile in self.inputFiles if inputFile]
+        if not inputPaths:
+            inputPaths.append(os.path.normpath(sourceFolder))
+        return inputPaths + self.getFileParamPaths()
+        
+        
+    def processItem(self, inputFile):
+        '''
+        load the SNV calls for a single BAM file 
+        returns the basename and a dataframe with the record (contig), position and mean frequency 
+        of each SNV (or None if the SNV file doesn't exist)
+        '''
+        sourceFolder = os.path.join(self.projectRoot, self.inFolder)
+        
+        # for each VCF file
+        #    1. Skip first 18 header lines
+        #    2. grab POS (#2) and Frq1 (#4), Frq2 (#5) & Frq3 (#6) columns
+        #    3. add command to execute shorah with absolute filepaths
+        
+        # I'm not sure what we gain from working with the VCF files as 
+        # it requires more work to parse and the CSV contains the same information.
+        # The only advantage is that the VCF format is fixed, we know what each column
+        # contains.
+        # However, for now, work with CSV as we are just trying to figure out the data
+        # 
+        basename = os.path.splitext(os.path.basename(inputFile))[0]
+
+        snv_vcf_file = os.path.join(sourceFolder, basename, self.SNVFILEEND) 
+        if os.path.exists(snv_vcf_file) is False:
+            #raise RuntimeError ("input file <" + snv_vcf_file + "> not found")
+            logging.warn("input file <" + snv_vcf_file + "> not found")
+            return None
+        
+        #dfTempVCF = pd.read_csv(snv_vcf_file, delimiter="\t", skiprows=17)
+        dfTempCSV = pd.read_csv(snv_vcf_file)
+        dfTempCSV['Frq1'] = pd.to_numeric(dfTempCSV['Frq1'], errors='coerce')
+        dfTempCSV['Frq2'] = pd.to_numeric(dfTempCSV['Frq2'], errors='coerce')
+        dfTempCSV['Frq3'] = pd.to_numeric(dfTempCSV['Frq3'], errors='coerce')
+        dfTempCSV['frqMean'] = np.nanmean(dfTempCSV.loc[:, 'Frq1':'Frq3'], axis=1)
+        dfTemp = dfTempCSV.loc[:, ['Pos','frqMean']]
+        # shorah writes the record ID of each SNV. Older files without it are for the last record
+        if self.SNVCONTIGCOL in dfTempCSV.columns:
+            dfTemp[self.CONTIGCOL] = dfTempCSV[self.SNVCONTIGCOL].astype(str)
+        else:
+            dfTemp[self.CONTIGCOL] = self.refMetadata["ids"][-1] if self.refMetadata["ids"] else ""
+        dfTemp['datasource'] = basename
+        return basename, dfTemp
+    
+    
+    def reduceItems(self, results):
+        '''
+        merge the SNV calls for all the BAM files
+        returns the combined dataframe used for the CSV files and plots
+        '''
+        # The following is for plot cosmetics. 
+        offset = 1  # the y distance for no SNV in a single sample
+        dOffset = 1 # the y distance between successive samples on the plot
+        delta = 2   # the y distance for SNV in a single sample
+        
+        allSNVs = []
+        for result in results:
+            if result is None:
+                continue
+            basename, dfTemp = result
+            dfTemp['snvplot'] = offset+delta
+            allSNVs.append(dfTemp.loc[:, ["Pos","frqMean","snvplot",self.CONTIGCOL,"datasource"]])
+
+            offset += dOffset
+            
+        if not allSNVs:
+            return pd.DataFrame(columns=["Pos","frqMean","snvplot",self.CONTIGCOL,"datasource"])
+        return pd.concat(allSNVs)
         
 
     def shortDescription(self):
@@ -235,6 +270,8 @@ class StepSNVProcessShorahResults(abstractStep.AbstractStep):
         print('calculate an moving average.')
         print('  window size: -w / --window_size')
         print('    step size: -s / -- step_size')
+        print('       contig: --contig ID [ID ...]')
+        print('               records (contigs/segments) to write the SNVs for [default: all]')
         print('')      
         print('The output is in BED format. If an output file is not specified, ')
         print('the output file the same as the input file with a bed extension.')
@@ -298,6 +335,12 @@ class StepSNVProcessShorahResults(abstractStep.AbstractStep):
         logging.info(INDENT*'-' + "parsing parameters strings")
         params = self.paramString.split(",")
         for param in params:
+            # checked first, a record ID can contain the other flags
+            if self.CONTIGLONG in param:
+                self.contigs = param.split(self.CONTIGLONG)[1].split()
+                logging.info(INDENT*'-' + "contigs set to <" + " ".join(self.contigs) + ">")
+                continue
+            
             if self.REFFASTASHORT in param or self.REFFASTALONG in param:
                 if self.REFFASTALONG in param:
                     self.refFastA = param.split(self.REFFASTALONG)[1].strip()
@@ -9,7 +9,6 @@ from pypesteps import abstractStep
 import os
 import logging
 
-from Bio import SeqIO
 import subprocess
 import shlex
 import glob
@@ -56,6 +55,9 @@ class StepSliceAndSampleBAM(abstractStep.AbstractStep):
     SOFTWARELOCLONG     = "--path_to_software"   
     BAMFILEFOLDERSHORT  = "-b"
     BAMFILEFOLDERLONG   = "--bam_file_folder"     
+    FILEPARAMS          = ["refFastA", "bamFileFolder"]
+    # the subsampler is run as a module, so the script works wherever pypesteps can be imported
+    SUBSAMPLERCOMMAND   = "python -m pypesteps.bamSubsampler"
     
     PLOTHEIGHT          = 5
     PLOTWIDTH           = 10
@@ -100,6 +102,12 @@ class StepSliceAndSampleBAM(abstractStep.AbstractStep):
         print('          sampling max: -x / --sampling_max')
         print('         sampling step: -t / --sampling_step')
         print('         sampling type: -p / --sampling_specs <percent|total>')
+        print('                contig: --contig ID [ID ...]  records to slice [default: all]')
+        print('')
+        print('All the samples of a BAM file are written in a single pass by ')
+        print('`python -m pypesteps.bamSubsampler` (pypesteps has to be on the PYTHONPATH where ')
+        print('the script is run), reads are kept by a hash of the read name so smaller samples ')
+        print('are nested in larger ones')
         print('')      
         print('Where sampling type specifies whether the sampling is ')
         print('in terms of total reads or percentage of reads')
@@ -121,20 +129,13 @@ class StepSliceAndSampleBAM(abstractStep.AbstractStep):
         '''
         logger.info(INDENT*'-' + "executing step")
 
-        # load the genome to get the number of nucleotides
-        recordCount = 0
-        genomeID = ""
-        for record in SeqIO.parse(self.refFastA, "fasta"):
-            genomeSeq = record.seq
-            genomeID  = record.id
-            genomeLen = len(genomeSeq)
-            recordCount += 1
-            
-        if recordCount > 1:
-            logging.warn(INDENT*'-' + "----fasta file contains more than one record. Using the last loaded record (#" + recordCount + ")")
-            logging.warn(INDENT*'-' + "----Using the last loaded record <" + genomeID + "> which is <" + genomeLen + "> nt" )
+        # get the records (contigs) and their lengths from the reference registry.
+        # each selected record is sliced separately
+        self.refMetadata = self.loadArtifact(self.refFastA, self.loadReferenceMetadata, kind="metadata")
+        if len(self.refMetadata["ids"]) > 1:
+            logging.info(INDENT*'-' + "----fasta file contains <" + str(len(self.refMetadata["ids"])) + "> records, <" \
+                         + str(len(self.selectContigs(self.refMetadata))) + "> will be sliced separately")
 
-        bamFileFolder = os.path.join(self.projectRoot, self.inFolder)
         resultFolder = os.path.join(self.projectRoot, self.outFolder)
         
         logging.info(INDENT*'-' + "--results will be written to output folder <" + resultFolder + ">")
@@ -142,63 +143,90 @@ class StepSliceAndSampleBAM(abstractStep.AbstractStep):
             logging.info(INDENT*'-' + "----folder doesn't exist, creating")
             os.makedirs(resultFolder)        
             
+        # the commands for each BAM file are generated separately (see `processItem`)
         cmds = []
+        for bamCmds in self.executeItems(self.inputFiles):
+            cmds = cmds + bamCmds
+                
+        shellFile = os.path.join(self.projectRoot, self.outFolder, self.projectID + "_" + "BAM_sampling" + ".sh")
+        if len(cmds) > 0:
+            with open(shellFile, 'w') as shfile:
+                for cmd in cmds:
+                    print(cmd, file=shfile)
         
-        for inputFile in self.inputFiles:
-            basename = os.path.splitext(os.path.basename(inputFile))[0]   
-            bamFile = os.path.join(bamFileFolder, inputFile)
-            
-            sampleSize = self.sampleMin
-            while(sampleSize < self.sampleMax):
-                   
-                # for each BAM file:
-    
-                #   1. sample the BAM file
-                #   2. index the output
-                #   3. slice the BAM file
-                #   4. index the output 
-                #   5. clean up temporary files
+        logger.info(INDENT*'-' + "done")
                 
-                #   1. sample BAM file at sampleSize % and pipe the output for sorting
-                #      samtools view -s 0.15 -b test.bam|samtools sort -o test__sp_p15_so.bam
-                sampledBasename = basename + "__sp_" + str(sampleSize) + "_so"
-                sampledBamFile = os.path.join(resultFolder, sampledBasename + ".bam")
-                cmd1 = self.softwarePath + ' view -s ' + str(float(sampleSize)/100.0) + " -b " + bamFile\
-                 + " | " + self.softwarePath + ' sort -o ' + sampledBamFile
-                logging.debug(INDENT*'-' + "--SAMTools sample/sort command is <"+ cmd1 + ">")
 
-                
-                #   2. index the sorted file
-                #      samtools index test__sp_p15_so.bam
-                cmd2 = self.softwarePath + ' index ' + sampledBamFile 
-                logging.debug(INDENT*'-' + "--SAMTools index command is <"+ cmd2 + ">")
+    def processItem(self, inputFile):
+        '''
+        generate the sample/slice commands for a single BAM file. The sampled BAM file is
+        sliced for each selected record (contig). If the reference has more than one record, 
+        the names of the sliced files include the record ID
+        '''
+        bamFileFolder = os.path.join(self.projectRoot, self.inFolder)
+        resultFolder = os.path.join(self.projectRoot, self.outFolder)
+        cmds = []
+        
+        basename = os.path.splitext(os.path.basename(inputFile))[0]   
+        bamFile = os.path.join(bamFileFolder, inputFile)
+        
+        sampleSizes = []
+        sampleSize = self.sampleMin
+        while(sampleSize < self.sampleMax):
+            sampleSizes.append(sampleSize)
+            sampleSize += self.sampleStep
+        if not sampleSizes:
+            return cmds
+        
+        # for each BAM file:
 
-                
+        #   1. sample the BAM file at all the sample sizes
+        #   2. index the outputs
+        #   3. slice the BAM files
+        #   4. index the outputs 
+        
+        #   1. sample BAM file at every sampleSize % in a single pass (see `bamSubsampler`). 
+        #      The reads are kept by a hash of the read name, so each sample is nested in the 
+        #      larger ones, and stay in the same order, so the samples don't need sorting
+        #      python -m pypesteps.bamSubsampler test.bam 0.1:test__sp_10_so.bam 0.2:test__sp_20_so.bam
+        sampledBamFiles = [os.path.join(resultFolder, basename + "__sp_" + str(sampleSize) + "_so" + ".bam") 
+                           for sampleSize in sampleSizes]
+        cmd1 = self.SUBSAMPLERCOMMAND + " -p " + self.softwarePath + " " + bamFile \
+            + "".join(" " + str(float(sampleSize)/100.0) + ":" + sampledBamFile for sampleSize, sampledBamFile in zip(sampleSizes, sampledBamFiles))
+        logging.debug(INDENT*'-' + "--sample command is <"+ cmd1 + ">")
+        cmds.append(cmd1)
+        
+        for sampleSize, sampledBamFile in zip(sampleSizes, sampledBamFiles):
+            sampledBasename = os.path.splitext(os.path.basename(sampledBamFile))[0]
+            
+            #   2. index the sampled file
+            #      samtools index test__sp_p15_so.bam
+            cmd2 = self.softwarePath + ' index ' + sampledBamFile 
+            logging.debug(INDENT*'-' + "--SAMTools index command is <"+ cmd2 + ">")
+
+            
+            cmds = cmds + [cmd2]
+            
+            for genomeID, genomeLen in self.selectContigs(self.refMetadata):
                 #   3. sample sliced the file, pipe the output for sorting.
                 #      samtools view -hb test__sample_p15_so.bam "NC_045512.2:2-100" > test__sp_p15_so__sl_2-100.bam 
-                slicedBasename = sampledBasename + "__sl_" + str(sampleSize) + "_sorted"
+                #      (the slice ends at the end of the record if no end was given)
+                slicedBasename = sampledBasename + self.contigLabel(genomeID, self.refMetadata) + "__sl_" + str(sampleSize) + "_sorted"
                 slicedBamFile = os.path.join(resultFolder, slicedBasename + ".bam")
-                sliceString = ' "' + genomeID + ":" + str(self.beginSlice) + "-" + str(self.endSlice)+ '" '
+                sliceEnd = self.endSlice if self.endSlice > 0 else genomeLen
+                sliceString = ' "' + genomeID + ":" + str(self.beginSlice) + "-" + str(sliceEnd)+ '" '
                 cmd3 = self.softwarePath + ' view -hb ' + sampledBamFile + sliceString + " > " + slicedBamFile
                 logging.debug(INDENT*'-' + "--SAMTools slice command is <"+ cmd3 + ">")
-
+    
                  
                 #   4. index the output.
                 #      samtools index test__sp_p15_so__sl_2-100.bam
                 cmd4 = self.softwarePath + ' index ' + slicedBamFile 
                 logging.debug(INDENT*'-' + "--SAMTools command is <"+ cmd4 + ">")
                     
-                cmds = cmds + [cmd1, cmd2, cmd3, cmd4]
-                sampleSize += self.sampleStep
-                
-                
-        shellFile = os.path.join(self.projectRoot, self.outFolder, self.projectID + "_" + "BAM_sampling" + ".sh")
-        if len(cmds) > 0:
-            with open(shellFile, 'w') as shfile:
-                for cmd in cmds:
-                    print(cmd, file=shfile)
+                cmds = cmds + [cmd3, cmd4]
         
-        logger.info(INDENT*'-' + "done")
+        return cmds
                 
 
     def checkInputData(self):
@@ -207,7 +235,7 @@ class StepSliceAndSampleBAM(abstractStep.AbstractStep):
         '''
         
         ## check reference FastA file
-        if os.path.exists(self.refFastA) == False:
+        if self.fileExists(self.refFastA) == False:
             raise RuntimeError (INDENT*"-" + "reference FastA file <" + self.refFastA + "> not found")
             logging.error(INDENT*"-" + "reference FastA file <" + self.refFastA + "> not found")
         else:
@@ -295,7 +323,7 @@ class StepSliceAndSampleBAM(abstractStep.AbstractStep):
             
             
         # finally, check the specified BAM files exist
-        if( os.path.exists(os.path.join(self.projectRoot, self.inFolder)) is False):
+        if( self.fileExists(os.path.join(self.projectRoot, self.inFolder)) is False):
             logging.error("input folder <" + os.path.join(self.projectRoot, self.inFolder) + "> not found")
             raise Exception("input folder <" + os.path.join(self.projectRoot, self.inFolder) + "> not found")
         
@@ -306,7 +334,7 @@ class StepSliceAndSampleBAM(abstractStep.AbstractStep):
         for inputFile in self.inputFiles:    
             inFile = os.path.join(os.path.join(inputFolder,inputFile))
        
-            if os.path.exists(inFile) == False:
+            if self.fileExists(inFile) == False:
                 logging.error(INDENT*"-" + "--input file <" + inFile + "> not found")
                 raise RuntimeError ("input file <" + inFile + "> not found")
             else:
@@ -383,8 +411,13 @@ class StepSliceAndSampleBAM(abstractStep.AbstractStep):
         logging.info(INDENT*'-' + "parsing parameters strings")
         params = self.paramString.split(",")
         for param in params:
+            
+            # checked first, a record ID can contain the other flags
+            if self.CONTIGLONG in param:
+                self.contigs = param.split(self.CONTIGLONG)[1].split()
+                logging.info(INDENT*'-' + "contigs set to <" + " ".join(self.contigs) + ">")
                 
-            if self.REFFASTASHORT in param or self.REFFASTALONG in param:
+            elif self.REFFASTASHORT in param or self.REFFASTALONG in param:
                 if self.REFFASTALONG in param:
                     self.refFastA = param.split(self.REFFASTALONG)[1].strip()
                 else:
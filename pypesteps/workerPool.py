@@ -0,0 +1,129 @@
+'''
+Created on Oct 17, 2026
+
+@author: simonray
+
+a single process pool shared by all steps (and all steps running at the same time)
+so that the input items of a step (usually the BAM files) can be processed in parallel.
+
+The pool uses the `spawn` start method because the steps themselves are run from the
+scheduler threads, and forking a multi-threaded process isn't safe. Each worker logs
+to the same log file as the main process.
+'''
+
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pypesteps.resourceUsage import ResourceUsage
+
+
+logger = logging.getLogger(__name__)
+INDENT = 6
+
+maxWorkers = 1
+_pool = None
+_poolLock = threading.Lock()
+
+
+def setMaxWorkers(noOfWorkers):
+    '''
+    set the size of the shared pool. 1 means items are processed one after another
+    in the calling process (no pool is created)
+    '''
+    global maxWorkers
+    if noOfWorkers < 1:
+        logging.error("the number of item workers must be > 0 (found <" + str(noOfWorkers) + ">)")
+        raise Exception("the number of item workers must be > 0 (found <" + str(noOfWorkers) + ">)")
+    shutdownPool()
+    maxWorkers = noOfWorkers
+
+
+def getPool():
+    '''
+    return the shared pool, creating it the first time it is needed
+    '''
+    global _pool
+    with _poolLock:
+        if _pool is None:
+            logFiles = [h.baseFilename for h in logging.getLogger().handlers if isinstance(h, logging.FileHandler)]
+            logging.info(INDENT*'-' + "starting process pool with <" + str(maxWorkers) + "> workers")
+            _pool = ProcessPoolExecutor(max_workers=maxWorkers, mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_initWorker, initargs=(logFiles, logging.getLogger().level))
+        return _pool
+
+
+def shutdownPool():
+    '''
+    stop the workers. the next call to `getPool()` starts a new pool
+    '''
+    global _pool
+    with _poolLock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+def mapItems(step, items, onItemDone=None, onItemMeasured=None):
+    '''
+    call `step.processItem(item)` for each item and return the results in the same order as `items`
+
+    `onItemDone(item, result)` is called in this process as each item finishes, in the order
+    they complete. If an item raises, no more results are collected and the exception is re-raised
+    
+    `onItemMeasured(item, usage)` is called with the resources used by each item (see `ResourceUsage`),
+    including items that raise
+    '''
+    results = [None]*len(items)
+    if maxWorkers <= 1 or len(items) <= 1:
+        for itemNo, item in enumerate(items):
+            itemUsage = ResourceUsage()
+            try:
+                results[itemNo] = step.processItem(item)
+            finally:
+                if onItemMeasured is not None:
+                    onItemMeasured(item, itemUsage.stop())
+            if onItemDone is not None:
+                onItemDone(item, results[itemNo])
+        return results
+
+    logging.info(INDENT*'-' + "--submitting <" + str(len(items)) + "> items to the process pool")
+    futures = {}
+    for itemNo, item in enumerate(items):
+        futures[getPool().submit(_processItem, step, item)] = itemNo
+    try:
+        for future in as_completed(futures):
+            itemNo = futures[future]
+            results[itemNo], itemUsage = future.result()
+            if onItemMeasured is not None:
+                onItemMeasured(items[itemNo], itemUsage)
+            if onItemDone is not None:
+                onItemDone(items[itemNo], results[itemNo])
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    return results
+
+
+def _processItem(step, item):
+    '''
+    process an item in a worker and measure the resources it used
+    '''
+    itemUsage = ResourceUsage()
+    result = step.processItem(item)
+    return result, itemUsage.stop()
+
+
+def _initWorker(logFiles, logLevel):
+    '''
+    send the log output of the worker to the same place as the main process
+    '''
+    formatter = logging.Formatter('%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s')
+    log = logging.getLogger()
+    log.setLevel(logLevel)
+    for logFile in logFiles:
+        fileh = logging.FileHandler(logFile, 'a')
+        fileh.setFormatter(formatter)
+        log.addHandler(fileh)